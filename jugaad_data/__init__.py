@@ -1 +1 @@
-__version__ = "0.35.2"
\ No newline at end of file
+__version__ = "0.36.0"
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+    Circuit breakers per host and route, to fail fast while an exchange
+    endpoint is down instead of waiting for a timeout on every request
+
+    A breaker opens when at least ``error_threshold`` of the last ``window``
+    requests (and at least ``min_requests``) failed: connection errors,
+    timeouts, 429 and 5xx responses. While open, requests raise
+    CircuitOpenError without being sent. After ``reset_timeout`` seconds it
+    is half open and lets ``half_open_max`` probe requests through, closing
+    again if they succeed and reopening if not.
+
+    Every Transport has a BreakerRegistry, used by all clients:
+
+        from jugaad_data.transport import get_transport
+        get_transport().breakers.snapshot()
+        # {'www.nseindia.com/stock_history': {'state': 'open', ...}}
+
+    J_HTTP_BREAKER=0 disables them.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from requests.exceptions import ConnectionError, RequestException, Timeout
+
+BREAKER_ENV = "J_HTTP_BREAKER"
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(RequestException):
+    """Raised instead of sending a request to an endpoint that is failing"""
+
+
+def is_failure(response=None, error=None):
+    if error is not None:
+        # Raised by the async clients, httpx is imported if they are used
+        httpx = sys.modules.get("httpx")
+        if httpx is not None and isinstance(error, httpx.TransportError):
+            return True
+        return isinstance(error, (ConnectionError, Timeout))
+    status = getattr(response, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+class Call:
+    """Set ``response`` to the response of the guarded request"""
+    response = None
+
+
+class CircuitBreaker:
+    """Thread safe circuit breaker
+
+    Args:
+        name (str): Shown in errors and snapshots
+        window (int): Outcomes of the last ``window`` requests are kept
+        min_requests (int): Requests in the window before it can open
+        error_threshold (float): Share of failures that opens it
+        reset_timeout (float): Seconds it stays open before probing
+        half_open_max (int): Probe requests in flight while half open
+    """
+    def __init__(self, name, window=20, min_requests=10, error_threshold=0.5,
+                 reset_timeout=30, half_open_max=1):
+        self.name = name
+        self.min_requests = min_requests
+        self.error_threshold = error_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.state = CLOSED
+        self.outcomes = collections.deque(maxlen=window)
+        # Wall clock time for snapshots, monotonic time for the timeout
+        self.opened_at = None
+        self._opened = None
+        self.probes = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _failures(self):
+        return sum(1 for ok in self.outcomes if not ok)
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._opened = time.monotonic()
+        self.probes = 0
+
+    def allow(self):
+        """Raises CircuitOpenError unless a request may be sent now"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self.probes < self.half_open_max:
+                self.probes += 1
+                return
+            self.rejected += 1
+            retry_in = max(0, self.reset_timeout - (time.monotonic() - self._opened))
+        raise CircuitOpenError("{} is failing, circuit {}, retry in {:.0f}s".format(
+            self.name, self.state.replace("_", " "), retry_in))
+
+    def record(self, ok):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+                if ok:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                else:
+                    self._open()
+                return
+            self.outcomes.append(ok)
+            if self.state == CLOSED and len(self.outcomes) >= self.min_requests \
+                    and self._failures() >= self.error_threshold * len(self.outcomes):
+                self._open()
+
+    def release(self):
+        """Frees the probe of a request that ended without an outcome"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+
+    @contextmanager
+    def guard(self):
+        """Fails fast if open, records the outcome of the request in the block"""
+        self.allow()
+        call = Call()
+        try:
+            yield call
+        except Exception as e:
+            self.record(not is_failure(error=e))
+            raise
+        except BaseException:
+            # Interrupted or cancelled (KeyboardInterrupt, GeneratorExit,
+            # asyncio.CancelledError), the endpoint may well be fine
+            self.release()
+            raise
+        self.record(not is_failure(call.response))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "requests": len(self.outcomes),
+                "failures": self._failures(),
+                "rejected": self.rejected,
+                "opened_at": self.opened_at,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.state = CLOSED
+            self.outcomes.clear()
+            self.opened_at = None
+            self._opened = None
+            self.probes = 0
+
+
+class BreakerRegistry:
+    """Circuit breakers by host and route, created on first use with
+    ``breaker_kw`` (see CircuitBreaker)"""
+    def __init__(self, enabled=None, **breaker_kw):
+        if enabled is None:
+            enabled = os.environ.get(BREAKER_ENV, "1") != "0"
+        self.enabled = enabled
+        self.breaker_kw = breaker_kw
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, host, route):
+        key = "{}/{}".format((host or "").lower(), route)
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.setdefault(key, CircuitBreaker(key, **self.breaker_kw))
+        return breaker
+
+    @contextmanager
+    def guard(self, url, route):
+        """Guards a request to ``url`` for ``route``, see CircuitBreaker.guard"""
+        if not self.enabled:
+            yield Call()
+            return
+        with self.get(urlsplit(url).hostname, route).guard() as call:
+            yield call
+
+    def open_circuits(self):
+        """Names of breakers that are open or half open"""
+        return [key for key, s in self.snapshot().items() if s["state"] != CLOSED]
+
+    def snapshot(self):
+        """{host/route: {state, requests, failures, rejected, opened_at}}"""
+        with self._lock:
+            breakers = list(self.breakers.items())
+        return {key: breaker.snapshot() for key, breaker in breakers}
+
+    def reset(self):
+        with self._lock:
+            self.breakers.clear()
@@ -2,8 +2,9 @@
     Implements BSE live data fetch functionality
 """
 from datetime import datetime
-from requests import Session
 from ..util import live_cache
+from ..transport import get_transport
+from .. import hooks
 
 
 class BSELive:
@@ -17,8 +18,9 @@ class BSELive:
         "scrip_list": "/ListofScripData/w"
     }
     
-    def __init__(self):
-        self.s = Session()
+    def __init__(self, transport=None):
+        self.transport = transport or get_transport()
+        self.s = self.transport.session()
         h = {
             "Host": "api.bseindia.com",
             "Referer": "https://www.bseindia.com/corporates/ann.html",
@@ -39,7 +41,9 @@ class BSELive:
 
     def get(self, route, payload={}):
         url = self.base_url + self._routes[route]
-        r = self.s.get(url, params=payload)
+        with self.transport.breakers.guard(url, route) as call, \
+                hooks.track(self, route, payload) as event:
+            r = call.response = event.response = self.s.get(url, params=payload)
         return r.json()
 
     @live_cache
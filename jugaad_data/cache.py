@@ -0,0 +1,858 @@
+"""
+    Storage backends for the on-disk history cache used by ``util.cached``
+
+    A store only deals in bytes keyed by ``(app_name, key)``, serialization
+    is left to the caller. Two stores are available:
+
+        pickle - one file per key under the app's cache directory (default)
+        sqlite - a single SQLite database in WAL mode shared by all apps
+
+    The backend is picked with the ``J_CACHE_BACKEND`` environment variable
+    or programmatically with ``set_backend``.
+
+    Optionally a process-local LRU ``memory`` tier sits in front of the
+    store, enable it with ``configure_memory`` or the J_CACHE_MEMORY_ENTRIES
+    and J_CACHE_MEMORY_BYTES environment variables.
+
+    Entries can be compressed per app_name with ``set_compression`` or the
+    J_CACHE_COMPRESSION environment variable. Compressed entries carry a
+    small header naming their codec, so stores can hold a mix of
+    compressed and plain entries.
+
+    Nothing is evicted from the stores unless an eviction policy is set
+    with ``set_eviction_policy``, after which least recently used entries
+    are removed in a background thread. ``compact`` runs the same eviction
+    once, synchronously.
+
+    Processes sharing a cache directory coordinate misses with advisory
+    file locks (``entry_lock``), so an entry is fetched by one process while
+    the others wait for it and read it from the store.
+
+    A format marker is kept per store and app_name next to the locks.
+    Entries of an app without it, i.e. written by an older version, are
+    checked once with ``check_format``.
+"""
+import io
+import os
+import time
+import zlib
+import pickle
+import collections
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from appdirs import user_cache_dir
+from .lazy import LazyModule
+
+try:
+    import fcntl
+except:
+    fcntl = None
+
+np = LazyModule("numpy")
+
+try:
+    import zstandard
+except:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except:
+    lz4_frame = None
+
+BACKEND_ENV = "J_CACHE_BACKEND"
+OPEN_TTL_ENV = "J_CACHE_OPEN_TTL"
+# Seconds for which chunks overlapping unsettled trading days are reused
+DEFAULT_OPEN_TTL = 3600
+DEFAULT_BACKEND = "pickle"
+SQLITE_FILE_NAME = "jugaad-cache.sqlite3"
+# SQLite limits the number of host parameters in a statement
+SQLITE_MAX_PARAMS = 500
+# Seconds after which a read refreshes the stored access time of an entry
+ACCESS_TIME_RESOLUTION = 3600
+# Minimum seconds between two background eviction runs of an app
+EVICTION_INTERVAL = 60
+LOCK_TIMEOUT_ENV = "J_CACHE_LOCK_TIMEOUT"
+# Seconds a process waits for another one fetching the same entry
+DEFAULT_LOCK_TIMEOUT = 60
+LOCK_DIR_NAME = ".locks"
+FORMAT_DIR_NAME = ".formats"
+# 1: every chunk under its exact key, also chunks with unsettled days
+# 2: chunks with unsettled days under an 'open' key, see util.cached
+FORMAT_VERSION = 2
+
+
+def cache_dir(app_name):
+    """Directory holding cache files of ``app_name``, honours J_CACHE_DIR"""
+    env_dir = os.environ.get("J_CACHE_DIR")
+    if not env_dir:
+        return user_cache_dir(app_name, app_name)
+    return os.path.join(env_dir, app_name)
+
+
+def open_ttl():
+    return float(os.environ.get(OPEN_TTL_ENV, DEFAULT_OPEN_TTL))
+
+
+def cache_root():
+    """Directory holding the shared SQLite cache file, honours J_CACHE_DIR"""
+    env_dir = os.environ.get("J_CACHE_DIR")
+    if not env_dir:
+        return user_cache_dir("jugaad-data", "jugaad-data")
+    return env_dir
+
+
+def lock_timeout():
+    return float(os.environ.get(LOCK_TIMEOUT_ENV, DEFAULT_LOCK_TIMEOUT))
+
+
+def lock_path(app_name, key):
+    return os.path.join(cache_root(), LOCK_DIR_NAME, app_name, key + ".lock")
+
+
+@contextmanager
+def entry_lock(app_name, key, timeout=None):
+    """Advisory lock on entry ``key`` of ``app_name`` held across processes
+    sharing the cache directory (fcntl.flock, which Linux NFS clients map to
+    NFS byte range locks).
+
+    Waits at most ``timeout`` seconds (default J_CACHE_LOCK_TIMEOUT) and then
+    goes ahead without the lock, a timeout of 0 disables locking. Yields
+    whether the lock was acquired. Lock files are removed on release, so
+    they do not pile up next to the cache.
+    """
+    timeout = lock_timeout() if timeout is None else timeout
+    if fcntl is None or timeout <= 0:
+        yield False
+        return
+    path = lock_path(app_name, key)
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    fd = None
+    while True:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        except OSError:
+            # e.g. read only cache directory, proceed without the lock
+            break
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            fd = None
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, 0.25)
+            continue
+        try:
+            current = os.stat(path).st_ino == os.fstat(fd).st_ino
+        except FileNotFoundError:
+            current = False
+        if current:
+            break
+        # The previous holder removed the file after we opened it, the lock
+        # we got is on a stale file
+        os.close(fd)
+        fd = None
+    try:
+        yield fd is not None
+    finally:
+        if fd is not None:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+
+class PickleStore:
+    """One file per key, written atomically using tmp-file + os.replace"""
+    name = "pickle"
+
+    def location(self, app_name):
+        return cache_dir(app_name)
+
+    def path(self, app_name, key):
+        return os.path.join(cache_dir(app_name), key)
+
+    def read(self, app_name, key):
+        path = self.path(app_name, key)
+        if not os.path.isfile(path):
+            return None
+        for _ in range(10):
+            try:
+                with open(path, 'rb') as fp:
+                    return fp.read()
+            except PermissionError:
+                time.sleep(0.1)
+        with open(path, 'rb') as fp:
+            return fp.read()
+
+    def read_many(self, app_name, keys):
+        found = {}
+        for key in keys:
+            data = self.read(app_name, key)
+            if data is not None:
+                found[key] = data
+        return found
+
+    def write(self, app_name, key, data, written_at=None):
+        directory = cache_dir(app_name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, key)
+        tmp_path = os.path.join(directory, key + "." + uuid.uuid4().hex + ".tmp")
+        try:
+            with open(tmp_path, 'wb') as fp:
+                fp.write(data)
+            for _ in range(10):
+                try:
+                    os.replace(tmp_path, path)
+                    break
+                except PermissionError:
+                    time.sleep(0.1)
+            else:
+                os.replace(tmp_path, path)
+            if written_at is not None:
+                os.utime(path, (written_at, written_at))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def write_many(self, app_name, items, written_at=None):
+        """written_at optionally maps keys to the time they were written"""
+        written_at = written_at or {}
+        for key, data in items:
+            self.write(app_name, key, data, written_at.get(key))
+
+    def delete(self, app_name, key):
+        try:
+            os.unlink(self.path(app_name, key))
+        except FileNotFoundError:
+            pass
+
+    def delete_many(self, app_name, keys):
+        for key in keys:
+            self.delete(app_name, key)
+
+    def keys(self, app_name):
+        directory = cache_dir(app_name)
+        if not os.path.isdir(directory):
+            return []
+        return [f for f in os.listdir(directory)
+                if not f.endswith(".tmp")
+                and os.path.isfile(os.path.join(directory, f))]
+
+    def entries(self, app_name):
+        """Returns (key, size, last access time) of all entries, access time
+        falls back to modification time on file systems mounted noatime"""
+        directory = cache_dir(app_name)
+        if not os.path.isdir(directory):
+            return []
+        entries = []
+        with os.scandir(directory) as it:
+            for e in it:
+                if e.name.endswith(".tmp"):
+                    continue
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((e.name, st.st_size, max(st.st_atime, st.st_mtime)))
+        return entries
+
+    def written(self, app_name):
+        """Returns (key, time it was written) of all entries"""
+        directory = cache_dir(app_name)
+        if not os.path.isdir(directory):
+            return []
+        written = []
+        with os.scandir(directory) as it:
+            for e in it:
+                if e.name.endswith(".tmp"):
+                    continue
+                try:
+                    written.append((e.name, e.stat().st_mtime))
+                except FileNotFoundError:
+                    continue
+        return written
+
+
+class SQLiteStore:
+    """All apps in a single SQLite file, rows keyed by (app_name, key)
+
+    Connections are kept per thread and per database path, so the store can
+    be used from ``util.pool`` workers and follows J_CACHE_DIR changes.
+    """
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self._path = path
+        self._local = threading.local()
+
+    def path(self):
+        return self._path or os.path.join(cache_root(), SQLITE_FILE_NAME)
+
+    def location(self, app_name):
+        return self.path()
+
+    def connection(self):
+        path = self.path()
+        conns = getattr(self._local, "conns", None)
+        if conns is None:
+            conns = self._local.conns = {}
+        conn = conns.get(path)
+        if conn is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+                                app_name TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                value BLOB NOT NULL,
+                                accessed_at REAL NOT NULL DEFAULT 0,
+                                written_at REAL NOT NULL DEFAULT 0,
+                                PRIMARY KEY (app_name, key)
+                            ) WITHOUT ROWID""")
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(cache)")]
+            if "accessed_at" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            if "written_at" not in columns:
+                conn.execute("ALTER TABLE cache ADD COLUMN written_at REAL NOT NULL DEFAULT 0")
+            conns[path] = conn
+        return conn
+
+    def close(self):
+        conns = getattr(self._local, "conns", {})
+        for conn in conns.values():
+            conn.close()
+        conns.clear()
+
+    def touch(self, app_name, keys):
+        """Updates access time of keys, used for LRU eviction"""
+        conn = self.connection()
+        conn.executemany(
+            "UPDATE cache SET accessed_at = ? WHERE app_name = ? AND key = ?",
+            [(time.time(), app_name, key) for key in keys])
+
+    def read(self, app_name, key):
+        row = self.connection().execute(
+            "SELECT value, accessed_at FROM cache WHERE app_name = ? AND key = ?",
+            (app_name, key)).fetchone()
+        if not row:
+            return None
+        # Like relatime, only write access time when it is noticeably stale
+        # so that reads do not turn into write transactions
+        if time.time() - row[1] > ACCESS_TIME_RESOLUTION:
+            self.touch(app_name, [key])
+        return row[0]
+
+    def read_many(self, app_name, keys):
+        """Reads all ``keys`` of ``app_name`` within one read transaction"""
+        keys = list(keys)
+        found = {}
+        stale = []
+        now = time.time()
+        conn = self.connection()
+        conn.execute("BEGIN")
+        try:
+            for i in range(0, len(keys), SQLITE_MAX_PARAMS):
+                batch = keys[i:i + SQLITE_MAX_PARAMS]
+                sql = "SELECT key, value, accessed_at FROM cache WHERE app_name = ? AND key IN ({})".format(
+                    ",".join("?" * len(batch)))
+                for key, value, accessed_at in conn.execute(sql, [app_name] + batch):
+                    found[key] = value
+                    if now - accessed_at > ACCESS_TIME_RESOLUTION:
+                        stale.append(key)
+        finally:
+            conn.execute("COMMIT")
+        if stale:
+            self.touch(app_name, stale)
+        return found
+
+    def write(self, app_name, key, data, written_at=None):
+        self.write_many(app_name, [(key, data)],
+                        {key: written_at} if written_at is not None else None)
+
+    def write_many(self, app_name, items, written_at=None):
+        """written_at optionally maps keys to the time they were written"""
+        conn = self.connection()
+        now = time.time()
+        written_at = written_at or {}
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (app_name, key, value, accessed_at, written_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(app_name, key, sqlite3.Binary(data), now, written_at.get(key, now))
+                 for key, data in items])
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def delete(self, app_name, key):
+        self.delete_many(app_name, [key])
+
+    def delete_many(self, app_name, keys):
+        self.connection().executemany(
+            "DELETE FROM cache WHERE app_name = ? AND key = ?",
+            [(app_name, key) for key in keys])
+
+    def keys(self, app_name):
+        rows = self.connection().execute(
+            "SELECT key FROM cache WHERE app_name = ?", (app_name,))
+        return [row[0] for row in rows]
+
+    def entries(self, app_name):
+        """Returns (key, size, last access time) of all entries"""
+        rows = self.connection().execute(
+            "SELECT key, length(value), accessed_at FROM cache WHERE app_name = ?",
+            (app_name,))
+        return rows.fetchall()
+
+    def written(self, app_name):
+        """Returns (key, time it was written) of all entries, None for
+        entries stored before the time was recorded"""
+        rows = self.connection().execute(
+            "SELECT key, written_at FROM cache WHERE app_name = ?",
+            (app_name,))
+        return [(key, written_at or None) for key, written_at in rows]
+
+
+class MemoryCache:
+    """Thread safe LRU of serialized entries bounded by count and bytes
+
+    Entries are kept as bytes so that callers always get their own copy
+    of the value and the byte bound is exact. A limit of 0 means no limit
+    on that dimension, the tier is disabled when both limits are 0.
+    """
+    def __init__(self, max_entries=0, max_bytes=0):
+        self._lock = threading.Lock()
+        self._data = collections.OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return bool(self.max_entries or self.max_bytes)
+
+    def get(self, key, count=True):
+        """count=False looks the key up again without counting a hit or
+        miss, e.g. after waiting for another caller to fetch it"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                self.misses += count
+                return None
+            self._data.move_to_end(key)
+            self.hits += count
+            return data
+
+    def put(self, key, data):
+        if not self.enabled:
+            return
+        if self.max_bytes and len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+            self._data[key] = data
+            self.bytes += len(data)
+            while self._data and (
+                    (self.max_entries and len(self._data) > self.max_entries) or
+                    (self.max_bytes and self.bytes > self.max_bytes)):
+                _, evicted = self._data.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+memory = MemoryCache(int(os.environ.get("J_CACHE_MEMORY_ENTRIES", 0)),
+                     int(os.environ.get("J_CACHE_MEMORY_BYTES", 0)))
+
+
+def configure_memory(max_entries=0, max_bytes=0):
+    """Sets limits of the in-memory tier and drops its current content,
+    pass 0 for both to disable it"""
+    memory.max_entries = max_entries
+    memory.max_bytes = max_bytes
+    memory.clear()
+
+
+def memory_key(store, app_name, key):
+    return (store.name, store.location(app_name), app_name, key)
+
+
+class PickleSerializer:
+    name = "pickle"
+
+    def dumps(self, value):
+        return pickle.dumps(value)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+class NpzSerializer:
+    """Stores a dict of equal length numpy arrays as an uncompressed .npz
+
+    Arrays are saved without pickling, so string columns must use a fixed
+    width unicode dtype rather than object.
+    """
+    name = "npz"
+
+    def dumps(self, columns):
+        if not np:
+            raise ModuleNotFoundError("Please install pandas and numpy using \n pip install pandas")
+        fp = io.BytesIO()
+        np.savez(fp, **columns)
+        return fp.getvalue()
+
+    def loads(self, data):
+        with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+            return {name: npz[name] for name in npz.files}
+
+
+class Codec:
+    """Compression codec, ``tag`` is the byte identifying it in entries"""
+    def __init__(self, name, tag, compress, decompress):
+        self.name = name
+        self.tag = tag
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zstd_codec(level):
+    if not zstandard:
+        raise ModuleNotFoundError("Please install zstandard using \n pip install zstandard")
+    return zstandard.ZstdCompressor(level=level or 3).compress
+
+
+def _zstd_decompress(data):
+    if not zstandard:
+        raise ModuleNotFoundError("Please install zstandard using \n pip install zstandard")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def _lz4_codec(level):
+    if not lz4_frame:
+        raise ModuleNotFoundError("Please install lz4 using \n pip install lz4")
+    return lambda data: lz4_frame.compress(data, compression_level=level or 0)
+
+
+def _lz4_decompress(data):
+    if not lz4_frame:
+        raise ModuleNotFoundError("Please install lz4 using \n pip install lz4")
+    return lz4_frame.decompress(data)
+
+
+# name: (tag, compressor factory taking level, decompress)
+_codecs = {
+    "zlib": (b"z", lambda level: lambda data: zlib.compress(data, -1 if level is None else level),
+             zlib.decompress),
+    "zstd": (b"s", _zstd_codec, _zstd_decompress),
+    "lz4": (b"l", _lz4_codec, _lz4_decompress),
+}
+_codecs_by_tag = {tag: decompress for tag, _, decompress in _codecs.values()}
+CODEC_MAGIC = b"\x00JC"
+COMPRESSION_ENV = "J_CACHE_COMPRESSION"
+_compression = {}
+
+
+def available_codecs():
+    """Names of codecs usable in this environment"""
+    names = ["zlib"]
+    if zstandard:
+        names.append("zstd")
+    if lz4_frame:
+        names.append("lz4")
+    return names
+
+
+def set_compression(app_name=None, codec=None, level=None):
+    """Compresses new entries of ``app_name`` (default for all apps when
+    None) with ``codec`` (zlib, zstd or lz4), None disables compression.
+    Existing entries are read whatever their codec is."""
+    if codec is None:
+        _compression.pop(app_name, None)
+        return
+    try:
+        tag, factory, _ = _codecs[codec]
+    except KeyError:
+        raise ValueError("Unknown codec {}, should be one of {}".format(
+            codec, ", ".join(_codecs)))
+    _compression[app_name] = Codec(codec, tag, factory(level), _codecs_by_tag[tag])
+
+
+def get_compression(app_name):
+    codec = _compression.get(app_name, _compression.get(None))
+    if codec is None and os.environ.get(COMPRESSION_ENV):
+        name = os.environ[COMPRESSION_ENV]
+        if name not in _codecs:
+            raise ValueError("Unknown codec {}, should be one of {}".format(
+                name, ", ".join(_codecs)))
+        tag, factory, decompress = _codecs[name]
+        codec = Codec(name, tag, factory(None), decompress)
+    return codec
+
+
+def encode(app_name, data):
+    """Compresses data for storage using the codec set for app_name"""
+    codec = get_compression(app_name)
+    if codec is None:
+        return data
+    return CODEC_MAGIC + codec.tag + codec.compress(data)
+
+
+def decode(data):
+    """Reverses encode, plain entries are returned as they are"""
+    if data[:len(CODEC_MAGIC)] != CODEC_MAGIC:
+        return data
+    tag = data[len(CODEC_MAGIC):len(CODEC_MAGIC) + 1]
+    try:
+        decompress = _codecs_by_tag[tag]
+    except KeyError:
+        raise ValueError("Cache entry compressed with unknown codec {!r}".format(tag))
+    return decompress(data[len(CODEC_MAGIC) + 1:])
+
+
+pickle_serializer = PickleSerializer()
+npz_serializer = NpzSerializer()
+
+
+_stores = {
+    "pickle": PickleStore(),
+    "sqlite": SQLiteStore(),
+}
+_backend = None
+
+
+def set_backend(name):
+    """Selects the store used by ``util.cached``, None falls back to
+    J_CACHE_BACKEND environment variable or the default pickle store"""
+    if name is not None and name not in _stores:
+        raise ValueError("Unknown cache backend {}, should be one of {}".format(
+            name, ", ".join(_stores)))
+    global _backend
+    _backend = name
+
+
+def get_store(name=None):
+    name = name or _backend or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND
+    try:
+        return _stores[name]
+    except KeyError:
+        raise ValueError("Unknown cache backend {}, should be one of {}".format(
+            name, ", ".join(_stores)))
+
+
+class EvictionPolicy:
+    """Limits for one cache namespace, None means no limit
+
+    Args:
+        max_bytes (int): Total size of entries
+        max_entries (int): Number of entries
+        max_age (float): Seconds since an entry was last accessed
+    """
+    def __init__(self, max_bytes=None, max_entries=None, max_age=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    def victims(self, entries, now=None):
+        """Returns keys to delete, least recently used first"""
+        now = now or time.time()
+        entries = sorted(entries, key=lambda e: e[2])
+        victims = []
+        if self.max_age is not None:
+            victims = [e for e in entries if now - e[2] > self.max_age]
+            entries = entries[len(victims):]
+        total = sum(e[1] for e in entries)
+        count = len(entries)
+        for e in entries:
+            over_bytes = self.max_bytes is not None and total > self.max_bytes
+            over_count = self.max_entries is not None and count > self.max_entries
+            if not (over_bytes or over_count):
+                break
+            victims.append(e)
+            total -= e[1]
+            count -= 1
+        return [e[0] for e in victims]
+
+
+_policies = {}
+_eviction_lock = threading.Lock()
+_eviction_runs = {}
+
+
+def set_eviction_policy(app_name=None, max_bytes=None, max_entries=None, max_age=None):
+    """Sets eviction limits for ``app_name``, or the default for all apps
+    when app_name is None. Pass no limits to remove the policy."""
+    if max_bytes is None and max_entries is None and max_age is None:
+        _policies.pop(app_name, None)
+    else:
+        _policies[app_name] = EvictionPolicy(max_bytes, max_entries, max_age)
+
+
+def get_eviction_policy(app_name):
+    return _policies.get(app_name, _policies.get(None))
+
+
+def compact(app_name, store=None, max_bytes=None, max_entries=None, max_age=None):
+    """Evicts least recently used entries of ``app_name`` right away.
+
+    Limits default to the policy set with set_eviction_policy.
+
+    Returns:
+        int: Number of entries removed
+    """
+    store = store or get_store()
+    if max_bytes is None and max_entries is None and max_age is None:
+        policy = get_eviction_policy(app_name)
+        if policy is None:
+            return 0
+    else:
+        policy = EvictionPolicy(max_bytes, max_entries, max_age)
+    victims = policy.victims(store.entries(app_name))
+    for i in range(0, len(victims), SQLITE_MAX_PARAMS):
+        store.delete_many(app_name, victims[i:i + SQLITE_MAX_PARAMS])
+    return len(victims)
+
+
+def _evict_in_background(store, app_name):
+    try:
+        compact(app_name, store)
+    finally:
+        with _eviction_lock:
+            _eviction_runs[(store.name, store.location(app_name))]['running'] = False
+
+
+def note_write(store, app_name):
+    """Called after every cache write, starts a background eviction of
+    ``app_name`` when a policy is set and the last run is old enough"""
+    if get_eviction_policy(app_name) is None:
+        return
+    key = (store.name, store.location(app_name))
+    now = time.time()
+    with _eviction_lock:
+        run = _eviction_runs.setdefault(key, {'at': 0, 'running': False})
+        if run['running'] or now - run['at'] < EVICTION_INTERVAL:
+            return
+        run['running'] = True
+        run['at'] = now
+    t = threading.Thread(target=_evict_in_background, args=(store, app_name),
+                         name="jugaad-cache-eviction", daemon=True)
+    t.start()
+
+
+_formats = set()
+_formats_lock = threading.Lock()
+
+
+def format_path(store, app_name):
+    return os.path.join(cache_root(), FORMAT_DIR_NAME, store.name, app_name)
+
+
+def check_format(store, app_name, is_stale):
+    """Upgrades the entries of app_name once if they were written by an older
+    version: entries for which is_stale(key, written_at) returns True are
+    deleted, then the format marker is written. written_at is None when
+    the store does not know it."""
+    path = format_path(store, app_name)
+    if path in _formats:
+        return
+    with _formats_lock, entry_lock(app_name, FORMAT_DIR_NAME):
+        if path in _formats:
+            return
+        try:
+            with open(path, "rb") as fp:
+                version = pickle.load(fp)["version"]
+        except FileNotFoundError:
+            version = 1
+        if version < FORMAT_VERSION:
+            stale = [key for key, written_at in store.written(app_name)
+                     if is_stale(key, written_at)]
+            if stale:
+                store.delete_many(app_name, stale)
+                for key in stale:
+                    memory.discard(memory_key(store, app_name, key))
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as fp:
+                    pickle.dump({"version": FORMAT_VERSION, "upgraded_at": time.time()}, fp)
+            except OSError:
+                # e.g. read only cache directory, checked once per process
+                pass
+        _formats.add(path)
+
+
+def forget_format(store, app_name):
+    """Removes the format marker of app_name, its entries are checked again"""
+    path = format_path(store, app_name)
+    with _formats_lock:
+        _formats.discard(path)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def migrate_pickle_cache(app_name, target="sqlite", remove=False):
+    """Copies every entry of ``app_name`` from the pickle directory into
+    ``target`` store in a single transaction.
+
+    Args:
+        app_name (str): Cache namespace e.g. 'nsehistory-stock'
+        target (str): Name of destination store
+        remove (bool): Delete pickle files once they are copied
+
+    Returns:
+        int: Number of entries migrated
+    """
+    source = _stores["pickle"]
+    dest = get_store(target)
+    written_at = dict(source.written(app_name))
+    items = source.read_many(app_name, list(written_at))
+    dest.write_many(app_name, list(items.items()), written_at)
+    # Copied entries may be of an older format, check them on next use
+    forget_format(dest, app_name)
+    if remove:
+        for key in items:
+            source.delete(app_name, key)
+    return len(items)
@@ -0,0 +1,166 @@
+"""
+    How the history clients split a date range into requests
+
+    NSEHistory and NSEIndexHistory send one request per range returned by
+    the ``split`` method of their ``chunking`` strategy:
+
+        MonthlyChunks()             calendar months, the default
+        TradingDayChunks(days)      every ``days`` trading days
+        MaxWindowChunks()           the longest range each endpoint accepts,
+                                    see ENDPOINT_MAX_DAYS
+
+        from jugaad_data.chunking import MaxWindowChunks
+        h = NSEHistory()
+        h.chunking = MaxWindowChunks()
+        h.stock_raw("SBIN", date(2005, 1, 1), date(2024, 12, 31))  # 20 requests, not 240
+
+    A response that looks truncated is fetched again in two halves (each
+    checked the same way), so a strategy asking for more than an endpoint
+    returns still gets every row. A response is taken as truncated when it
+    has as many rows as the endpoint returns at most, ``max_rows`` or
+    ENDPOINT_MAX_ROWS. Rows starting well after the start of the range are
+    normal (listings, suspensions, derivatives contracts) and only count
+    when ``gap_days`` is set. Ranges of ``min_days`` or less are never split.
+
+    J_HISTORY_CHUNKING sets the default strategy: ``month``, ``max`` or
+    ``trading_days:<n>``.
+"""
+import abc
+import os
+from datetime import timedelta
+
+from .util import as_date, break_dates, is_trading_day
+
+CHUNKING_ENV = "J_HISTORY_CHUNKING"
+
+# Calendar days the endpoints accept in one request, by route
+ENDPOINT_MAX_DAYS = {
+    "stock_history": 365,
+    "derivatives": 365,
+    "index_history": 365,
+    "index_pe_history": 365,
+    "index_tri_history": 365,
+}
+DEFAULT_MAX_DAYS = 365
+
+# Rows the endpoints return at most in one response, by route. Far more
+# than a year of daily rows, so a full response means rows were cut off
+ENDPOINT_MAX_ROWS = {
+    "stock_history": 1000,
+    "derivatives": 1000,
+    "index_history": 1000,
+    "index_pe_history": 1000,
+    "index_tri_history": 1000,
+}
+DEFAULT_MAX_ROWS = 1000
+
+
+class ChunkStrategy(abc.ABC):
+    """Base of the chunking strategies, subclasses implement ``split``
+
+    Args:
+        max_rows (int): Rows an endpoint returns at most, responses with as
+            many are taken as truncated. ENDPOINT_MAX_ROWS if None
+        min_days (int): Ranges of this many days or less are never split
+        gap_days (int): If set, responses whose oldest row is more than
+            gap_days after the start of the range are taken as truncated
+            too. Off by default, as history of a symbol listed within the
+            range starts late as well
+    """
+    def __init__(self, max_rows=None, min_days=31, gap_days=None):
+        self.max_rows = max_rows
+        self.min_days = min_days
+        self.gap_days = gap_days
+
+    @abc.abstractmethod
+    def split(self, from_date, to_date, route=None):
+        """Returns the (from_date, to_date) ranges to request, oldest first"""
+
+    def truncated(self, rows, from_date, to_date, route=None, row_date=None):
+        """Whether rows, the response of ``route`` for the range, may be
+        missing rows. row_date returns the date of a row or None, it is
+        needed with ``gap_days`` only"""
+        if not isinstance(rows, list) or not rows:
+            return False
+        from_date, to_date = as_date(from_date), as_date(to_date)
+        if (to_date - from_date).days <= self.min_days:
+            return False
+        max_rows = self.max_rows or ENDPOINT_MAX_ROWS.get(route, DEFAULT_MAX_ROWS)
+        if len(rows) >= max_rows:
+            return True
+        if self.gap_days is None or row_date is None:
+            return False
+        dates = [d for d in map(row_date, rows) if d is not None]
+        return bool(dates) and (min(dates) - from_date).days > self.gap_days
+
+    def halves(self, from_date, to_date):
+        """Splits a truncated range in two, oldest first"""
+        middle = from_date + (to_date - from_date) // 2
+        return [(from_date, middle), (middle + timedelta(days=1), to_date)]
+
+    def __repr__(self):
+        return "{}()".format(type(self).__name__)
+
+
+class MonthlyChunks(ChunkStrategy):
+    """One request per calendar month (util.break_dates)"""
+    def split(self, from_date, to_date, route=None):
+        return break_dates(from_date, to_date)
+
+
+class TradingDayChunks(ChunkStrategy):
+    """One request per ``days`` trading days"""
+    def __init__(self, days=60, **kw):
+        super().__init__(**kw)
+        self.days = days
+
+    def split(self, from_date, to_date, route=None):
+        ranges = []
+        start, count, day = from_date, 0, from_date
+        while day <= to_date:
+            count += is_trading_day(day)
+            if count == self.days:
+                ranges.append((start, day))
+                start, count = day + timedelta(days=1), 0
+            day += timedelta(days=1)
+        if start <= to_date:
+            ranges.append((start, to_date))
+        return ranges
+
+    def __repr__(self):
+        return "TradingDayChunks({})".format(self.days)
+
+
+class MaxWindowChunks(ChunkStrategy):
+    """One request per ``max_days`` days, by default the longest range the
+    endpoint accepts (ENDPOINT_MAX_DAYS)"""
+    def __init__(self, max_days=None, **kw):
+        super().__init__(**kw)
+        self.max_days = max_days
+
+    def split(self, from_date, to_date, route=None):
+        days = self.max_days or ENDPOINT_MAX_DAYS.get(route, DEFAULT_MAX_DAYS)
+        ranges = []
+        start = from_date
+        while start <= to_date:
+            end = min(start + timedelta(days=days - 1), to_date)
+            ranges.append((start, end))
+            start = end + timedelta(days=1)
+        return ranges
+
+    def __repr__(self):
+        return "MaxWindowChunks({})".format(self.max_days or "")
+
+
+def default_chunking():
+    """Strategy named by J_HISTORY_CHUNKING, MonthlyChunks if unset"""
+    name = os.environ.get(CHUNKING_ENV, "month").strip().lower()
+    if name == "max":
+        return MaxWindowChunks()
+    if name.startswith("trading_days"):
+        _, _, days = name.partition(":")
+        return TradingDayChunks(int(days) if days else 60)
+    if name != "month":
+        raise ValueError("{}: unknown chunking {!r}, use month, max or trading_days:<n>".format(
+            CHUNKING_ENV, name))
+    return MonthlyChunks()
@@ -4,6 +4,8 @@ from datetime import date, datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 import requests
 from jugaad_data import nse
+from jugaad_data.concurrency import AIMDController
+from jugaad_data.transport import get_transport
 
 
 
@@ -29,7 +31,8 @@ def bhavcopy_wrapper(bhavcopy_function, dt, dest):
 @click.option("--fo/--no-fo", help="Downloads F&O bhavcopy", default=False, type=bool)
 @click.option("--idx/--no-idx", help="Downloads Index bhavcopy", default=False, type=bool)
 @click.option("--full/--no-full", help="Full Bhavcopy", default=False, type=bool)
-def bhavcopy(from_, to, dest, fo, idx, full):
+@click.option("--adaptive/--no-adaptive", help="Adapt parallel downloads to NSE's response times and errors", default=False, type=bool)
+def bhavcopy(from_, to, dest, fo, idx, full, adaptive):
     """Downloads bhavcopy from NSE's website
         
         Download today's bhavcopy
@@ -43,6 +46,10 @@ def bhavcopy(from_, to, dest, fo, idx, full):
         Downlad bhavcopy for a date range
 
         $ jdata bhavcopy -d /path/to/dir -f 2020-01-01 -t 2020-02-01
+
+        Downlad a date range as fast as NSE allows right now
+
+        $ jdata bhavcopy -d /path/to/dir -f 2020-01-01 -t 2020-12-31 --adaptive
         
     """ 
         
@@ -85,8 +92,12 @@ def bhavcopy(from_, to, dest, fo, idx, full):
             if w not in [5,6]:
                 date_range.append(dt.date())
         
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(bhavcopy_wrapper, downloader, dt, dest) for dt in date_range]
+        task, max_workers = bhavcopy_wrapper, None
+        if adaptive:
+            controller = AIMDController("bhavcopy")
+            task, max_workers = controller.wrap(bhavcopy_wrapper), controller.max_limit
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(task, downloader, dt, dest) for dt in date_range]
             
             with click.progressbar(futures, label="Downloading Bhavcopies") as bar:
                 for i, future in enumerate(bar):
@@ -103,6 +114,10 @@ def bhavcopy(from_, to, dest, fo, idx, full):
                     failed_downloads.append(dt)
         """
         click.echo("Saved to : " + dest)
+        open_circuits = get_transport().breakers.open_circuits()
+        if open_circuits:
+            click.echo("NSE is failing ({}), downloads were stopped early".format(
+                ", ".join(open_circuits)), err=True)
         if failed_downloads:
             click.echo("Failed to download for below dates, these might be holidays, please check -") 
             for dt in failed_downloads:
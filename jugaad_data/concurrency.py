@@ -0,0 +1,159 @@
+"""
+    Adaptive limit on requests in flight (AIMD, as in TCP congestion control)
+
+    The limit grows by ``increase`` for every ``limit`` healthy requests and
+    is multiplied by ``decrease`` when a request is congested: it got a 429
+    or 5xx, timed out, failed to connect or took longer than
+    ``latency_target``. Responses seen by the shared transport, including
+    the ones it retries, are reported to the controller of the calling
+    thread, so a 429 counts even when the retry succeeds. Their latency is
+    that of the requests only; calls of ``util.cached`` functions that sent
+    none (cache hits, waits for another thread's download) leave the limit
+    as it is. Calls of other functions are timed as a whole.
+
+        from jugaad_data.concurrency import AIMDController
+        from jugaad_data.nse import NSEHistory
+        h = NSEHistory()
+        h.concurrency = AIMDController("nsehistory", max_limit=16)
+
+    ``ut.pool`` and ``ut.pool_cached`` accept ``controller=``, and
+    ``jdata bhavcopy --adaptive`` downloads date ranges with one. The
+    current limit and requests in flight are the ``concurrency_limit`` and
+    ``in_flight`` gauges of jugaad_data.metrics under the controller's name.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from requests.exceptions import ConnectionError, Timeout
+from .metrics import registry as metrics
+
+LATENCY_TARGET_ENV = "J_HTTP_LATENCY_TARGET"
+# Seconds, slower responses are taken as a sign of overload
+DEFAULT_LATENCY_TARGET = 5.0
+CONGESTION_STATUSES = (429, 500, 502, 503, 504)
+CONGESTION_ERRORS = (ConnectionError, Timeout)
+
+_local = threading.local()
+
+
+def observe(status_code=None, error=None, latency=None):
+    """Reports a response (or a failed request) and the seconds it took to
+    the controller whose slot the calling thread holds, called by the
+    transport"""
+    slot = getattr(_local, "slot", None)
+    if slot is None:
+        return
+    slot.requests += 1
+    if latency is not None:
+        slot.latency = max(slot.latency or 0, latency)
+    if status_code in CONGESTION_STATUSES or isinstance(error, CONGESTION_ERRORS):
+        slot.congested = True
+
+
+def cache_layer():
+    """Marks the call in the calling thread's slot as going through the
+    cache, so only requests reported by the transport are timed. Called
+    by util.cached"""
+    slot = getattr(_local, "slot", None)
+    if slot is not None:
+        slot.cached = True
+
+
+class Slot:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.congested = False
+        # Requests reported by the transport and the slowest of them
+        self.requests = 0
+        self.latency = None
+        self.cached = False
+
+
+class AIMDController:
+    """Thread safe additive increase / multiplicative decrease limit
+
+    Args:
+        name (str): Metrics namespace
+        initial (int): Starting limit
+        min_limit (int): Lowest limit, at least 1
+        max_limit (int): Highest limit, also the thread pool size of ``pool``
+        increase (float): Added to the limit per ``limit`` healthy requests
+        decrease (float): Factor applied to the limit on congestion
+        latency_target (float): Seconds, J_HTTP_LATENCY_TARGET or 5 by default
+    """
+    def __init__(self, name="default", initial=2, min_limit=1, max_limit=32,
+                 increase=1, decrease=0.5, latency_target=None):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        if latency_target is None:
+            latency_target = float(os.environ.get(LATENCY_TARGET_ENV, DEFAULT_LATENCY_TARGET))
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._last_decrease = 0
+        self._publish()
+
+    def _publish(self):
+        metrics.set(self.name, "concurrency_limit", int(self.limit))
+        metrics.set(self.name, "in_flight", self.in_flight)
+
+    def acquire(self):
+        """Blocks until a request may be sent, returns its Slot"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+            self._publish()
+        return Slot()
+
+    def release(self, slot, congested=None):
+        """Adjusts the limit for a finished request"""
+        congested = slot.congested if congested is None else congested
+        if slot.requests:
+            latency = slot.latency or 0
+        elif slot.cached:
+            # Answered without a request, nothing to learn from
+            latency = None
+        else:
+            latency = time.monotonic() - slot.start
+        with self._condition:
+            self.in_flight -= 1
+            if congested or (latency is not None and latency > self.latency_target):
+                # Requests sent before the last decrease saw the old limit,
+                # count a burst of failures only once
+                if slot.start >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = time.monotonic()
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+            self._publish()
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Holds a slot while the block runs, responses seen by the transport
+        in this thread and CONGESTION_ERRORS raised count against it"""
+        slot = self.acquire()
+        outer = getattr(_local, "slot", None)
+        _local.slot = slot
+        try:
+            yield slot
+        except CONGESTION_ERRORS:
+            slot.congested = True
+            raise
+        finally:
+            _local.slot = outer
+            self.release(slot)
+
+    def wrap(self, function):
+        """Returns function running within a slot"""
+        def wrapper(*args, **kwargs):
+            with self.slot():
+                return function(*args, **kwargs)
+        return wrapper
@@ -0,0 +1,312 @@
+"""
+    Local HTTP server standing in for nseindia.com, nsearchives.nseindia.com,
+    niftyindices.com and api.bseindia.com in load and performance tests
+
+    It serves the responses of a Cassette (see jugaad_data.replay), picking
+    them by the Host header, path, query and body of the request, after a
+    configurable latency with jitter. A share of requests can be answered
+    with an error status or by dropping the connection.
+
+        from jugaad_data.fake_exchange import FakeExchange
+        with FakeExchange("nse.jsonl", latency=0.05, jitter=0.02, error_rate=0.01) as ex:
+            h = NSEHistory(transport=ex.transport())
+            h.workers = 32
+            h.stock_raw("SBIN", from_date, to_date)
+
+    ``transport()`` returns a Transport sending requests for any host to the
+    server, so every client runs unchanged against it. Requests that are
+    not in the cassette get a 404.
+
+    ``endpoints`` answer requests for their ``path`` instead of the
+    cassette, e.g. StockHistoryEndpoint serves stock history for any range,
+    for clients that do not split requests by month.
+
+    It can also be run on its own, for clients in other processes:
+
+        python -m jugaad_data.fake_exchange nse.jsonl --port 8080 --latency 0.05
+"""
+import argparse
+import bisect
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit, urlencode, parse_qs
+
+from requests.adapters import HTTPAdapter
+from .replay import Cassette
+from .transport import SharedAdapter, Transport
+from .util import break_dates
+
+
+class FakeExchange:
+    """Serves a cassette over HTTP from a background thread
+
+    Args:
+        cassette (Cassette or str): Responses to serve, or the path of one
+        latency (float): Seconds before every response
+        jitter (float): Up to this many seconds added to latency at random
+        error_rate (float): Share of requests answered with an error status
+        error_statuses (tuple): Statuses injected errors are picked from
+        reset_rate (float): Share of requests whose connection is dropped
+            without a response
+        seed (int): Seed of the random choices, for repeatable runs
+        endpoints (list): Callables with a ``path`` attribute answering
+            requests for it, see StockHistoryEndpoint
+    """
+    def __init__(self, cassette, latency=0, jitter=0, error_rate=0,
+                 error_statuses=(503,), reset_rate=0, host="127.0.0.1", port=0,
+                 seed=None, endpoints=()):
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+        self.endpoints = {endpoint.path: endpoint for endpoint in endpoints}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.reset_rate = reset_rate
+        self.address = (host, port)
+        self.stats = {"requests": 0, "errors": 0, "resets": 0, "not_found": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        self._server = ThreadingHTTPServer(self.address, _Handler, bind_and_activate=False)
+        # Room for many clients connecting at once
+        self._server.request_queue_size = 1024
+        self._server.server_bind()
+        self._server.server_activate()
+        self._server.daemon_threads = True
+        self._server.exchange = self
+        threading.Thread(target=self._server.serve_forever, name="fake-exchange",
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def transport(self, rate_limits=None, **kw):
+        """Transport sending every request to this server, not rate limited
+        unless ``rate_limits`` is given"""
+        return RoutedTransport(self.url, rate_limits=rate_limits or {}, **kw)
+
+    def _draw(self):
+        """Returns (delay, outcome) for a request, outcome is None, "reset"
+        or an error status"""
+        with self._lock:
+            self.stats["requests"] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            x = self._random.random()
+            if x < self.reset_rate:
+                self.stats["resets"] += 1
+                return delay, "reset"
+            if x < self.reset_rate + self.error_rate:
+                self.stats["errors"] += 1
+                return delay, self._random.choice(self.error_statuses)
+            return delay, None
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, status, body, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        exchange = self.server.exchange
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        delay, outcome = exchange._draw()
+        if delay > 0:
+            time.sleep(delay)
+        if outcome == "reset":
+            self.close_connection = True
+            return
+        if outcome is not None:
+            self._respond(outcome, b"injected error")
+            return
+        parts = urlsplit(self.path)
+        endpoint = exchange.endpoints.get(parts.path)
+        if endpoint is not None:
+            self._respond(*endpoint(parse_qs(parts.query), body))
+            return
+        url = "http://{}{}".format(self.headers.get("Host", ""), self.path)
+        entry = exchange.cassette.find(self.command, url, body)
+        if entry is None:
+            exchange._count("not_found")
+            self._respond(404, b"not recorded")
+            return
+        self._respond(entry["status"], Cassette.body(entry), entry["headers"])
+
+    do_GET = do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Routed(HTTPAdapter):
+    def send(self, request, **kw):
+        parts = urlsplit(request.url)
+        routed = request.copy()
+        routed.url = urlunsplit((self.upstream.scheme, self.upstream.netloc,
+                                 parts.path, parts.query, ""))
+        routed.headers["Host"] = parts.hostname
+        r = super().send(routed, **kw)
+        # Cookies and redirects are handled against the original URL
+        r.url, r.request = request.url, request
+        return r
+
+
+class RoutedAdapter(SharedAdapter, _Routed):
+    """SharedAdapter sending requests for every host to ``upstream``"""
+    def __init__(self, limiter=None, retry=None, upstream=None, **kw):
+        self.upstream = urlsplit(upstream)
+        super().__init__(limiter, retry, **kw)
+
+
+class RoutedTransport(Transport):
+    """Transport sending requests for every host to ``upstream``, e.g. the
+    url of a FakeExchange"""
+    adapter_class = RoutedAdapter
+
+    def __init__(self, upstream, **kw):
+        self.upstream = upstream
+        super().__init__(upstream=upstream, **kw)
+
+
+def stock_rows(symbol, from_date, to_date, rng, price, series="EQ"):
+    """Generated stock history rows for the weekdays of a range, oldest
+    first, starting from price. Returns (rows, last price)"""
+    rows = []
+    for i in range((to_date - from_date).days + 1):
+        d = from_date + timedelta(days=i)
+        if d.weekday() >= 5:
+            continue
+        price *= rng.uniform(0.97, 1.03)
+        rows.append({
+            "CH_SYMBOL": symbol, "CH_SERIES": series,
+            "CH_TIMESTAMP": d.isoformat(),
+            "CH_OPENING_PRICE": round(price, 2),
+            "CH_TRADE_HIGH_PRICE": round(price * 1.01, 2),
+            "CH_TRADE_LOW_PRICE": round(price * 0.99, 2),
+            "CH_PREVIOUS_CLS_PRICE": round(price, 2),
+            "CH_LAST_TRADED_PRICE": round(price, 2),
+            "CH_CLOSING_PRICE": round(price, 2),
+            "VWAP": round(price, 2),
+            "CH_52WEEK_HIGH_PRICE": round(price * 1.3, 2),
+            "CH_52WEEK_LOW_PRICE": round(price * 0.7, 2),
+            "CH_TOT_TRADED_QTY": rng.randint(10**5, 10**7),
+            "CH_TOT_TRADED_VAL": round(rng.uniform(1e7, 1e10), 2),
+            "CH_TOTAL_TRADES": rng.randint(10**3, 10**5),
+            "COP_DELIV_QTY": rng.randint(10**4, 10**6),
+            "COP_DELIV_PERC": round(rng.uniform(10, 90), 2),
+        })
+    return rows, price
+
+
+def add_stock_history(cassette, history, symbols, from_date, to_date, series="EQ"):
+    """Adds generated responses of NSEHistory ``history`` for the stock
+    history of ``symbols``, one per month chunk, and its cookie page"""
+    page = history.base_url + history.path_map["equity_quote_page"]
+    cassette.add("GET", page, headers=[("Set-Cookie", "nsit=fake; Path=/")])
+    url = history.base_url + history.path_map["stock_history"]
+    rng = random.Random(0)
+    for symbol in symbols:
+        price = rng.uniform(100, 3000)
+        for start, end in break_dates(from_date, to_date):
+            rows, price = stock_rows(symbol, start, end, rng, price, series)
+            params = history._stock_params(symbol, start, end, series)
+            cassette.add_json("GET", url + "?" + urlencode(params), {"data": list(reversed(rows))})
+    return cassette
+
+
+class StockHistoryEndpoint:
+    """Answers NSEHistory stock history requests for any range within
+    from_date - to_date, with the rows add_stock_history generates
+
+    Args:
+        max_days (int): Longer ranges get a 400 response
+        max_rows (int): Only the newest max_rows rows of a range are
+            returned, like an endpoint truncating long responses
+    """
+    path = "/api/historicalOR/generateSecurityWiseHistoricalData"
+
+    def __init__(self, symbols, from_date, to_date, series="EQ", max_days=None, max_rows=None):
+        self.max_days = max_days
+        self.max_rows = max_rows
+        self.rows = {}
+        rng = random.Random(0)
+        for symbol in symbols:
+            self.rows[symbol], _ = stock_rows(symbol, from_date, to_date, rng,
+                                              rng.uniform(100, 3000), series)
+        self.dates = {symbol: [r["CH_TIMESTAMP"] for r in rows] for symbol, rows in self.rows.items()}
+
+    def __call__(self, query, body=None):
+        symbol = query.get("symbol", [""])[0]
+        try:
+            start = datetime.strptime(query["from"][0], "%d-%m-%Y").date()
+            end = datetime.strptime(query["to"][0], "%d-%m-%Y").date()
+        except (KeyError, ValueError):
+            return self._json(400, {"error": "from and to are required"})
+        if self.max_days and (end - start).days + 1 > self.max_days:
+            return self._json(400, {"error": "range longer than {} days".format(self.max_days)})
+        dates = self.dates.get(symbol, [])
+        low = bisect.bisect_left(dates, start.isoformat())
+        high = bisect.bisect_right(dates, end.isoformat())
+        rows = list(reversed(self.rows.get(symbol, [])[low:high]))
+        if self.max_rows:
+            rows = rows[:self.max_rows]
+        return self._json(200, {"data": rows})
+
+    @staticmethod
+    def _json(status, data):
+        return status, json.dumps(data).encode(), [("Content-Type", "application/json")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves a cassette as a fake exchange")
+    parser.add_argument("cassette", help="JSON lines file recorded with J_HTTP_RECORD")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--reset-rate", type=float, default=0)
+    args = parser.parse_args()
+    ex = FakeExchange(args.cassette, args.latency, args.jitter, args.error_rate,
+                      reset_rate=args.reset_rate, host=args.host, port=args.port).start()
+    print("Serving {} responses on {}".format(len(ex.cassette), ex.url))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        ex.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+    Hooks called with a RequestEvent for every request the clients send, and
+    for every call answered by the cache instead
+
+        from jugaad_data import hooks
+        stats = hooks.add_hook(hooks.Aggregator())
+        hooks.add_hook(hooks.LoggingSink())
+        ...
+        stats.report()["nsehistory/stock_history"]["p95"]
+
+    Requests are reported by NSEHistory._get, NSEIndexHistory._post_json,
+    NSEArchives.get, NSEDailyReports.download_file, NSELive.get /
+    _get_nextapi and BSELive.get, with the route name used by the client.
+    Calls served by util.cached or util.live_cache are reported with
+    ``cached=True`` and the cache namespace as route.
+
+    Timings are in seconds:
+        dns         resolving the host, 0 if a pooled connection was reused
+        connect     TCP connect and TLS handshake, 0 if reused
+        ttfb        sending the request until the response headers arrived,
+                    of the last attempt if it was retried, None for requests
+                    not sent through a Transport
+        total       the whole call, reading the body included
+
+    With no hooks added nothing is measured.
+"""
+import json
+import logging
+import math
+import threading
+import time
+import collections
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_hooks = ()
+_hooks_lock = threading.Lock()
+_local = threading.local()
+
+
+class RequestEvent:
+    def __init__(self, client, route, params=None, method="GET", cached=False):
+        self.client = client
+        self.route = route
+        self.params = params
+        self.method = method
+        self.url = None
+        self.status = None
+        self.bytes = None
+        self.dns = 0.0
+        self.connect = 0.0
+        self.ttfb = None
+        self.total = None
+        self.cached = cached
+        self.error = None
+        self.timestamp = time.time()
+        self.response = None
+
+    @property
+    def key(self):
+        """Route qualified by the client, e.g. nsehistory/stock_history"""
+        return "{}/{}".format(self.client, self.route)
+
+    def as_dict(self):
+        d = dict(vars(self))
+        d.pop("response")
+        return d
+
+    def __repr__(self):
+        return "<RequestEvent {} {} {}>".format(self.key, self.status, self.total)
+
+
+def add_hook(hook):
+    """Calls ``hook(event)`` for every request, returns hook"""
+    global _hooks
+    with _hooks_lock:
+        _hooks = _hooks + (hook,)
+    return hook
+
+
+def remove_hook(hook):
+    global _hooks
+    with _hooks_lock:
+        _hooks = tuple(h for h in _hooks if h is not hook)
+
+
+def clear_hooks():
+    global _hooks
+    with _hooks_lock:
+        _hooks = ()
+
+
+def emit(event):
+    for hook in _hooks:
+        try:
+            hook(event)
+        except Exception:
+            logger.exception("Request hook %r failed", hook)
+
+
+def timing():
+    """Connection timings of the request the calling thread is sending,
+    None when no hooks are added"""
+    return getattr(_local, "timing", None)
+
+
+def _client_name(client):
+    return client if isinstance(client, str) else type(client).__name__.lower()
+
+
+@contextmanager
+def track(client, route, params=None, method="GET"):
+    """Reports the request sent in the block, which sets ``event.response``
+    to the requests.Response it got"""
+    event = RequestEvent(_client_name(client), route, params, method)
+    if not _hooks:
+        yield event
+        return
+    outer = getattr(_local, "timing", None)
+    _local.timing = event
+    start = time.perf_counter()
+    try:
+        yield event
+    except Exception as e:
+        event.error = repr(e)
+        raise
+    finally:
+        event.total = time.perf_counter() - start
+        _local.timing = outer
+        _finish(event)
+        emit(event)
+
+
+def _finish(event):
+    r = event.response
+    if r is None:
+        return
+    event.url = getattr(r, "url", None)
+    event.status = getattr(r, "status_code", None)
+    # Bodies of streamed responses are not read here
+    content = getattr(r, "_content", None)
+    if isinstance(content, bytes):
+        event.bytes = len(content)
+
+
+def cached(namespace, count=1):
+    """Reports ``count`` calls answered by the cache"""
+    for _ in range(count if _hooks else 0):
+        event = RequestEvent("cache", namespace, cached=True)
+        event.total = 0.0
+        emit(event)
+
+
+class LoggingSink:
+    """Logs every event as one JSON object"""
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger("jugaad_data.requests")
+        self.level = level
+
+    def __call__(self, event):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps(event.as_dict(), default=str))
+
+
+def percentile(values, q):
+    """Nearest rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+class Aggregator:
+    """Keeps the total time of the last ``max_samples`` requests per route"""
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def __call__(self, event):
+        with self.lock:
+            route = self.routes.get(event.key)
+            if route is None:
+                route = self.routes[event.key] = {
+                    "count": 0, "errors": 0, "cached": 0, "bytes": 0,
+                    "samples": collections.deque(maxlen=self.max_samples),
+                }
+            route["count"] += 1
+            route["cached"] += event.cached
+            route["bytes"] += event.bytes or 0
+            if event.error or (event.status or 0) >= 400:
+                route["errors"] += 1
+            if event.total is not None and not event.cached:
+                route["samples"].append(event.total)
+
+    def report(self):
+        """{route: {count, errors, cached, bytes, p50, p95, p99}}"""
+        with self.lock:
+            routes = {key: dict(r, samples=sorted(r["samples"])) for key, r in self.routes.items()}
+        report = {}
+        for key, r in routes.items():
+            samples = r.pop("samples")
+            r.update({"p{}".format(q): percentile(samples, q) for q in (50, 95, 99)})
+            report[key] = r
+        return report
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
@@ -0,0 +1,68 @@
+"""
+    Helpers to defer work from import time to first use
+
+    LazyModule - imports an optional heavy dependency (pandas, numpy, click,
+                 httpx) on first attribute access
+    LazyClient - module level client (e.g. ``history.h``) created on first use
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """Stands in for ``import name``, importing it on first attribute access.
+
+    Like the ``np = None`` fallback for optional dependencies, it evaluates
+    to False when the module is not installed, so ``if not np:`` checks keep
+    working (and import the module).
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._missing = False
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __bool__(self):
+        if self._module is not None:
+            return True
+        if self._missing:
+            return False
+        try:
+            self._load()
+            return True
+        except ImportError:
+            self._missing = True
+            return False
+
+    def __repr__(self):
+        return "<lazy module {!r}>".format(self._name)
+
+
+class LazyClient:
+    """Client instance created by ``factory`` on first use, thread safe"""
+    def __init__(self, factory):
+        self.factory = factory
+        self.instance = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.instance is None:
+            with self._lock:
+                if self.instance is None:
+                    self.instance = self.factory()
+        return self.instance
+
+    def method(self, name):
+        """Module level function calling method ``name`` of the client"""
+        def function(*args, **kwargs):
+            return getattr(self.get(), name)(*args, **kwargs)
+        function.__name__ = function.__qualname__ = name
+        function.__doc__ = getattr(self.factory, name).__doc__
+        return function
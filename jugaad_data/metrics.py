@@ -0,0 +1,207 @@
+"""
+Cache metrics for util.cached and util.live_cache, kept per namespace
+(the app_name of the cached function, e.g. nsehistory-stock, or
+<class>-<method> for live quotes).
+
+    from jugaad_data import metrics
+    metrics.snapshot()["nsehistory-stock"]["misses"]
+    print(metrics.prometheus_text())
+
+Counters:
+    hits, misses            calls served from the cache / needing a fetch
+    bytes_read              bytes read from the store (memory tier excluded)
+    bytes_written           bytes written to the store
+
+Latency histograms (seconds):
+    fetch                   the wrapped function, i.e. the request to the exchange
+    read                    reading and decompressing entries from the store
+    deserialize             unpickling (or loading npz) cached values
+    lock_wait               waiting for other processes fetching the same entry
+
+Gauges, per namespace of their own (e.g. nsehistory for NSEHistory's
+concurrency controller, see jugaad_data.concurrency):
+    concurrency_limit       requests allowed in flight
+    in_flight               requests in flight
+
+For long running services, start_http_server(port) serves the Prometheus
+text format on /metrics from a daemon thread.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Same defaults as the Prometheus client libraries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNTERS = ("hits", "misses", "bytes_read", "bytes_written")
+HISTOGRAMS = ("fetch", "read", "deserialize", "lock_wait")
+GAUGES = ("concurrency_limit", "in_flight")
+PREFIX = "jugaad_cache"
+GAUGE_PREFIX = "jugaad"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def snapshot(self):
+        """Cumulative bucket counts keyed by upper bound, like Prometheus"""
+        cumulative, total = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative[bound] = total
+        return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+
+class Registry:
+    """Thread safe store of counters and histograms per namespace"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.namespaces = {}
+        self.gauges = {}
+
+    def _namespace(self, namespace):
+        ns = self.namespaces.get(namespace)
+        if ns is None:
+            ns = {name: 0 for name in COUNTERS}
+            ns.update({name: Histogram(self.buckets) for name in HISTOGRAMS})
+            self.namespaces[namespace] = ns
+        return ns
+
+    def inc(self, namespace, counter, value=1):
+        with self.lock:
+            self._namespace(namespace)[counter] += value
+
+    def observe(self, namespace, histogram, seconds):
+        with self.lock:
+            self._namespace(namespace)[histogram].observe(seconds)
+
+    def set(self, namespace, gauge, value):
+        with self.lock:
+            self.gauges.setdefault(namespace, dict.fromkeys(GAUGES, 0))[gauge] = value
+
+    @contextmanager
+    def timer(self, namespace, histogram):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(namespace, histogram, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                namespace: {name: value.snapshot() if isinstance(value, Histogram) else value
+                            for name, value in ns.items()}
+                for namespace, ns in self.namespaces.items()
+            }
+
+    def gauge_snapshot(self):
+        with self.lock:
+            return {namespace: dict(gauges) for namespace, gauges in self.gauges.items()}
+
+    def reset(self):
+        with self.lock:
+            self.namespaces.clear()
+            self.gauges.clear()
+
+
+registry = Registry()
+
+
+def snapshot():
+    """Returns {namespace: {counter: int, histogram: {'count', 'sum', 'buckets'}}}"""
+    return registry.snapshot()
+
+
+def gauges():
+    """Returns {namespace: {gauge: value}}"""
+    return registry.gauge_snapshot()
+
+
+def reset():
+    registry.reset()
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _float(value):
+    return repr(float(value))
+
+
+def prometheus_text(snap=None, gauge_snap=None):
+    """Renders a snapshot in the Prometheus text exposition format"""
+    snap = registry.snapshot() if snap is None else snap
+    gauge_snap = registry.gauge_snapshot() if gauge_snap is None else gauge_snap
+    lines = []
+    for counter in COUNTERS:
+        metric = "{}_{}_total".format(PREFIX, counter)
+        lines.append("# HELP {} Cache {}".format(metric, counter.replace("_", " ")))
+        lines.append("# TYPE {} counter".format(metric))
+        for namespace in sorted(snap):
+            lines.append('{}{{namespace="{}"}} {}'.format(
+                metric, _label(namespace), snap[namespace][counter]))
+    for histogram in HISTOGRAMS:
+        metric = "{}_{}_seconds".format(PREFIX, histogram)
+        lines.append("# HELP {} Cache {} latency in seconds".format(metric, histogram))
+        lines.append("# TYPE {} histogram".format(metric))
+        for namespace in sorted(snap):
+            h = snap[namespace][histogram]
+            label = _label(namespace)
+            for bound, count in h['buckets'].items():
+                lines.append('{}_bucket{{namespace="{}",le="{}"}} {}'.format(
+                    metric, label, _float(bound), count))
+            lines.append('{}_bucket{{namespace="{}",le="+Inf"}} {}'.format(
+                metric, label, h['count']))
+            lines.append('{}_sum{{namespace="{}"}} {}'.format(metric, label, _float(h['sum'])))
+            lines.append('{}_count{{namespace="{}"}} {}'.format(metric, label, h['count']))
+    for gauge in GAUGES:
+        if not gauge_snap:
+            break
+        metric = "{}_{}".format(GAUGE_PREFIX, gauge)
+        lines.append("# HELP {} {}".format(metric, gauge.replace("_", " ").capitalize()))
+        lines.append("# TYPE {} gauge".format(metric))
+        for namespace in sorted(gauge_snap):
+            lines.append('{}{{namespace="{}"}} {}'.format(
+                metric, _label(namespace), _float(gauge_snap[namespace][gauge])))
+    return "\n".join(lines) + "\n"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, addr=""):
+    """Serves prometheus_text() on http://addr:port/metrics from a daemon
+    thread, returns the server (call .shutdown() to stop it)"""
+    server = ThreadingHTTPServer((addr, port), _Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="jugaad-metrics", daemon=True)
+    thread.start()
+    return server
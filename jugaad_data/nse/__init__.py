@@ -1,3 +1,12 @@
 from .history import *
 from .archives import *
 from .live import *
+from .async_history import AsyncNSEHistory, AsyncNSEIndexHistory
+
+
+def __getattr__(name):
+    # h, ih, a and ia are created on first use by their modules
+    for module in (history, archives):
+        if name in module._clients:
+            return getattr(module, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -10,6 +10,9 @@ import zipfile
 import requests
 import pprint
 import json
+from ..transport import get_transport
+from .. import hooks
+from ..lazy import LazyClient
 
 
 class NSEDailyReports:
@@ -26,8 +29,9 @@ class NSEDailyReports:
     base_url = "https://nsearchives.nseindia.com/"
     timeout = 4
     
-    def __init__(self):
-        self.s = requests.Session()
+    def __init__(self, transport=None):
+        self.transport = transport or get_transport()
+        self.s = self.transport.session()
         h = {
             "user-agent": "Mozilla/5.0 (Windows NT 11.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.6998.166 Safari/537.36",
             "Sec-CH-UA": '"Google Chrome";v="134", "Chromium";v="134", "Not?A_Brand";v="99"',
@@ -116,7 +120,9 @@ class NSEDailyReports:
         
         url = f"{file_info['filePath']}{file_info['fileActlName']}"
         try:
-            r = self.s.get(url, timeout=self.timeout)
+            with self.transport.breakers.guard(url, file_key) as call, \
+                    hooks.track(self, file_key, {"segment": segment}) as event:
+                r = call.response = event.response = self.s.get(url, timeout=self.timeout)
             r.raise_for_status()
             return r.content
         except requests.exceptions.RequestException as e:
@@ -183,8 +189,9 @@ class NSEArchives:
     # Date when NSE switched to UDiff format (Unified Distilled File Format)
     udiff_start_date = date(2024, 7, 8)
        
-    def __init__(self):
-        self.s = requests.Session()
+    def __init__(self, transport=None):
+        self.transport = transport or get_transport()
+        self.s = self.transport.session()
         h = {
             "user-agent": "Mozilla/5.0 (Windows NT 11.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.6998.166 Safari/537.36",
             "Sec-CH-UA": '"Google Chrome";v="134", "Chromium";v="134", "Not?A_Brand";v="99"',
@@ -203,12 +210,15 @@ class NSEArchives:
                 "bulk_deals": "/content/equities/bulk.csv",
                 "bhavcopy_fo": "/content/historical/DERIVATIVES/{yyyy}/{MMM}/fo{dd}{MMM}{yyyy}bhav.csv.zip"
             }
-        self.daily_reports = NSEDailyReports()
+        # Own session for its headers, connections are shared
+        self.daily_reports = NSEDailyReports(self.transport)
         
     def get(self, rout, **params):
         url = self.base_url + self._routes[rout].format(**params)
-        self.r = self.s.get(url, timeout=self.timeout)
-        return self.r
+        with self.transport.breakers.guard(url, rout) as call, \
+                hooks.track(self, rout, params) as event:
+            r = call.response = event.response = self.s.get(url, timeout=self.timeout)
+        return r
     
     
     def bhavcopy_raw(self, dt):
@@ -435,8 +445,8 @@ class NSEArchives:
         return self.daily_reports.list_available_files(segment)
 
 class NSEIndicesArchives(NSEArchives):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, transport=None):
+        super().__init__(transport)
         self.base_url = "https://www.niftyindices.com"
         self._routes = { 
                 "bhavcopy": "/Daily_Snapshot/ind_close_all_{dd}{mm}{yyyy}.csv"
@@ -478,16 +488,24 @@ class NSEIndicesArchives(NSEArchives):
             fp.write(text)
         return fname
 
-a = NSEArchives()
-bhavcopy_raw = a.bhavcopy_raw
-bhavcopy_save = a.bhavcopy_save
-full_bhavcopy_raw = a.full_bhavcopy_raw
-full_bhavcopy_save = a.full_bhavcopy_save
-bhavcopy_fo_raw = a.bhavcopy_fo_raw
-bhavcopy_fo_save = a.bhavcopy_fo_save
-ia = NSEIndicesArchives()
-bhavcopy_index_raw = ia.bhavcopy_index_raw
-bhavcopy_index_save = ia.bhavcopy_index_save
+_a = LazyClient(NSEArchives)
+bhavcopy_raw = _a.method("bhavcopy_raw")
+bhavcopy_save = _a.method("bhavcopy_save")
+full_bhavcopy_raw = _a.method("full_bhavcopy_raw")
+full_bhavcopy_save = _a.method("full_bhavcopy_save")
+bhavcopy_fo_raw = _a.method("bhavcopy_fo_raw")
+bhavcopy_fo_save = _a.method("bhavcopy_fo_save")
+_ia = LazyClient(NSEIndicesArchives)
+bhavcopy_index_raw = _ia.method("bhavcopy_index_raw")
+bhavcopy_index_save = _ia.method("bhavcopy_index_save")
+
+# Module level clients, created when first used
+_clients = {"a": _a, "ia": _ia}
+
+def __getattr__(name):
+    if name in _clients:
+        return _clients[name].get()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 def expiry_dates(dt, instrument_type="", symbol="", contracts=0):
     txt = bhavcopy_fo_raw(dt)
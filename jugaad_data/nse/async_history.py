@@ -0,0 +1,234 @@
+"""
+    asyncio variants of NSEHistory and NSEIndexHistory built on httpx
+
+    All chunks of a request are fetched concurrently over one shared
+    connection pool, bounded by a semaphore, instead of through a thread
+    pool of ``workers`` threads. Chunks are split by the ``chunking``
+    strategy of the sync client, truncated ones fetched again in halves,
+    and cached with ``ut.async_cached`` in the same store and under the
+    same keys as the sync clients.
+
+        async with AsyncNSEHistory() as h:
+            rows = await asyncio.gather(*[h.stock_raw(s, from_date, to_date)
+                                          for s in symbols])
+"""
+import asyncio
+import itertools
+from urllib.parse import urljoin
+
+from jugaad_data import util as ut
+from jugaad_data.breaker import is_failure
+from jugaad_data.lazy import LazyModule
+from jugaad_data.transport import get_transport
+from .history import APP_NAME, NSEHistory, NSEIndexHistory
+
+httpx = LazyModule("httpx")
+
+# Requests in flight per client unless a semaphore is passed
+DEFAULT_MAX_CONCURRENCY = 64
+
+
+class AsyncNSEHistory:
+    """asyncio client for stock and derivatives history
+
+    Args:
+        max_concurrency (int): Requests in flight at a time
+        client (httpx.AsyncClient): Client to share with other async clients,
+            its connection pool is then shared too
+        semaphore (asyncio.Semaphore): Concurrency limit to share
+        transport (Transport): Rate limits and retry policy are taken from
+            it, so sync and async clients share one request budget per host
+        timeout (float): Seconds per request
+    """
+    sync_class = NSEHistory
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, client=None,
+                 semaphore=None, transport=None, timeout=30):
+        if not httpx:
+            raise ModuleNotFoundError("Please install httpx using \n pip install httpx")
+        self.transport = transport or get_transport()
+        # Headers, paths and request parameters are those of the sync client
+        self.sync = self.sync_class(self.transport)
+        self.base_url = self.sync.base_url
+        self.path_map = self.sync.path_map
+        self.chunking = self.sync.chunking
+        self._own_client = client is None
+        if client is None:
+            limits = httpx.Limits(max_connections=max_concurrency,
+                                  max_keepalive_connections=max_concurrency)
+            client = httpx.AsyncClient(limits=limits, timeout=timeout,
+                                       verify=self.sync.ssl_verify)
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._shared_semaphore = semaphore
+        # Created in the loop that uses them, see _primitives
+        self._loop = None
+        self._semaphore = None
+        self._bootstrap_lock = None
+        self._session_generation = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        """Closes the httpx client unless it was passed in"""
+        if self._own_client:
+            await self.client.aclose()
+
+    def _primitives(self):
+        """Semaphore and bootstrap lock for the running loop. On Python 3.9
+        asyncio primitives are bound to the loop current when they are
+        created, so they are created in the loop using them"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = self._shared_semaphore or asyncio.Semaphore(self.max_concurrency)
+            self._bootstrap_lock = asyncio.Lock()
+            self._loop = loop
+        return self._semaphore, self._bootstrap_lock
+
+    @property
+    def semaphore(self):
+        return self._primitives()[0]
+
+    async def _send(self, method, url, **kw):
+        """Sends a request within the concurrency limit, paced by the
+        transport's rate limiter and retried according to its policy"""
+        host = httpx.URL(url).host
+        retry = self.transport.retry
+        bucket = self.transport.limiter.bucket(host)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                # A bucket shared between processes waits for a file lock
+                if bucket.blocking:
+                    wait = await asyncio.to_thread(bucket.reserve)
+                else:
+                    wait = bucket.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            try:
+                async with self.semaphore:
+                    r = await self.client.request(method, url, headers=self.sync.headers, **kw)
+            except (httpx.TransportError, httpx.TimeoutException):
+                if attempt >= retry.retries:
+                    raise
+                delay = retry.delay(attempt)
+            else:
+                if attempt >= retry.retries or r.status_code not in retry.statuses:
+                    return r
+                delay = retry.delay(attempt, r)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _bootstrap(self, generation=None):
+        """Fetches session cookies once for concurrent callers, see
+        NSEHistory._bootstrap"""
+        async with self._primitives()[1]:
+            if generation is None:
+                if self._session_generation:
+                    return
+            elif generation != self._session_generation:
+                return
+            else:
+                self.client.cookies.clear()
+            url = urljoin(self.base_url, self.path_map["equity_quote_page"])
+            await self._send("GET", url)
+            self._session_generation += 1
+
+    async def _get(self, path_name, params):
+        url = urljoin(self.base_url, self.path_map[path_name])
+        # Same circuit breakers as the sync clients
+        with self.transport.breakers.guard(url, path_name) as call:
+            if not self._session_generation:
+                await self._bootstrap()
+            generation = self._session_generation
+            r = await self._send("GET", url, params=params)
+            if r.status_code in (401, 403):
+                # Session expired, renew the cookies and try once more
+                await self._bootstrap(generation)
+                r = await self._send("GET", url, params=params)
+            call.response = r
+        if r.is_error:
+            # A clear error instead of failing to parse the error page
+            r.raise_for_status()
+        return r
+
+    def _date_ranges(self, from_date, to_date, route):
+        """Ranges requested for from_date - to_date, oldest first"""
+        return self.chunking.split(from_date, to_date, route)
+
+    async def _complete(self, rows, route, date_field, from_date, to_date, fetch):
+        """NSEHistory._complete, both halves of a truncated range are
+        fetched concurrently"""
+        def row_date(row):
+            return ut.parse_date(row.get(date_field))
+        if not self.chunking.truncated(rows, from_date, to_date, route, row_date):
+            return rows
+        older, newer = self.chunking.halves(from_date, to_date)
+        halves = await asyncio.gather(fetch(*newer), fetch(*older))
+        return halves[0] + halves[1]
+
+    @ut.async_cached(APP_NAME + '-stock', date_field="CH_TIMESTAMP")
+    async def _stock(self, symbol, from_date, to_date, series="EQ"):
+        params = self.sync._stock_params(symbol, from_date, to_date, series)
+        r = await self._get("stock_history", params)
+        return await self._complete(r.json()['data'], "stock_history", "CH_TIMESTAMP",
+                                    from_date, to_date,
+                                    lambda f, t: self._stock(symbol, f, t, series))
+
+    @ut.async_cached(APP_NAME + '-derivatives', date_field="FH_TIMESTAMP")
+    async def _derivatives(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
+        params = self.sync._derivatives_params(symbol, from_date, to_date, expiry_date,
+                                               instrument_type, strike_price, option_type)
+        r = await self._get("derivatives", params)
+        return await self._complete(r.json()['data'], "derivatives", "FH_TIMESTAMP",
+                                    from_date, to_date,
+                                    lambda f, t: self._derivatives(symbol, f, t, expiry_date,
+                                                                   instrument_type, strike_price,
+                                                                   option_type))
+
+    async def _gather(self, function, params):
+        chunks = await asyncio.gather(*[function(*p) for p in params])
+        return list(itertools.chain.from_iterable(chunks))
+
+    async def stock_raw(self, symbol, from_date, to_date, series="EQ"):
+        date_ranges = self._date_ranges(from_date, to_date, "stock_history")
+        params = [(symbol, x[0], x[1], series) for x in reversed(date_ranges)]
+        return await self._gather(self._stock, params)
+
+    async def derivatives_raw(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
+        date_ranges = self._date_ranges(from_date, to_date, "derivatives")
+        params = [(symbol, x[0], x[1], expiry_date, instrument_type, strike_price, option_type)
+                  for x in reversed(date_ranges)]
+        return await self._gather(self._derivatives, params)
+
+
+class AsyncNSEIndexHistory(AsyncNSEHistory):
+    """asyncio client for index history from niftyindices.com"""
+    sync_class = NSEIndexHistory
+
+    async def _bootstrap(self, generation=None):
+        pass
+
+    async def _post_json(self, path_name, params):
+        url = urljoin(self.base_url, self.path_map[path_name])
+        with self.transport.breakers.guard(url, path_name) as call:
+            r = call.response = await self._send("POST", url, json=params)
+        if r.is_error:
+            r.raise_for_status()
+        return r
+
+    @ut.async_cached(APP_NAME + '-index', date_field="HistoricalDate")
+    async def _index(self, symbol, from_date, to_date):
+        params = self.sync._cinfo_params(symbol, symbol, from_date, to_date)
+        r = await self._post_json("index_history", params=params)
+        return await self._complete(r.json(), "index_history", "HistoricalDate",
+                                    from_date, to_date, lambda f, t: self._index(symbol, f, t))
+
+    async def index_raw(self, symbol, from_date, to_date):
+        date_ranges = self._date_ranges(from_date, to_date, "index_history")
+        params = [(symbol, x[0], x[1]) for x in reversed(date_ranges)]
+        return await self._gather(self._index, params)
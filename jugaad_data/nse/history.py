@@ -5,20 +5,24 @@
 """
 import os
 import json
+import threading
 import itertools
 import csv
 from pprint import pprint
 from urllib.parse import urljoin
-from requests import Session
 #from bs4 import BeautifulSoup
-import click
-try:
-    import pandas as pd
-    import numpy as np
-except:
-    pd = None
 
 from jugaad_data import util as ut
+from jugaad_data import hooks
+from jugaad_data.lazy import LazyModule, LazyClient
+from jugaad_data.transport import get_transport, default_timeout
+from jugaad_data.breaker import is_failure
+from jugaad_data.chunking import default_chunking
+# Imported on first use, they take longer to import than the rest of the package
+click = LazyModule("click")
+pd = LazyModule("pandas")
+np = LazyModule("numpy")
+
 from .archives import (bhavcopy_raw, bhavcopy_save, 
                         full_bhavcopy_raw, full_bhavcopy_save,
                         bhavcopy_fo_raw, bhavcopy_fo_save,
@@ -26,7 +30,7 @@ from .archives import (bhavcopy_raw, bhavcopy_save,
 
 APP_NAME = "nsehistory"
 class NSEHistory:
-    def __init__(self):
+    def __init__(self, transport=None):
         
         self.headers = {
             "accept": "*/*",
@@ -52,40 +56,104 @@ class NSEHistory:
         self.base_url = "https://www.nseindia.com"
         self.cache_dir = ".cache"
         self.workers = 2
+        # concurrency.AIMDController adapting the requests in flight, replaces workers
+        self.concurrency = None
+        # How date ranges are split into requests, see jugaad_data.chunking
+        self.chunking = default_chunking()
         self.use_threads = True
         self.show_progress = False
 
-        self.s = Session()
-        self.s.headers.update(self.headers)
+        self.transport = transport or get_transport()
+        self.s = self.transport.session(self.headers)
         self.ssl_verify = True
-
-    def _get(self, path_name, params):
-        # Fetch cookies from the report page to maintain session
-        if not self.s.cookies:
+        # Seconds per request, J_HTTP_TIMEOUT or 30 by default
+        self.timeout = default_timeout()
+        # Guards fetching session cookies, shared by all worker threads
+        self._session_lock = threading.Lock()
+        self._session_generation = 0
+        # Cache typed columns of each chunk for the *_df functions
+        self.columnar_cache = bool(os.environ.get("J_CACHE_COLUMNAR"))
+
+    def _bootstrap(self, generation=None):
+        """Fetches session cookies from the report page, only once for any
+        number of concurrent callers.
+
+        Without generation, cookies are fetched only if there are none yet.
+        With the generation a failed request was sent with, they are fetched
+        again unless another thread has already done so since.
+        """
+        with self._session_lock:
+            if generation is None:
+                if self.s.cookies:
+                    return
+            elif generation != self._session_generation:
+                return
+            else:
+                self.s.cookies.clear()
             path = self.path_map["equity_quote_page"]
             url = urljoin(self.base_url, path)
-            self.s.get(url, verify=self.ssl_verify)
+            self.s.get(url, verify=self.ssl_verify, timeout=self.timeout)
+            self._session_generation += 1
+
+    def _get(self, path_name, params):
         path = self.path_map[path_name]
         url = urljoin(self.base_url, path)
-        self.r = self.s.get(url, params=params, verify=self.ssl_verify)
-        return self.r
+        # Fails fast while the endpoint is down, see jugaad_data.breaker
+        with self.transport.breakers.guard(url, path_name) as call:
+            # Fetch cookies from the report page to maintain session
+            if not self.s.cookies:
+                self._bootstrap()
+            generation = self._session_generation
+            # Keep a pooled connection per worker thread
+            self.transport.reserve(url, self._pool_width())
+            with hooks.track(self, path_name, params) as event:
+                r = self.s.get(url, params=params, verify=self.ssl_verify, timeout=self.timeout)
+                if r.status_code in (401, 403):
+                    # Session expired, renew the cookies and try once more
+                    self._bootstrap(generation)
+                    r = self.s.get(url, params=params, verify=self.ssl_verify, timeout=self.timeout)
+                call.response = event.response = r
+        if is_failure(r):
+            # A clear error instead of failing to parse the error page
+            r.raise_for_status()
+        return r
     
-    @ut.cached(APP_NAME + '-stock')
-    def _stock(self, symbol, from_date, to_date, series="EQ"):
-        params = {
+    def _date_ranges(self, from_date, to_date, route):
+        """Ranges requested for from_date - to_date, oldest first"""
+        return self.chunking.split(from_date, to_date, route)
+
+    def _complete(self, rows, route, date_field, from_date, to_date, fetch):
+        """Returns the rows of a chunk, or if the endpoint truncated them the
+        rows of fetch(from_date, to_date) for both halves of the range"""
+        def row_date(row):
+            return ut.parse_date(row.get(date_field))
+        if not self.chunking.truncated(rows, from_date, to_date, route, row_date):
+            return rows
+        older, newer = self.chunking.halves(from_date, to_date)
+        return fetch(*newer) + fetch(*older)
+
+    def _pool_width(self):
+        """Requests that may be in flight at once"""
+        return self.concurrency.max_limit if self.concurrency else self.workers
+
+    def _stock_params(self, symbol, from_date, to_date, series="EQ"):
+        return {
             'symbol': symbol,
             'from': from_date.strftime('%d-%m-%Y'),
             'to': to_date.strftime('%d-%m-%Y'),
             'type': 'priceVolumeDeliverable',
             'series': series if series != "EQ" else "ALL"
         }
-        self.r = self._get("stock_history", params)
-        j = self.r.json()
-        return j['data']
-    
+
+    @ut.cached(APP_NAME + '-stock', date_field="CH_TIMESTAMP")
+    def _stock(self, symbol, from_date, to_date, series="EQ"):
+        params = self._stock_params(symbol, from_date, to_date, series)
+        r = self._get("stock_history", params)
+        j = r.json()
+        return self._complete(j['data'], "stock_history", "CH_TIMESTAMP", from_date, to_date,
+                              lambda f, t: self._stock(symbol, f, t, series))
     
-    @ut.cached(APP_NAME + '-derivatives')
-    def _derivatives(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
+    def _derivatives_params(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
         valid_instrument_types = ["OPTIDX", "OPTSTK", "FUTIDX", "FUTSTK"]
         if instrument_type not in valid_instrument_types:
             raise Exception("Invalid instrument_type, should be one of {}".format(", ".join(valid_instrument_types)))
@@ -104,29 +172,115 @@ class NSEHistory:
                 
             params['strikePrice'] = "{:.2f}".format(strike_price)
             params['optionType'] = option_type
-        
-        self.r = self._get("derivatives", params)
-        j = self.r.json()
-        return j['data']
+        return params
+
+    @ut.cached(APP_NAME + '-derivatives', date_field="FH_TIMESTAMP")
+    def _derivatives(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
+        params = self._derivatives_params(symbol, from_date, to_date, expiry_date, instrument_type, strike_price, option_type)
+        r = self._get("derivatives", params)
+        j = r.json()
+        return self._complete(j['data'], "derivatives", "FH_TIMESTAMP", from_date, to_date,
+                              lambda f, t: self._derivatives(symbol, f, t, expiry_date, instrument_type,
+                                                             strike_price, option_type))
     
-    def stock_raw(self, symbol, from_date, to_date, series="EQ"):
-        date_ranges = ut.break_dates(from_date, to_date)
+    @ut.cached(APP_NAME + '-stock-columns', serializer=ut.npz_serializer)
+    def _stock_columns(self, symbol, from_date, to_date, series="EQ"):
+        rows = self._stock(symbol, from_date, to_date, series)
+        return ut.to_columns(rows, stock_select_headers, stock_dtypes)
+
+    @ut.cached(APP_NAME + '-derivatives-columns', serializer=ut.npz_serializer)
+    def _derivatives_columns(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
+        rows = self._derivatives(symbol, from_date, to_date, expiry_date, instrument_type, strike_price, option_type)
+        select_headers, _, dtypes = derivatives_columns_spec(instrument_type)
+        return ut.to_columns(rows, select_headers, dtypes)
+
+    def stock_columns(self, symbol, from_date, to_date, series="EQ"):
+        """Returns list of per chunk dicts of typed numpy arrays keyed by
+        stock_select_headers, newest chunk first"""
+        date_ranges = self._date_ranges(from_date, to_date, "stock_history")
+        params = [(symbol, x[0], x[1], series) for x in reversed(date_ranges)]
+        return ut.pool_cached(self._stock_columns, params, max_workers=self.workers,
+                              controller=self.concurrency)
+
+    def derivatives_columns(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
+        """Same as stock_columns for derivatives, see derivatives_columns_spec"""
+        date_ranges = self._date_ranges(from_date, to_date, "derivatives")
+        params = [(symbol, x[0], x[1], expiry_date, instrument_type, strike_price, option_type) for x in reversed(date_ranges)]
+        return ut.pool_cached(self._derivatives_columns, params, max_workers=self.workers,
+                              controller=self.concurrency)
+
+    def stock_raw(self, symbol, from_date, to_date, series="EQ", progress=None):
+        """progress is called with the number of chunks done, see ut.pool"""
+        date_ranges = self._date_ranges(from_date, to_date, "stock_history")
         params = [(symbol, x[0], x[1], series) for x in reversed(date_ranges)]
-        chunks = ut.pool(self._stock, params, max_workers=self.workers)
+        chunks = ut.pool_cached(self._stock, params, max_workers=self.workers,
+                                controller=self.concurrency, progress=progress)
             
         return list(itertools.chain.from_iterable(chunks))
 
-    def derivatives_raw(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price, option_type):
-        date_ranges = ut.break_dates(from_date, to_date)
+    def iter_stock(self, symbol, from_date, to_date, series="EQ", ordered=False, window=None):
+        """Yields the rows of stock_raw one chunk at a time, as each is
+        downloaded, so they can be processed without holding all of them.
+
+        With ordered, chunks come in the order of stock_raw (newest first).
+        At most window chunks (2 * workers by default) are downloading or
+        waiting to be yielded, see ut.pool_iter.
+        """
+        date_ranges = self._date_ranges(from_date, to_date, "stock_history")
+        params = [(symbol, x[0], x[1], series) for x in reversed(date_ranges)]
+        return ut.pool_iter(self._stock, params, max_workers=self.workers,
+                            controller=self.concurrency, ordered=ordered, window=window)
+
+    def _stock_groups(self, symbols, from_date, to_date, series):
+        date_ranges = self._date_ranges(from_date, to_date, "stock_history")
+        return [(symbol, [(symbol, x[0], x[1], series) for x in reversed(date_ranges)])
+                for symbol in symbols]
+
+    def stock_raw_many(self, symbols, from_date, to_date, series="EQ"):
+        """Fetches stock_raw of many symbols, the chunks of all of them
+        on one pool of workers (or concurrency) threads.
+
+        Yields (symbol, rows, error) as soon as all chunks of a symbol are
+        in, in no particular order. If a chunk failed, rows is None and
+        error the exception, the other symbols are still fetched.
+        """
+        groups = self._stock_groups(symbols, from_date, to_date, series)
+        batch = ut.pool_groups(self._stock, groups, max_workers=self.workers,
+                               controller=self.concurrency)
+        for symbol, chunks, error in batch:
+            rows = None if error else list(itertools.chain.from_iterable(chunks))
+            yield symbol, rows, error
+
+    def stock_columns_many(self, symbols, from_date, to_date, series="EQ"):
+        """Same as stock_raw_many, yielding the typed column chunks of
+        stock_columns"""
+        groups = self._stock_groups(symbols, from_date, to_date, series)
+        return ut.pool_groups(self._stock_columns, groups, max_workers=self.workers,
+                              controller=self.concurrency)
+
+    def iter_derivatives(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None, ordered=False, window=None):
+        """Same as iter_stock for derivatives_raw"""
+        date_ranges = self._date_ranges(from_date, to_date, "derivatives")
         params = [(symbol, x[0], x[1], expiry_date, instrument_type, strike_price, option_type) for x in reversed(date_ranges)]
-        chunks = ut.pool(self._derivatives, params, max_workers=self.workers)
+        return ut.pool_iter(self._derivatives, params, max_workers=self.workers,
+                            controller=self.concurrency, ordered=ordered, window=window)
+
+    def derivatives_raw(self, symbol, from_date, to_date, expiry_date, instrument_type, strike_price, option_type, progress=None):
+        """progress is called with the number of chunks done, see ut.pool"""
+        date_ranges = self._date_ranges(from_date, to_date, "derivatives")
+        params = [(symbol, x[0], x[1], expiry_date, instrument_type, strike_price, option_type) for x in reversed(date_ranges)]
+        chunks = ut.pool_cached(self._derivatives, params, max_workers=self.workers,
+                                controller=self.concurrency, progress=progress)
         return list(itertools.chain.from_iterable(chunks))
 
        
 
-h = NSEHistory()
-stock_raw = h.stock_raw
-derivatives_raw = h.derivatives_raw
+_h = LazyClient(NSEHistory)
+stock_raw = _h.method("stock_raw")
+stock_raw_many = _h.method("stock_raw_many")
+derivatives_raw = _h.method("derivatives_raw")
+iter_stock = _h.method("iter_stock")
+iter_derivatives = _h.method("iter_derivatives")
 stock_select_headers = [  "CH_TIMESTAMP", "CH_SERIES", 
                     "CH_OPENING_PRICE", "CH_TRADE_HIGH_PRICE",
                     "CH_TRADE_LOW_PRICE", "CH_PREVIOUS_CLS_PRICE",
@@ -154,16 +308,10 @@ stock_dtypes = [  ut.np_date,  str,
    
 def stock_csv(symbol, from_date, to_date, series="EQ", output="", show_progress=True):
     if show_progress:
-        h = NSEHistory()
-        h.show_progress = show_progress
-        date_ranges = ut.break_dates(from_date, to_date)
-        params = [(symbol, x[0], x[1], series) for x in reversed(date_ranges)]
-        with click.progressbar(params, label=symbol) as ps:
-            chunks = []
-            for p in ps:
-                r = h.stock_raw(*p)
-                chunks.append(r)
-            raw = list(itertools.chain.from_iterable(chunks))
+        # Chunks are fetched in parallel, the bar moves as each one is done
+        chunk_count = len(_h.get()._date_ranges(from_date, to_date, "stock_history"))
+        with click.progressbar(length=chunk_count, label=symbol) as bar:
+            raw = stock_raw(symbol, from_date, to_date, series, progress=bar.update)
     else:
         raw = stock_raw(symbol, from_date, to_date, series)
 
@@ -178,15 +326,45 @@ def stock_csv(symbol, from_date, to_date, series="EQ", output="", show_progress=
                 fp.write(line) 
     return output
 
+def columns_df(chunks, select_headers, final_headers):
+    """Builds a DataFrame by concatenating typed column chunks"""
+    data = {}
+    for select, final in zip(select_headers, final_headers):
+        data[final] = np.concatenate([c[select] for c in chunks]) if chunks else np.array([])
+    return pd.DataFrame(data, columns=final_headers)
+
+def raw_df(raw, select_headers, final_headers, dtypes):
+    """Builds a DataFrame from rows of the API, converting each column"""
+    df = pd.DataFrame(raw, columns=select_headers)
+    df.columns = final_headers
+    for i, header in enumerate(final_headers):
+        df[header] = ut.convert_column(df[header], dtypes[i])
+    return df
+
 def stock_df(symbol, from_date, to_date, series="EQ"):
     if not pd:
         raise ModuleNotFoundError("Please install pandas using \n pip install pandas")
+    h = _h.get()
+    if h.columnar_cache:
+        chunks = h.stock_columns(symbol, from_date, to_date, series)
+        return columns_df(chunks, stock_select_headers, stock_final_headers)
     raw = stock_raw(symbol, from_date, to_date, series)
-    df = pd.DataFrame(raw)[stock_select_headers]
-    df.columns = stock_final_headers
-    for i, h in enumerate(stock_final_headers):
-        df[h] = df[h].apply(stock_dtypes[i])
-    return df
+    return raw_df(raw, stock_select_headers, stock_final_headers, stock_dtypes)
+
+def stock_df_many(symbols, from_date, to_date, series="EQ"):
+    """Yields (symbol, DataFrame, error) for many symbols as they complete,
+    see NSEHistory.stock_raw_many"""
+    if not pd:
+        raise ModuleNotFoundError("Please install pandas using \n pip install pandas")
+    h = _h.get()
+    if h.columnar_cache:
+        for symbol, chunks, error in h.stock_columns_many(symbols, from_date, to_date, series):
+            df = None if error else columns_df(chunks, stock_select_headers, stock_final_headers)
+            yield symbol, df, error
+        return
+    for symbol, raw, error in h.stock_raw_many(symbols, from_date, to_date, series):
+        df = None if error else raw_df(raw, stock_select_headers, stock_final_headers, stock_dtypes)
+        yield symbol, df, error
 
 futures_select_headers = [  "FH_TIMESTAMP", "FH_EXPIRY_DT", 
                     "FH_OPENING_PRICE", "FH_TRADE_HIGH_PRICE",
@@ -217,16 +395,10 @@ options_final_headers = [   "DATE", "EXPIRY", "OPTION TYPE", "STRIKE PRICE",
 
 def derivatives_csv(symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None, output="", show_progress=False):
     if show_progress:
-        h = NSEHistory()
-        h.show_progress = show_progress
-        date_ranges = ut.break_dates(from_date, to_date)
-        params = [(symbol, x[0], x[1], expiry_date, instrument_type, strike_price, option_type) for x in reversed(date_ranges)]
-        with click.progressbar(params, label=symbol) as ps:
-            chunks = []
-            for p in ps:
-                r = h.derivatives_raw(*p)
-                chunks.append(r)
-            raw = list(itertools.chain.from_iterable(chunks))
+        chunk_count = len(_h.get()._date_ranges(from_date, to_date, "derivatives"))
+        with click.progressbar(length=chunk_count, label=symbol) as bar:
+            raw = derivatives_raw(symbol, from_date, to_date, expiry_date, instrument_type,
+                                  strike_price, option_type, progress=bar.update)
     else:
         raw = derivatives_raw(symbol, from_date, to_date, expiry_date, instrument_type, strike_price, option_type)
     if not output:
@@ -246,44 +418,46 @@ def derivatives_csv(symbol, from_date, to_date, expiry_date, instrument_type, st
                 fp.write(line) 
     return output
 
+futures_dtypes = [  ut.np_date, ut.np_date, 
+            ut.np_float, ut.np_float,
+            ut.np_float, ut.np_float,
+            ut.np_float, ut.np_float,
+            ut.np_int, ut.np_int,
+            ut.np_float, ut.np_float, ut.np_float,
+            str]
+
+options_dtypes = [  ut.np_date, ut.np_date, str, ut.np_float,
+            ut.np_float, ut.np_float,
+            ut.np_float, ut.np_float,
+            ut.np_float, ut.np_float,
+            ut.np_int, ut.np_int,
+            ut.np_float, ut.np_float, ut.np_float,
+            str]
+
+def derivatives_columns_spec(instrument_type):
+    """Returns (select_headers, final_headers, dtypes) for instrument_type"""
+    if "FUT" in instrument_type:
+        return futures_select_headers, futures_final_headers, futures_dtypes
+    if "OPT" in instrument_type:
+        return options_select_headers, options_final_headers, options_dtypes
+    raise Exception("Invalid instrument_type, should be one of OPTIDX, OPTSTK, FUTIDX, FUTSTK")
+
 def derivatives_df(symbol, from_date, to_date, expiry_date, instrument_type, strike_price=None, option_type=None):
     if not pd:
         raise ModuleNotFoundError("Please install pandas using \n pip install pandas")
+    select_headers, final_headers, dtypes = derivatives_columns_spec(instrument_type)
+    h = _h.get()
+    if h.columnar_cache:
+        chunks = h.derivatives_columns(symbol, from_date, to_date, expiry_date, instrument_type,
+                                       strike_price=strike_price, option_type=option_type)
+        return columns_df(chunks, select_headers, final_headers)
     raw = derivatives_raw(symbol, from_date, to_date, expiry_date, instrument_type, 
                             strike_price=strike_price, option_type=option_type)
-    futures_dtype = [  ut.np_date, ut.np_date, 
-                ut.np_float, ut.np_float,
-                ut.np_float, ut.np_float,
-                ut.np_float, ut.np_float,
-                ut.np_int, ut.np_int,
-                ut.np_float, ut.np_float, ut.np_float,
-                str]
-    
-    options_dtype = [  ut.np_date, ut.np_date, str, ut.np_float,
-                ut.np_float, ut.np_float,
-                ut.np_float, ut.np_float,
-                ut.np_float, ut.np_float,
-                ut.np_int, ut.np_int,
-                ut.np_float, ut.np_float, ut.np_float,
-                str]
-
-    if "FUT" in instrument_type:
-        final_headers = futures_final_headers
-        select_headers = futures_select_headers
-        dtypes = futures_dtype
-    if "OPT" in instrument_type:
-        final_headers = options_final_headers
-        select_headers = options_select_headers
-        dtypes = options_dtype
-    df = pd.DataFrame(raw)[select_headers]
-    df.columns = final_headers
-    for i, h in enumerate(final_headers):
-        df[h] = df[h].apply(dtypes[i])
-    return df
+    return raw_df(raw, select_headers, final_headers, dtypes)
 
 class NSEIndexHistory(NSEHistory):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, transport=None):
+        super().__init__(transport)
         self.headers = {
             "Host": "niftyindices.com",
             "Referer": "niftyindices.com",
@@ -311,68 +485,76 @@ class NSEIndexHistory(NSEHistory):
             "index_name_list": "/BackPage/gethistoricaltypeindexdata",
         }
         self.base_url = "https://niftyindices.com"
-        self.s = Session()
-        self.s.headers.update(self.headers)
+        self.s = self.transport.session(self.headers)
         self.ssl_verify = True
 
     def _post_json(self, path_name, params):
         path = self.path_map[path_name]
         url = urljoin(self.base_url, path)
-        self.r = self.s.post(url, json=params, verify=self.ssl_verify)
-        return self.r
+        self.transport.reserve(url, self._pool_width())
+        with self.transport.breakers.guard(url, path_name) as call, \
+                hooks.track(self, path_name, params, method="POST") as event:
+            r = self.s.post(url, json=params, verify=self.ssl_verify, timeout=self.timeout)
+            call.response = event.response = r
+        return r
     
-    @ut.cached(APP_NAME + '-index')
-    def _index(self, symbol, from_date, to_date):
+    def _cinfo_params(self, name, index_name, from_date, to_date):
         cinfo = {
-            'name': symbol,
+            'name': name,
             'startDate': from_date.strftime("%d-%b-%Y"),
             'endDate': to_date.strftime("%d-%b-%Y"),
-            'indexName': symbol,
+            'indexName': index_name,
         }
-        params = {'cinfo': str(cinfo).replace('"', "'")}
+        return {'cinfo': str(cinfo).replace('"', "'")}
+
+    @ut.cached(APP_NAME + '-index', date_field="HistoricalDate")
+    def _index(self, symbol, from_date, to_date):
+        params = self._cinfo_params(symbol, symbol, from_date, to_date)
         r = self._post_json("index_history", params=params)
-        return self.r.json()
+        return self._complete(r.json(), "index_history", "HistoricalDate", from_date, to_date,
+                              lambda f, t: self._index(symbol, f, t))
     
-    def index_raw(self, symbol, from_date, to_date):
-        date_ranges = ut.break_dates(from_date, to_date)
+    def index_raw(self, symbol, from_date, to_date, progress=None):
+        """progress is called with the number of chunks done, see ut.pool"""
+        date_ranges = self._date_ranges(from_date, to_date, "index_history")
         params = [(symbol, x[0], x[1]) for x in reversed(date_ranges)]
-        chunks = ut.pool(self._index, params, max_workers=self.workers)
+        chunks = ut.pool_cached(self._index, params, max_workers=self.workers,
+                                controller=self.concurrency, progress=progress)
         return list(itertools.chain.from_iterable(chunks))
     
-    @ut.cached(APP_NAME + '-index_pe')
+    def iter_index(self, symbol, from_date, to_date, ordered=False, window=None):
+        """Same as NSEHistory.iter_stock for index_raw"""
+        date_ranges = self._date_ranges(from_date, to_date, "index_history")
+        params = [(symbol, x[0], x[1]) for x in reversed(date_ranges)]
+        return ut.pool_iter(self._index, params, max_workers=self.workers,
+                            controller=self.concurrency, ordered=ordered, window=window)
+
+    @ut.cached(APP_NAME + '-index_pe', date_field="DATE")
     def _index_pe(self, symbol, from_date, to_date):
-        cinfo = {
-            'name': symbol,
-            'startDate': from_date.strftime("%d-%b-%Y"),
-            'endDate': to_date.strftime("%d-%b-%Y"),
-            'indexName': symbol,
-        }
-        params = {'cinfo': str(cinfo).replace('"', "'")}
+        params = self._cinfo_params(symbol, symbol, from_date, to_date)
         r = self._post_json("index_pe_history", params=params)
-        return self.r.json()
+        return self._complete(r.json(), "index_pe_history", "DATE", from_date, to_date,
+                              lambda f, t: self._index_pe(symbol, f, t))
 
     def index_pe_raw(self, symbol, from_date, to_date):
-        date_ranges = ut.break_dates(from_date, to_date)
+        date_ranges = self._date_ranges(from_date, to_date, "index_pe_history")
         params = [(symbol, x[0], x[1]) for x in reversed(date_ranges)]
-        chunks = ut.pool(self._index_pe, params, max_workers=self.workers)
+        chunks = ut.pool_cached(self._index_pe, params, max_workers=self.workers,
+                                controller=self.concurrency)
         return list(itertools.chain.from_iterable(chunks))
 
-    @ut.cached(APP_NAME + '-index_tri')
+    @ut.cached(APP_NAME + '-index_tri', date_field="Date")
     def _index_tri(self, name, index_name, from_date, to_date):
-        cinfo = {
-            'name': name,
-            'startDate': from_date.strftime("%d-%b-%Y"),
-            'endDate': to_date.strftime("%d-%b-%Y"),
-            'indexName': index_name,
-        }
-        params = {'cinfo': str(cinfo).replace('"', "'")}
+        params = self._cinfo_params(name, index_name, from_date, to_date)
         r = self._post_json("index_tri_history", params=params)
-        return self.r.json()
+        return self._complete(r.json(), "index_tri_history", "Date", from_date, to_date,
+                              lambda f, t: self._index_tri(name, index_name, f, t))
 
     def index_tri_raw(self, name, index_name, from_date, to_date):
-        date_ranges = ut.break_dates(from_date, to_date)
+        date_ranges = self._date_ranges(from_date, to_date, "index_tri_history")
         params = [(name, index_name, x[0], x[1]) for x in reversed(date_ranges)]
-        chunks = ut.pool(self._index_tri, params, max_workers=self.workers)
+        chunks = ut.pool_cached(self._index_tri, params, max_workers=self.workers,
+                                controller=self.concurrency)
         return list(itertools.chain.from_iterable(chunks))
 
     def index_type_list(self):
@@ -408,25 +590,28 @@ class NSEIndexHistory(NSEHistory):
         return [x['indextype'] for x in r.json() if x.get('indextype')]
 
 
-ih = NSEIndexHistory()
-index_raw = ih.index_raw
-index_pe_raw = ih.index_pe_raw
-index_tri_raw = ih.index_tri_raw
-index_type_list = ih.index_type_list
-index_subtype_list = ih.index_subtype_list
-index_name_list = ih.index_name_list
+_ih = LazyClient(NSEIndexHistory)
+index_raw = _ih.method("index_raw")
+iter_index = _ih.method("iter_index")
+index_pe_raw = _ih.method("index_pe_raw")
+index_tri_raw = _ih.method("index_tri_raw")
+index_type_list = _ih.method("index_type_list")
+index_subtype_list = _ih.method("index_subtype_list")
+index_name_list = _ih.method("index_name_list")
+
+# Module level clients, created when first used
+_clients = {"h": _h, "ih": _ih}
+
+def __getattr__(name):
+    if name in _clients:
+        return _clients[name].get()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 def index_csv(symbol, from_date, to_date, output="", show_progress=False):
     if show_progress:
-        h = NSEIndexHistory()
-        date_ranges = ut.break_dates(from_date, to_date)
-        params = [(symbol, x[0], x[1]) for x in reversed(date_ranges)]
-        with click.progressbar(params, label=symbol) as ps:
-            chunks = []
-            for p in ps:
-                r = h._index(*p)
-                chunks.append(r)
-            raw = list(itertools.chain.from_iterable(chunks))
+        chunk_count = len(_ih.get()._date_ranges(from_date, to_date, "index_history"))
+        with click.progressbar(length=chunk_count, label=symbol) as bar:
+            raw = index_raw(symbol, from_date, to_date, progress=bar.update)
     else:
         raw = index_raw(symbol, from_date, to_date)
     
@@ -449,7 +634,7 @@ def index_df(symbol, from_date, to_date):
     index_dtypes = {'OPEN': ut.np_float, 'HIGH': ut.np_float, 'LOW': ut.np_float, 'CLOSE': ut.np_float,
                     'Index Name': str, 'INDEX_NAME': str, 'HistoricalDate': ut.np_date}
     for col, dtype in index_dtypes.items():
-        df[col] = df[col].apply(dtype)
+        df[col] = ut.convert_column(df[col], dtype)
     return df
 
 def index_pe_df(symbol, from_date, to_date):
@@ -460,6 +645,6 @@ def index_pe_df(symbol, from_date, to_date):
     index_dtypes = {'pe': ut.np_float, 'pb': ut.np_float, 'divYield': ut.np_float,
                     'Index Name': str, 'DATE': ut.np_date}
     for col, dtype in index_dtypes.items():
-        df[col] = df[col].apply(dtype)
+        df[col] = ut.convert_column(df[col], dtype)
     return df
 
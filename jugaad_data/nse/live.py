@@ -2,8 +2,34 @@
     Implements live data fetch functionality
 """
 from datetime import datetime
-from requests import Session
+import threading
+import weakref
 from ..util import live_cache
+from ..transport import get_transport
+from .. import hooks
+
+
+class WarmSession:
+    """Cookies of a warmed up session, shared by all NSELive instances with
+    the same transport and page_url so that only the first one requests
+    the page. ``generation`` counts warm-ups, it changes when the cookies
+    are renewed after an auth failure."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cookies = None
+        self.generation = 0
+
+
+_warm_sessions = weakref.WeakKeyDictionary()
+_warm_sessions_lock = threading.Lock()
+
+
+def warm_session(transport, page_url):
+    with _warm_sessions_lock:
+        sessions = _warm_sessions.setdefault(transport, {})
+        return sessions.setdefault(page_url, WarmSession())
+
+
 class NSELive:
     time_out = 5
     base_url = "https://www.nseindia.com/api"
@@ -29,8 +55,9 @@ class NSELive:
             "integrated_filing": "/integrated-filing-results"
     }
     
-    def __init__(self):
-        self.s = Session()
+    def __init__(self, transport=None):
+        self.transport = transport or get_transport()
+        self.s = self.transport.session()
         h = {
             "Host": "www.nseindia.com",
             "Referer": "https://www.nseindia.com/get-quotes/equity?symbol=SBIN",
@@ -52,11 +79,41 @@ class NSELive:
             "Connection": "keep-alive",
             }
         self.s.headers.update(h)
-        self.s.get(self.page_url)
+        # Cookies are fetched from page_url by the first request, not here
+        self._warm = warm_session(self.transport, self.page_url)
+        self._session_generation = 0
+
+    def _bootstrap(self, generation=None):
+        """Gets session cookies, requesting page_url only if no instance
+        sharing the transport has done so yet, or if ``generation`` is
+        the generation of cookies that were rejected."""
+        warm = self._warm
+        with warm.lock:
+            if warm.cookies is None or generation == warm.generation:
+                self.s.cookies.clear()
+                self.s.get(self.page_url)
+                warm.cookies = self.s.cookies.copy()
+                warm.generation += 1
+            elif self._session_generation != warm.generation:
+                self.s.cookies.update(warm.cookies)
+            self._session_generation = warm.generation
+
+    def _request(self, url, params):
+        if self._session_generation != self._warm.generation or not self._session_generation:
+            self._bootstrap()
+        generation = self._session_generation
+        r = self.s.get(url, params=params)
+        if r.status_code in (401, 403):
+            # Session expired, renew the cookies and try once more
+            self._bootstrap(generation)
+            r = self.s.get(url, params=params)
+        return r
 
     def get(self, route, payload={}):
         url = self.base_url + self._routes[route]
-        r = self.s.get(url, params=payload)
+        with self.transport.breakers.guard(url, route) as call, \
+                hooks.track(self, route, payload) as event:
+            r = call.response = event.response = self._request(url, payload)
         return r.json()
 
     def _get_nextapi(self, function_name, **params):
@@ -71,7 +128,9 @@ class NSELive:
         """
         query_params = {"functionName": function_name}
         query_params.update(params)
-        r = self.s.get(self.nextapi_url, params=query_params)
+        with self.transport.breakers.guard(self.nextapi_url, function_name) as call, \
+                hooks.track(self, function_name, params) as event:
+            r = call.response = event.response = self._request(self.nextapi_url, query_params)
         return r.json()
 
     @live_cache
@@ -1,5 +1,5 @@
-from requests import Session
 from bs4 import BeautifulSoup
+from ..transport import get_transport
 
 
 
@@ -72,8 +72,9 @@ def extract_rates_from_tables(bs):
 class RBI:
     base_url = "https://www.rbi.org.in/"
 
-    def __init__(self):
-        self.s = Session()
+    def __init__(self, transport=None):
+        self.transport = transport or get_transport()
+        self.s = self.transport.session()
     
     def current_rates(self):
         r = self.s.get(self.base_url)
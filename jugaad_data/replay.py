@@ -0,0 +1,178 @@
+"""
+    Record and replay HTTP traffic of the clients
+
+    A Cassette is a JSON lines file of responses keyed by method, host, path,
+    query (in any order) and request body. RecordingTransport sends requests
+    as usual and appends every final response to the cassette,
+    ReplayTransport answers from it without network access.
+
+        from jugaad_data.replay import RecordingTransport, ReplayTransport
+        h = NSEHistory(transport=RecordingTransport("nse.jsonl"))
+        h.stock_raw("SBIN", from_date, to_date)        # recorded
+        h = NSEHistory(transport=ReplayTransport("nse.jsonl"))
+        h.stock_raw("SBIN", from_date, to_date)        # offline
+
+    J_HTTP_RECORD / J_HTTP_REPLAY do the same for the default transport.
+    Cassettes are also what jugaad_data.fake_exchange serves.
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from http.client import HTTPMessage
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+from .transport import SharedAdapter, Transport
+
+# Not valid for the body as stored, which is decoded
+SKIP_HEADERS = ("content-encoding", "transfer-encoding", "content-length", "connection")
+
+
+class NotRecordedError(RequestException):
+    """The cassette has no response for a request"""
+
+
+def request_key(method, url, body=None):
+    """Identifies a request regardless of the order of query parameters"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    if isinstance(body, str):
+        body = body.encode()
+    digest = hashlib.sha1(body).hexdigest() if body else ""
+    return "{} {}{}?{} {}".format(method.upper(), (parts.hostname or "").lower(),
+                                  parts.path or "/", query, digest)
+
+
+class Cassette:
+    """Recorded responses, kept in memory and appended to ``path`` if given
+
+    The last response recorded for a request is the one replayed.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.isfile(path):
+            with open(path) as fp:
+                for line in fp:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, method, url, status=200, body=b"", headers=(), request_body=None):
+        """Records a response, ``headers`` is a list of (name, value) pairs"""
+        if isinstance(body, str):
+            body = body.encode()
+        entry = {
+            "key": request_key(method, url, request_body),
+            "url": url,
+            "status": status,
+            "headers": [[k, v] for k, v in headers if k.lower() not in SKIP_HEADERS],
+            "body": base64.b64encode(body).decode(),
+        }
+        with self._lock:
+            self.entries[entry["key"]] = entry
+            if self.path:
+                with open(self.path, "a") as fp:
+                    fp.write(json.dumps(entry) + "\n")
+        return entry
+
+    def add_json(self, method, url, data, status=200, headers=(), request_body=None):
+        headers = [("Content-Type", "application/json")] + list(headers)
+        return self.add(method, url, status, json.dumps(data), headers, request_body)
+
+    def record(self, request, response):
+        """Records a requests.Response to the PreparedRequest it answers"""
+        raw_headers = getattr(response.raw, "headers", None)
+        if raw_headers is not None and hasattr(raw_headers, "iteritems"):
+            headers = list(raw_headers.iteritems())
+        else:
+            headers = list(response.headers.items())
+        return self.add(request.method, request.url, response.status_code,
+                        response.content, headers, request.body)
+
+    def find(self, method, url, body=None):
+        """Returns the recorded entry or None"""
+        return self.entries.get(request_key(method, url, body))
+
+    @staticmethod
+    def body(entry):
+        return base64.b64decode(entry["body"])
+
+
+class RecordingAdapter(SharedAdapter):
+    """SharedAdapter appending every final response to a cassette"""
+    def __init__(self, limiter=None, retry=None, cassette=None, **kw):
+        self.cassette = cassette
+        super().__init__(limiter, retry, **kw)
+
+    def send(self, request, **kw):
+        r = super().send(request, **kw)
+        self.cassette.record(request, r)
+        return r
+
+
+class _RecordedMessage:
+    """Stands in for the http.client response requests reads cookies from"""
+    def __init__(self, msg):
+        self.msg = msg
+
+    def isclosed(self):
+        return True
+
+
+class _Replayed(HTTPAdapter):
+    def send(self, request, **kw):
+        entry = self.cassette.find(request.method, request.url, request.body)
+        if entry is None:
+            raise NotRecordedError("No recorded response for {} {}".format(
+                request.method, request.url), request=request)
+        headers, msg = HTTPHeaderDict(), HTTPMessage()
+        for name, value in entry["headers"]:
+            headers.add(name, value)
+            msg[name] = value
+        raw = HTTPResponse(body=io.BytesIO(Cassette.body(entry)), headers=headers,
+                           status=entry["status"], preload_content=False,
+                           decode_content=False)
+        raw._original_response = _RecordedMessage(msg)
+        return self.build_response(request, raw)
+
+
+class ReplayAdapter(SharedAdapter, _Replayed):
+    """Answers from a cassette, raises NotRecordedError for other requests"""
+    def __init__(self, limiter=None, retry=None, cassette=None, **kw):
+        self.cassette = cassette
+        super().__init__(limiter, retry, **kw)
+
+
+def _cassette(cassette):
+    return cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+
+
+class RecordingTransport(Transport):
+    """Transport recording responses to ``cassette`` (a Cassette or a path)"""
+    adapter_class = RecordingAdapter
+
+    def __init__(self, cassette, **kw):
+        self.cassette = _cassette(cassette)
+        super().__init__(cassette=self.cassette, **kw)
+
+
+class ReplayTransport(Transport):
+    """Transport answering from ``cassette`` (a Cassette or a path), not rate
+    limited unless ``rate_limits`` is given"""
+    adapter_class = ReplayAdapter
+
+    def __init__(self, cassette, rate_limits=None, **kw):
+        self.cassette = _cassette(cassette)
+        super().__init__(rate_limits=rate_limits or {}, cassette=self.cassette, **kw)
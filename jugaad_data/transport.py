@@ -0,0 +1,464 @@
+"""
+    HTTP transport shared by all clients (NSEHistory, NSEArchives, NSELive,
+    BSELive, RBI ...)
+
+    Every client keeps its own ``requests.Session`` for headers and cookies,
+    but the sessions are created by a ``Transport`` which mounts the same
+    connection pools on all of them. Connections to a host are therefore
+    kept alive and reused across clients and threads instead of every
+    client holding its own pool of 10.
+
+    Pools are kept per host and sized with ``configure`` or grown on demand
+    with ``reserve`` (NSEHistory reserves its ``workers`` count). The pool
+    size of hosts that are not configured defaults to J_HTTP_POOL_SIZE.
+
+        from jugaad_data import transport
+        transport.get_transport().configure("www.nseindia.com", pool_size=64)
+
+    A custom transport can be injected per client, ``NSEHistory(transport=t)``,
+    or for every client created afterwards with ``set_transport``.
+
+    Requests can be paced by a token bucket per host (``RateLimiter``), off
+    unless limits are set with ``limit`` or J_HTTP_RATE, and retried with
+    exponential backoff and jitter on 429, 5xx, connection errors and
+    timeouts (``RetryPolicy``), off unless J_HTTP_RETRIES is set. Buckets are shared by all threads and, with
+    ``shared=True`` or J_HTTP_RATE_SHARED=1, by all processes using the same
+    cache directory.
+
+    Clients guard their requests with the circuit breakers of the transport
+    (``breakers``, see jugaad_data.breaker), per host and route.
+
+    J_HTTP_RECORD=<file> makes the default transport record every response
+    to a cassette, J_HTTP_REPLAY=<file> serves them from it without network
+    access (see jugaad_data.replay).
+"""
+import os
+import time
+import random
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import socket
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from .cache import cache_root
+from .breaker import BreakerRegistry
+from . import concurrency, hooks
+
+try:
+    import fcntl
+except:
+    fcntl = None
+
+POOL_SIZE_ENV = "J_HTTP_POOL_SIZE"
+# Connections kept alive per host, enough for the default ThreadPoolExecutor
+DEFAULT_POOL_SIZE = 32
+# Number of hosts a pool manager keeps pools for
+DEFAULT_POOL_CONNECTIONS = 10
+TIMEOUT_ENV = "J_HTTP_TIMEOUT"
+DEFAULT_TIMEOUT = 30
+RETRIES_ENV = "J_HTTP_RETRIES"
+# Off by default, a dead host would otherwise block for minutes of timeouts
+DEFAULT_RETRIES = 0
+RATE_ENV = "J_HTTP_RATE"
+RATE_SHARED_ENV = "J_HTTP_RATE_SHARED"
+RECORD_ENV = "J_HTTP_RECORD"
+REPLAY_ENV = "J_HTTP_REPLAY"
+RATE_LIMIT_DIR_NAME = ".ratelimits"
+# host suffix: (requests per second, burst), used with J_HTTP_RATE=default
+DEFAULT_RATE_LIMITS = {
+    "nseindia.com": (3, 6),
+    "nsearchives.nseindia.com": (5, 10),
+    "niftyindices.com": (3, 6),
+    "api.bseindia.com": (3, 6),
+}
+
+
+def default_rate_limits():
+    """Limits set by J_HTTP_RATE: none if unset or 0, DEFAULT_RATE_LIMITS
+    for 'default', or a number of requests per second for the hosts of
+    DEFAULT_RATE_LIMITS with bursts of twice that"""
+    value = os.environ.get(RATE_ENV, "").strip().lower()
+    if value in ("", "0"):
+        return {}
+    if value == "default":
+        return dict(DEFAULT_RATE_LIMITS)
+    try:
+        rate = float(value)
+    except ValueError:
+        raise ValueError("{}: expected 'default' or requests per second, got {!r}".format(
+            RATE_ENV, value))
+    return {host: (rate, 2 * rate) for host in DEFAULT_RATE_LIMITS}
+
+
+def default_timeout():
+    """Seconds clients wait for a response unless they set their own"""
+    return float(os.environ.get(TIMEOUT_ENV, DEFAULT_TIMEOUT))
+
+
+class TokenBucket:
+    """Thread safe token bucket, ``rate`` tokens per second up to ``burst``"""
+    # Whether reserve may wait for another process
+    blocking = False
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1, rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, tokens, updated, now):
+        tokens = min(self.burst, tokens + (now - updated) * self.rate) - 1
+        wait = 0 if tokens >= 0 else -tokens / self.rate
+        return tokens, wait
+
+    def reserve(self):
+        """Takes a token, returns seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens, wait = self._take(self.tokens, self.updated, now)
+            self.updated = now
+            return wait
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class FileTokenBucket(TokenBucket):
+    """Token bucket kept in a file so that processes share it, the file is
+    locked with fcntl.flock while it is updated"""
+    blocking = True
+
+    def __init__(self, path, rate, burst=None):
+        super().__init__(rate, burst)
+        self.path = path
+
+    def reserve(self):
+        if fcntl is None:
+            return super().reserve()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock, open(self.path, "a+") as fp:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+            fp.seek(0)
+            try:
+                tokens, updated = [float(x) for x in fp.read().split()]
+            except ValueError:
+                tokens, updated = self.burst, time.time()
+            now = time.time()
+            tokens, wait = self._take(tokens, min(updated, now), now)
+            fp.seek(0)
+            fp.truncate()
+            fp.write("{!r} {!r}".format(tokens, now))
+            fp.flush()
+            return wait
+
+
+class RateLimiter:
+    """Token buckets per host, a bucket for ``nseindia.com`` also covers
+    its subdomains unless they have their own"""
+    def __init__(self, limits=None, shared=None):
+        self.shared = bool(os.environ.get(RATE_SHARED_ENV)) if shared is None else shared
+        self.buckets = {}
+        limits = default_rate_limits() if limits is None else limits
+        for host, (rate, burst) in limits.items():
+            self.limit(host, rate, burst)
+
+    def limit(self, host, rate, burst=None, shared=None):
+        """Limits ``host`` to ``rate`` requests per second, None removes the limit"""
+        host = host.lower()
+        if rate is None:
+            self.buckets.pop(host, None)
+            return
+        shared = self.shared if shared is None else shared
+        if shared:
+            path = os.path.join(cache_root(), RATE_LIMIT_DIR_NAME, host)
+            self.buckets[host] = FileTokenBucket(path, rate, burst)
+        else:
+            self.buckets[host] = TokenBucket(rate, burst)
+
+    def bucket(self, host):
+        host = (host or "").lower()
+        while host:
+            bucket = self.buckets.get(host)
+            if bucket is not None:
+                return bucket
+            host = host.partition(".")[2]
+        return None
+
+    def acquire(self, host):
+        bucket = self.bucket(host)
+        return bucket.acquire() if bucket is not None else 0
+
+
+class RetryPolicy:
+    """Retries with capped exponential backoff and full jitter
+
+    Args:
+        retries (int): Attempts after the first one, J_HTTP_RETRIES (0)
+            if None
+        backoff (float): Base delay in seconds, doubled per attempt
+        max_backoff (float): Cap of a single delay, also caps Retry-After
+        statuses (tuple): Response codes to retry
+    """
+    def __init__(self, retries=None, backoff=0.5, max_backoff=30,
+                 statuses=(429, 500, 502, 503, 504)):
+        self.retries = int(os.environ.get(RETRIES_ENV, DEFAULT_RETRIES)) if retries is None else retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+
+    def delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.strip().isdigit():
+                return min(float(retry_after), self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+
+class _TimedConnection:
+    """Adds DNS and connect time of new connections to hooks.timing()"""
+    def _new_conn(self):
+        event = hooks.timing()
+        if event is None:
+            return super()._new_conn()
+        start = time.perf_counter()
+        try:
+            # Resolved once more only to time it, urllib3 still resolves the
+            # host itself and tries each address it gets
+            socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except OSError:
+            pass
+        event.dns += time.perf_counter() - start
+        return super()._new_conn()
+
+    def connect(self):
+        event = hooks.timing()
+        if event is None:
+            return super().connect()
+        start, dns = time.perf_counter(), event.dns
+        try:
+            return super().connect()
+        finally:
+            event.connect += time.perf_counter() - start - (event.dns - dns)
+
+
+class TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class SharedAdapter(HTTPAdapter):
+    """HTTPAdapter mounted on several sessions, closing one session must
+    not close the pools the others are using.
+
+    Requests are paced by ``limiter`` and retried according to ``retry``.
+    """
+    def __init__(self, limiter=None, retry=None, **kw):
+        self.limiter = limiter
+        self.retry = retry
+        super().__init__(**kw)
+
+    def init_poolmanager(self, *args, **kw):
+        super().init_poolmanager(*args, **kw)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kw):
+        host = urlsplit(request.url).hostname
+        retries = self.retry.retries if self.retry else 0
+        attempt = 0
+        while True:
+            if self.limiter:
+                self.limiter.acquire(host)
+            start = time.monotonic()
+            try:
+                r = self._timed_send(request, **kw)
+            except (ConnectionError, Timeout) as e:
+                concurrency.observe(error=e)
+                if attempt >= retries:
+                    raise
+                delay = self.retry.delay(attempt)
+            else:
+                concurrency.observe(r.status_code, latency=time.monotonic() - start)
+                if attempt >= retries or r.status_code not in self.retry.statuses:
+                    return r
+                delay = self.retry.delay(attempt, r)
+                r.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _timed_send(self, request, **kw):
+        """Sends one attempt, setting the ttfb of hooks.timing() to the time
+        until its response headers, without resolving and connecting"""
+        event = hooks.timing()
+        if event is None:
+            return super().send(request, **kw)
+        start, setup = time.perf_counter(), event.dns + event.connect
+        r = super().send(request, **kw)
+        event.ttfb = time.perf_counter() - start - (event.dns + event.connect - setup)
+        return r
+
+    def close(self):
+        pass
+
+    def shutdown(self):
+        super().close()
+
+
+class Transport:
+    """Per-host connection pools mounted on every session it creates
+
+    Args:
+        pool_size (int): Default connections kept per host
+        rate_limits (dict): {host: (requests per second, burst)}, by default
+            those set by J_HTTP_RATE (none unless it is set)
+        retry (RetryPolicy): Retry policy, by default none unless J_HTTP_RETRIES
+            is set
+        breakers (BreakerRegistry): Circuit breakers of the clients using it,
+            BreakerRegistry(enabled=False) disables them
+        adapter_kw (dict): Extra HTTPAdapter arguments
+    """
+    adapter_class = SharedAdapter
+
+    def __init__(self, pool_size=None, rate_limits=None, retry=None, breakers=None, **adapter_kw):
+        self.pool_size = pool_size or int(os.environ.get(POOL_SIZE_ENV, DEFAULT_POOL_SIZE))
+        self.limiter = RateLimiter(rate_limits)
+        self.retry = retry or RetryPolicy()
+        self.breakers = breakers or BreakerRegistry()
+        self.adapter_kw = adapter_kw
+        self._lock = threading.Lock()
+        self._default = self._adapter(self.pool_size)
+        self._hosts = {}
+        self._sessions = weakref.WeakSet()
+
+    def _adapter(self, pool_size, **kw):
+        kw = dict(self.adapter_kw, **kw)
+        kw.setdefault("pool_connections", DEFAULT_POOL_CONNECTIONS)
+        return self.adapter_class(self.limiter, self.retry, pool_maxsize=pool_size, **kw)
+
+    @staticmethod
+    def _prefixes(host):
+        return ["https://" + host, "http://" + host]
+
+    def configure(self, host, pool_size=None, **adapter_kw):
+        """Gives ``host`` its own pool of ``pool_size`` connections, already
+        created sessions pick it up for their next request"""
+        host = host.lower()
+        pool_size = pool_size or self.pool_size
+        adapter = self._adapter(pool_size, **adapter_kw)
+        with self._lock:
+            old = self._hosts.get(host)
+            self._hosts[host] = (adapter, pool_size, adapter_kw)
+            sessions = list(self._sessions)
+        for s in sessions:
+            self._mount_host(s, host, adapter)
+        if old is not None:
+            # Idle connections are closed now, those in use when released
+            old[0].shutdown()
+
+    def limit(self, host, rate, burst=None, shared=None):
+        """Limits requests to ``host`` (and its subdomains) to ``rate`` per
+        second with bursts of ``burst``, see RateLimiter.limit"""
+        self.limiter.limit(host, rate, burst, shared)
+
+    def pool_size_for(self, host):
+        entry = self._hosts.get(host.lower())
+        return entry[1] if entry else self.pool_size
+
+    def reserve(self, url, size):
+        """Makes sure the pool of url's host holds at least ``size``
+        connections, e.g. one per worker thread"""
+        host = urlsplit(url).hostname or url
+        if size <= self.pool_size_for(host):
+            return
+        with self._lock:
+            entry = self._hosts.get(host.lower())
+            adapter_kw = entry[2] if entry else {}
+        if size > self.pool_size_for(host):
+            self.configure(host, pool_size=size, **adapter_kw)
+
+    def adapter(self, url):
+        """Adapter used for ``url``"""
+        host = (urlsplit(url).hostname or "").lower()
+        entry = self._hosts.get(host)
+        return entry[0] if entry else self._default
+
+    def _mount_host(self, s, host, adapter):
+        for prefix in self._prefixes(host):
+            s.mount(prefix, adapter)
+
+    def mount(self, s):
+        """Mounts the shared pools on an existing session"""
+        s.mount("https://", self._default)
+        s.mount("http://", self._default)
+        with self._lock:
+            hosts = list(self._hosts.items())
+            self._sessions.add(s)
+        for host, (adapter, _, _) in hosts:
+            self._mount_host(s, host, adapter)
+        return s
+
+    def session(self, headers=None):
+        """Returns a new Session using the shared pools"""
+        s = Session()
+        if headers:
+            s.headers.update(headers)
+        return self.mount(s)
+
+    def close(self):
+        """Closes all pooled connections"""
+        with self._lock:
+            adapters = [self._default] + [e[0] for e in self._hosts.values()]
+        for adapter in adapters:
+            adapter.shutdown()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """Returns the default transport, created on first use"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = _default_transport()
+    return _transport
+
+
+def _default_transport():
+    record, replay = os.environ.get(RECORD_ENV), os.environ.get(REPLAY_ENV)
+    if record or replay:
+        from .replay import RecordingTransport, ReplayTransport
+        return ReplayTransport(replay) if replay else RecordingTransport(record)
+    return Transport()
+
+
+def set_transport(transport):
+    """Sets the default transport for clients created afterwards, None
+    resets it. Clients created before keep the transport they got."""
+    global _transport
+    with _transport_lock:
+        _transport = transport
@@ -1,23 +1,29 @@
 import os
+import asyncio
+import copy
 import collections
+import itertools
 import json
 import pickle
 import time
 import threading
 import uuid
 from datetime import datetime, timedelta, date
-from concurrent.futures import ThreadPoolExecutor
-import click
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from appdirs import user_cache_dir
+from .cache import (get_store, memory, memory_key, open_ttl, note_write,
+                    pickle_serializer, npz_serializer, encode, decode, entry_lock,
+                    check_format)
+from .holidays import holidays
+from .metrics import registry as metrics
+from . import hooks, concurrency
+from .lazy import LazyModule
 
 import calendar
 
 import math
 
-try:
-    import numpy as np
-except:
-    np = None
+np = LazyModule("numpy")
 
 def np_exception(function):
     def wrapper(*args, **kwargs):
@@ -65,6 +71,139 @@ def np_int(num):
     except:
         return 0
 
+_column_dtypes = {np_float: "float64", np_int: "int64", np_date: "datetime64[D]", str: str}
+
+@np_exception
+def to_columns(rows, headers, dtypes):
+    """Converts a list of row dicts into one typed numpy array per header,
+    using the same converters (np_float, np_int, np_date, str) as the
+    DataFrame helpers. String columns get a fixed width unicode dtype."""
+    columns = {}
+    for header, dtype in zip(headers, dtypes):
+        values = [dtype(row[header]) for row in rows]
+        columns[header] = np.array(values, dtype=_column_dtypes[dtype])
+    return columns
+
+pd = LazyModule("pandas")
+
+# Formats np_date tries after ISO, in the same order
+_date_formats = ("%d-%b-%Y", "%d %b %Y")
+_iso_date_pattern = r"\d{4}-\d{2}-\d{2}"
+_int_pattern = r"\s*[+-]?\d+\s*"
+_blank_cells = ("-", "")
+
+def _str_cells(col):
+    """Mask of the cells holding a str, NaN elsewhere turned to False"""
+    try:
+        return col.str.len().notna()
+    except AttributeError:
+        # No str cell at all
+        return pd.Series(False, index=col.index)
+
+def _filled(col):
+    """Mask of the cells that are neither missing nor an NSE blank"""
+    return (col.notna() & ~col.isin(_blank_cells)).to_numpy()
+
+def _float_column(col):
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype("float64")
+    values = col.to_numpy(dtype=object)
+    filled = _filled(col)
+    out = np.full(len(values), np.nan)
+    try:
+        # Calls float() on every cell like np.float64 does
+        out[filled] = values[filled].astype("float64")
+    except (TypeError, ValueError):
+        out[filled] = pd.to_numeric(col[filled], errors="coerce").to_numpy(dtype="float64")
+    return pd.Series(out, index=col.index)
+
+def _int_cells(col):
+    """int64 array of a column mixing numbers and strings, 0 where np.int64 fails"""
+    values = pd.to_numeric(col, errors="coerce").to_numpy(dtype="float64")
+    # np.int64 truncates floats and gives up on NaN, inf and "3.0"
+    valid = np.isfinite(values) & (np.abs(values) < 2.0 ** 63)
+    if _str_cells(col).any():
+        not_int = col.str.fullmatch(_int_pattern) == False
+        valid &= ~not_int.to_numpy(dtype=bool)
+    out = np.zeros(len(values), dtype="int64")
+    out[valid] = values[valid].astype("int64")
+    return out
+
+def _int_column(col):
+    if pd.api.types.is_signed_integer_dtype(col) or pd.api.types.is_bool_dtype(col):
+        return col.astype("int64")
+    out = np.zeros(len(col), dtype="int64")
+    if pd.api.types.is_numeric_dtype(col):
+        values = col.to_numpy(dtype="float64")
+        valid = np.isfinite(values) & (np.abs(values) < 2.0 ** 63)
+        out[valid] = values[valid].astype("int64")
+        return pd.Series(out, index=col.index)
+    values = col.to_numpy(dtype=object)
+    filled = _filled(col)
+    try:
+        # Calls int() on every cell like np.int64 does
+        out[filled] = values[filled].astype("int64")
+    except (TypeError, ValueError, OverflowError):
+        out[filled] = _int_cells(col[filled])
+    return pd.Series(out, index=col.index)
+
+def _date_unit():
+    """Unit of dates converted by np_date, pandas < 2 only has ns"""
+    try:
+        pd.Series([], dtype="datetime64[s]").dt.as_unit("s")
+        return "datetime64[s]"
+    except (AttributeError, TypeError, ValueError):
+        return "datetime64[ns]"
+
+def _date_column(col):
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col
+    unit = _date_unit()
+    # History has few distinct dates, parse each of them once
+    codes, uniques = pd.factorize(col)
+    dates = _parse_dates(pd.Series(uniques, dtype=object), unit).to_numpy()
+    out = np.full(len(codes), np.datetime64("NaT"), dtype=unit)
+    out[codes >= 0] = dates[codes[codes >= 0]]
+    return pd.Series(out, index=col.index)
+
+def _parse_dates(col, unit):
+    strings = _str_cells(col)
+    out = pd.Series(pd.NaT, index=col.index, dtype=unit)
+    todo = strings.copy()
+    if todo.any():
+        # Only what np.datetime64 takes, to_datetime also takes 2023-1-2
+        iso = todo & col.str.fullmatch(_iso_date_pattern).fillna(False).astype(bool)
+        out[iso] = pd.to_datetime(col[iso], format="%Y-%m-%d", errors="coerce")
+        todo &= out.isna()
+    for fmt in _date_formats:
+        if not todo.any():
+            break
+        parsed = pd.to_datetime(col[todo], format=fmt, errors="coerce")
+        out[todo] = parsed
+        todo &= out.isna()
+    # Other cells (times, date objects, junk) go through np_date one by one
+    rest = todo | (~strings & col.notna())
+    if rest.any():
+        out[rest] = np.array([np_date(v) for v in col[rest]], dtype=unit)
+    return out
+
+def _str_column(col):
+    return col.astype(object).map(str)
+
+_vector_converters = {np_float: _float_column, np_int: _int_column,
+                      np_date: _date_column, str: _str_column}
+
+@np_exception
+def convert_column(col, dtype):
+    """Converts a pandas Series with one of np_float, np_int, np_date or
+    str, giving the same values as ``col.apply(dtype)`` but converting
+    whole columns at once. Dates are always datetime64[s] (ns before
+    pandas 2). Other converters are applied cell by cell."""
+    converter = _vector_converters.get(dtype)
+    if converter is None:
+        return col.apply(dtype)
+    return converter(col)
+
 def break_dates(from_date, to_date):
     if from_date.replace(day=1) == to_date.replace(day=1):
         return [(from_date, to_date)]
@@ -80,73 +219,559 @@ def break_dates(from_date, to_date):
     return date_ranges
 
 
+MISS = object()
+
 def kw_to_fname(**kw):
     name = "-".join([str(kw[k]) for k in sorted(kw) if k != "self"])
     return name
 
 
+def today():
+    return date.today()
+
+def parse_date(value):
+    """Parses dates in formats returned by NSE and niftyindices APIs,
+    returns None if value can not be parsed"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in ("%Y-%m-%d", "%d-%b-%Y", "%d %b %Y", "%d-%m-%Y"):
+        for candidate in (text, text[:10], text[:11]):
+            try:
+                return datetime.strptime(candidate, fmt).date()
+            except ValueError:
+                pass
+    return None
+
+def as_date(dt):
+    return dt.date() if isinstance(dt, datetime) else dt
+
+_holiday_set = None
+
+def is_trading_day(dt):
+    global _holiday_set
+    if _holiday_set is None:
+        _holiday_set = set(holidays())
+    return dt.weekday() < 5 and dt not in _holiday_set
+
+def last_settled_date(dt=None):
+    """Last trading day before dt (default today), data up to this day
+    is final and will not change"""
+    dt = (dt or today()) - timedelta(days=1)
+    while not is_trading_day(dt):
+        dt -= timedelta(days=1)
+    return dt
+
+def is_settled(to_date, dt=None):
+    """True if there is no trading session after the last settled date up
+    to to_date, i.e. a chunk ending on to_date is closed"""
+    if isinstance(to_date, datetime):
+        to_date = to_date.date()
+    day = last_settled_date(dt) + timedelta(days=1)
+    while day <= to_date:
+        if is_trading_day(day):
+            return False
+        day += timedelta(days=1)
+    return True
+
+def missing_intervals(from_date, to_date, intervals):
+    """Returns sub-intervals of from_date..to_date (both inclusive) which
+    are not covered by any of the (start, end) intervals"""
+    gaps = []
+    cursor = from_date
+    for start, end in sorted(intervals):
+        if end < cursor:
+            continue
+        if start > to_date:
+            break
+        if start > cursor:
+            gaps.append((cursor, start - timedelta(days=1)))
+        cursor = end + timedelta(days=1)
+        if cursor > to_date:
+            return gaps
+    gaps.append((cursor, to_date))
+    return gaps
+
+def merge_rows(chunks, row_date):
+    """Merges lists of rows into one list, preserving the date order used
+    by the API, newest first if the order can not be figured out from the
+    rows"""
+    rows = list(itertools.chain.from_iterable(chunks))
+    dates = [row_date(r) or date.min for r in rows]
+    descending = True
+    for chunk in chunks:
+        chunk_dates = [d for d in map(row_date, chunk) if d]
+        if len(set(chunk_dates)) > 1:
+            descending = chunk_dates[0] > chunk_dates[-1]
+            break
+    order = sorted(range(len(rows)), key=lambda i: dates[i], reverse=descending)
+    return [rows[i] for i in order]
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key, the first caller runs
+    the function while others wait for it and get the same result (or
+    exception)"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event()}
+        if not leader:
+            call['event'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['value']
+        try:
+            call['value'] = function(*args, **kwargs)
+            return call['value']
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+_flight = SingleFlight()
+_index_lock = threading.Lock()
+# Guards creating the cache and lock of live_cache objects
+_live_cache_lock = threading.Lock()
 
-def cached(app_name):
+def cached(app_name, date_field=None, serializer=None):
     """
         Note to self:
             This is a russian doll
             wrapper - actual caching mechanism
             _cached - actual decorator
             cached - wrapper around decorator to make 'app_name' dynamic
+
+        Entries are stored using the store returned by cache.get_store(),
+        see jugaad_data.cache for available backends.
+
+        Chunks whose to_date is not settled yet (see is_settled) are never
+        stored under their exact key. They are kept under an 'open' key
+        without the end date for cache.open_ttl() seconds. When date_field
+        (name of the row's date column) is given, stale open chunks are
+        refreshed incrementally by fetching only the unsettled days.
+
+        With date_field, closed chunks are also recorded in an interval
+        index per series (all arguments except from_date and to_date). A
+        miss is then served from overlapping cached chunks and only the
+        uncovered sub-intervals are fetched.
+
+        Concurrent misses of the same entry within a process are coalesced,
+        only one caller runs the function and the others share its result.
+        Across processes sharing the cache directory, the fetching caller
+        holds cache.entry_lock so the other processes wait and then read
+        the entry from the store.
+
+        Chunks cached by versions before open keys existed are stored under
+        their exact key even if days of them were not settled yet. The first
+        time an app_name is used, such entries whose to_date was not settled
+        when they were written are deleted (see cache.check_format).
+
+        serializer (object with dumps/loads) sets the on-disk format of
+        cached values, default is pickle. See cache.npz_serializer for a
+        columnar format.
+
+        Hits, misses, bytes and latencies are recorded per app_name in
+        jugaad_data.metrics, hits are also reported to jugaad_data.hooks.
     """
+    serializer = serializer or pickle_serializer
+    def row_date(row):
+        return parse_date(row.get(date_field))
+
+    def hit(count=1):
+        metrics.inc(app_name, "hits", count)
+        hooks.cached(app_name, count)
+
     def _cached(function):
-        def wrapper(*args, **kw):
+        code = function.__code__
+        # Keys are the argument values sorted by name, so they end with
+        # to_date if no other argument sorts after it
+        names = sorted(n for n in code.co_varnames[:code.co_argcount] if n != "self")
+        key_ends_with_to_date = bool(names) and names[-1] == "to_date"
+
+        def call_kwargs(args, kw):
+            kw = dict(kw)
             kw.update(zip(function.__code__.co_varnames, args))
-            env_dir = os.environ.get("J_CACHE_DIR")
-            if not env_dir:
-                cache_dir = user_cache_dir(app_name, app_name)
+            return kw
+
+        def unsettled_when_written(key, written_at):
+            """Whether a chunk cached in the old format overlapped days
+            which were not settled yet when it was written"""
+            if written_at is None or not key_ends_with_to_date:
+                return False
+            try:
+                to_date = date.fromisoformat(key[-10:])
+            except ValueError:
+                return False
+            return not is_settled(to_date, datetime.fromtimestamp(written_at).date())
+
+        def get_checked_store():
+            store = get_store()
+            check_format(store, app_name, unsettled_when_written)
+            return store
+
+        def load(store, name, count=True):
+            mkey = memory_key(store, app_name, name)
+            data = memory.get(mkey, count)
+            if data is None:
+                with metrics.timer(app_name, "read"):
+                    data = store.read(app_name, name)
+                    if data is not None:
+                        metrics.inc(app_name, "bytes_read", len(data))
+                        data = decode(data)
+                if data is not None:
+                    memory.put(mkey, data)
+            return data
+
+        def read_many(store, names):
+            with metrics.timer(app_name, "read"):
+                found = store.read_many(app_name, names)
+                metrics.inc(app_name, "bytes_read", sum(len(d) for d in found.values()))
+                return {name: decode(data) for name, data in found.items()}
+
+        def save(store, name, data):
+            encoded = encode(app_name, data)
+            store.write(app_name, name, encoded)
+            metrics.inc(app_name, "bytes_written", len(encoded))
+            memory.put(memory_key(store, app_name, name), data)
+            note_write(store, app_name)
+
+        def call(**kw):
+            with metrics.timer(app_name, "fetch"):
+                return function(**kw)
+
+        def loads(data):
+            with metrics.timer(app_name, "deserialize"):
+                return serializer.loads(data)
+
+        def trim(rows, to_date):
+            if not date_field or not isinstance(rows, list):
+                return rows
+            return [r for r in rows if (row_date(r) or date.min) <= to_date]
+
+        def refresh(entry, kw):
+            """Fetches rows after the settled date of an open entry and
+            merges them with the rows which are already final"""
+            if not isinstance(entry['data'], list):
+                return call(**kw)
+            start = max(entry['settled'] + timedelta(days=1), as_date(kw['from_date']))
+            new = call(**dict(kw, from_date=start))
+            kept = [r for r in entry['data'] if (row_date(r) or date.min) <= entry['settled']]
+            return merge_rows([kept, new], row_date)
+
+        def usable(entry, to_date):
+            """Whether an open entry is fresh and covers to_date"""
+            fresh = time.time() - entry['fetched_at'] < open_ttl()
+            covered = entry['through'] >= to_date if date_field else entry['through'] == to_date
+            return fresh and covered
+
+        def save_open(store, kw, rows, settled):
+            entry = {'through': as_date(kw['to_date']), 'settled': settled,
+                     'fetched_at': time.time(), 'data': rows}
+            save(store, kw_to_fname(**dict(kw, to_date="open")), pickle.dumps(entry))
+
+        def fetch_open(store, kw):
+            to_date = as_date(kw['to_date'])
+            open_name = kw_to_fname(**dict(kw, to_date="open"))
+            data = load(store, open_name)
+            entry = pickle.loads(data) if data is not None else None
+            if entry is not None and usable(entry, to_date):
+                hit()
+                return trim(entry['data'], to_date)
+            metrics.inc(app_name, "misses")
+            settled = last_settled_date()
+            if entry is not None and date_field:
+                rows = refresh(entry, kw)
+            else:
+                rows = call(**kw)
+            save_open(store, kw, rows, settled)
+            return rows
+
+        def from_open_entry(store, kw):
+            """Completes a settled chunk from its open entry, if one was
+            cached while the chunk was still open. Returns MISS otherwise."""
+            if not date_field or not isinstance(kw.get('to_date'), date):
+                return MISS
+            to_date = as_date(kw['to_date'])
+            open_name = kw_to_fname(**dict(kw, to_date="open"))
+            data = load(store, open_name)
+            if data is None:
+                return MISS
+            entry = pickle.loads(data)
+            if entry['settled'] >= to_date:
+                rows = trim(entry['data'], to_date)
             else:
-                cache_dir = os.path.join(env_dir, app_name)
+                rows = trim(refresh(entry, kw), to_date)
+            # Nothing is left to complete from it once the chunk reaches its
+            # end or the end of the month
+            if to_date >= entry['through'] or \
+                    to_date.day == calendar.monthrange(to_date.year, to_date.month)[1]:
+                store.delete(app_name, open_name)
+                memory.discard(memory_key(store, app_name, open_name))
+            return rows
+
+        def index_name(kw):
+            series = {k: v for k, v in kw.items() if k not in ('from_date', 'to_date')}
+            return "intervals-" + kw_to_fname(**series)
+
+        def load_index(store, kw, fresh=False):
+            """fresh skips the memory tier, which may be behind the store
+            when other processes share it"""
+            if fresh:
+                memory.discard(memory_key(store, app_name, index_name(kw)))
+            data = load(store, index_name(kw))
+            return pickle.loads(data) if data is not None else []
+
+        def locked(name, fetch, *args):
+            """Runs fetch holding the cross-process lock of entry name"""
+            start = time.perf_counter()
+            with entry_lock(app_name, name):
+                metrics.observe(app_name, "lock_wait", time.perf_counter() - start)
+                return fetch(*args)
+
+        def register(store, kw, name):
+            if not date_field or not isinstance(kw.get('to_date'), date):
+                return
+            with _index_lock, entry_lock(app_name, index_name(kw)):
+                intervals = load_index(store, kw, fresh=True)
+                entry = (as_date(kw['from_date']), as_date(kw['to_date']), name)
+                if entry not in intervals:
+                    intervals.append(entry)
+                    save(store, index_name(kw), pickle.dumps(intervals))
+
+        def store_closed(store, kw, name, data):
+            save(store, name, data)
+            register(store, kw, name)
+
+        def fetch_from_intervals(store, kw):
+            """Cuts the requested range out of cached chunks of the same
+            series, fetching only the uncovered parts. Returns MISS if no
+            cached chunk overlaps the range."""
+            if not date_field or not isinstance(kw.get('to_date'), date):
+                return MISS
+            from_date, to_date = as_date(kw['from_date']), as_date(kw['to_date'])
+            overlapping = [i for i in load_index(store, kw)
+                           if i[0] <= to_date and i[1] >= from_date]
+            if not overlapping:
+                return MISS
+            found = read_many(store, [i[2] for i in overlapping])
+            overlapping = [i for i in overlapping if i[2] in found]
+            if not overlapping:
+                return MISS
+            cached_rows = []
+            used = []
+            for start, end, name in overlapping:
+                rows = loads(found[name])
+                if not isinstance(rows, list):
+                    return MISS
+                dates = [row_date(r) for r in rows]
+                if None in dates:
+                    # Rows without a date can not be cut out, fetch the range
+                    return MISS
+                # Days of chunks overlapping each other are taken once
+                cached_rows.append([r for r, d in zip(rows, dates) if from_date <= d <= to_date
+                                    and not any(s <= d <= e for s, e in used)])
+                used.append((start, end))
+            cached_rows = merge_rows(cached_rows, row_date)
+            chunks = [cached_rows]
+            for start, end in missing_intervals(from_date, to_date, [i[:2] for i in overlapping]):
+                gap_kw = dict(kw, from_date=start, to_date=end)
+                rows = call(**gap_kw)
+                store_closed(store, gap_kw, kw_to_fname(**gap_kw), serializer.dumps(rows))
+                chunks.append(rows)
+            return merge_rows(chunks, row_date)
+
+        def is_open(kw):
+            to_date = kw.get("to_date")
+            return isinstance(to_date, date) and not is_settled(to_date)
+
+        def fetch_closed(store, kw, file_name):
+            # Stored meanwhile by another caller, already counted as a miss
+            data = load(store, file_name, count=False)
+            if data is not None:
+                return data
+            j = from_open_entry(store, kw)
+            if j is MISS:
+                j = fetch_from_intervals(store, kw)
+                if j is not MISS:
+                    # Kept under its own key for identical calls, not indexed
+                    # as its rows are in the chunks it was cut from
+                    data = serializer.dumps(j)
+                    save(store, file_name, data)
+                    return data
+                j = call(**kw)
+            data = serializer.dumps(j)
+            store_closed(store, kw, file_name, data)
+            return data
 
+        def wrapper(*args, **kw):
+            # Only time the requests sent, not waits and hits
+            concurrency.cache_layer()
+            kw = call_kwargs(args, kw)
+            store = get_checked_store()
+            if is_open(kw):
+                lock_name = kw_to_fname(**kw) + "-open"
+                flight_key = memory_key(store, app_name, lock_name)
+                data = _flight.do(flight_key, lambda: pickle.dumps(
+                    locked(lock_name, fetch_open, store, kw)))
+                return pickle.loads(data)
             file_name = kw_to_fname(**kw)
-            path = os.path.join(cache_dir, file_name)
-            if not os.path.isfile(path):    
-                os.makedirs(cache_dir, exist_ok=True)
-                j = function(**kw)
-                tmp_path = os.path.join(
-                    cache_dir,
-                    file_name + "." + uuid.uuid4().hex + ".tmp"
-                )
-                try:
-                    with open(tmp_path, 'wb') as fp:
-                        pickle.dump(j, fp)
-                    for _ in range(10):
-                        try:
-                            os.replace(tmp_path, path)
-                            break
-                        except PermissionError:
-                            time.sleep(0.1)
-                    else:
-                        os.replace(tmp_path, path)
-                except BaseException:
-                    if os.path.exists(tmp_path):
-                        os.unlink(tmp_path)
-                    raise
+            data = load(store, file_name)
+            if data is None:
+                metrics.inc(app_name, "misses")
+                # Identical concurrent misses are fetched only once
+                flight_key = memory_key(store, app_name, file_name)
+                data = _flight.do(flight_key, locked, file_name, fetch_closed,
+                                  store, kw, file_name)
+            else:
+                hit()
+            return loads(data)
+
+        def lookup_many(arg_list):
+            """Returns cached values for a list of positional argument
+            tuples, reading all of them in one batch. Missing entries and
+            open chunks are returned as MISS."""
+            store = get_checked_store()
+            kws = [call_kwargs(args, {}) for args in arg_list]
+            names = [None if is_open(kw) else kw_to_fname(**kw) for kw in kws]
+            found = {}
+            for n in set(names) - {None}:
+                data = memory.get(memory_key(store, app_name, n))
+                if data is not None:
+                    found[n] = data
+            from_store = read_many(store, set(names) - set(found) - {None})
+            for n, data in from_store.items():
+                memory.put(memory_key(store, app_name, n), data)
+            found.update(from_store)
+            hits = sum(1 for n in names if n in found)
+            if hits:
+                hit(hits)
+            return [loads(found[n]) if n in found else MISS for n in names]
+
+        def lookup(args, kw=None):
+            """Returns the cached value of a call without fetching it, MISS
+            when it is not cached or its open entry went stale"""
+            kw = call_kwargs(args, kw or {})
+            store = get_checked_store()
+            if is_open(kw):
+                to_date = as_date(kw['to_date'])
+                data = load(store, kw_to_fname(**dict(kw, to_date="open")))
+                entry = pickle.loads(data) if data is not None else None
+                if entry is None or not usable(entry, to_date):
+                    return MISS
+                hit()
+                return trim(entry['data'], to_date)
+            data = load(store, kw_to_fname(**kw))
+            if data is None:
+                return MISS
+            hit()
+            return loads(data)
+
+        def put(value, args, kw=None, settled=None):
+            """Stores value as the result of a call fetched elsewhere, e.g.
+            by async_cached. settled is last_settled_date() from before the
+            fetch, used for open chunks."""
+            kw = call_kwargs(args, kw or {})
+            store = get_checked_store()
+            if is_open(kw):
+                save_open(store, kw, value, settled or last_settled_date())
             else:
-                for _ in range(10):
-                    try:
-                        with open(path, 'rb') as fp:
-                            j = pickle.load(fp)
-                        break
-                    except PermissionError:
-                        time.sleep(0.1)
-                else:
-                    with open(path, 'rb') as fp:
-                        j = pickle.load(fp)
-            return j
+                store_closed(store, kw, kw_to_fname(**kw), serializer.dumps(value))
+
+        def key(args, kw=None):
+            return kw_to_fname(**call_kwargs(args, kw or {}))
+
+        wrapper.app_name = app_name
+        wrapper.lookup_many = lookup_many
+        wrapper.lookup = lookup
+        wrapper.put = put
+        wrapper.key = key
+        return wrapper
+    return _cached
+
+
+def async_cached(app_name, date_field=None, serializer=None):
+    """Same as cached for coroutine functions, using the same storage and
+    keys. A value cached by an async client is a hit for the sync one and
+    vice versa.
+
+    Store reads and writes run in a worker thread so the event loop is not
+    blocked by disk or network file system latency. Concurrent identical
+    misses within an event loop are fetched once. Misses of open chunks
+    are fetched in full, and neither the interval index nor the
+    cross-process lock is used to serve async misses.
+    """
+    def _cached(function):
+        sync = cached(app_name, date_field, serializer)(function)
+        inflight = {}
+
+        async def fetch(args, kw):
+            settled = last_settled_date()
+            with metrics.timer(app_name, "fetch"):
+                value = await function(*args, **kw)
+            await asyncio.to_thread(sync.put, value, args, kw, settled)
+            return value
+
+        async def wrapper(*args, **kw):
+            value = await asyncio.to_thread(sync.lookup, args, kw)
+            if value is not MISS:
+                return value
+            metrics.inc(app_name, "misses")
+            flight_key = (asyncio.get_running_loop(), sync.key(args, kw))
+            task = inflight.get(flight_key)
+            if task is None:
+                task = inflight[flight_key] = asyncio.ensure_future(fetch(args, kw))
+                task.add_done_callback(lambda _: inflight.pop(flight_key, None))
+                # A cancelled caller must not cancel the fetch for others
+                return await asyncio.shield(task)
+            # Every caller gets its own copy, like with cached
+            return copy.deepcopy(await asyncio.shield(task))
+
+        wrapper.app_name = app_name
+        wrapper.lookup = sync.lookup
+        wrapper.lookup_many = sync.lookup_many
         return wrapper
     return _cached
 
 
-def pool(function, params, use_threads=True, max_workers=2):
+def pool(function, params, use_threads=True, max_workers=2, controller=None, progress=None):
+    """Calls function with each tuple of params, in max_workers threads.
+
+    With a concurrency.AIMDController, up to its max_limit threads are used
+    and the calls in flight are bounded by its current limit instead.
+
+    progress, if given, is called with 1 each time a call finishes, in
+    completion order and from the calling thread (e.g. the update method of
+    a click.progressbar).
+    """
+    if controller is not None:
+        function = controller.wrap(function)
+        max_workers = controller.max_limit
     if use_threads:
         with ThreadPoolExecutor(max_workers=max_workers) as ex:
-            dfs = ex.map(function, *zip(*params))
+            if progress is None:
+                dfs = ex.map(function, *zip(*params))
+            else:
+                futures = [ex.submit(function, *param) for param in params]
+                for _ in as_completed(futures):
+                    progress(1)
+                dfs = [future.result() for future in futures]
     else:
         dfs = []
         for param in params:
@@ -155,8 +780,144 @@ def pool(function, params, use_threads=True, max_workers=2):
             except:
                 raise 
             dfs.append(r)
+            if progress is not None:
+                progress(1)
     return dfs
 
+def pool_cached(function, params, use_threads=True, max_workers=2, controller=None, progress=None):
+    """Same as pool for a function decorated with cached, but first reads
+    all cached chunks in one batch and only runs function for the misses.
+    Cached chunks are reported to progress at once."""
+    lookup_many = getattr(function, "lookup_many", None)
+    if lookup_many is None:
+        return list(pool(function, params, use_threads, max_workers, controller, progress))
+    instance = getattr(function, "__self__", None)
+    if instance is not None:
+        hits = lookup_many([(instance,) + tuple(p) for p in params])
+    else:
+        hits = lookup_many([tuple(p) for p in params])
+    missing = [p for p, hit in zip(params, hits) if hit is MISS]
+    if progress is not None and len(missing) < len(params):
+        progress(len(params) - len(missing))
+    fetched = iter(pool(function, missing, use_threads, max_workers, controller, progress)
+                   if missing else [])
+    return [next(fetched) if hit is MISS else hit for hit in hits]
+
+def pool_iter(function, params, max_workers=2, controller=None, ordered=False, window=None):
+    """Calls function with each tuple of params, in max_workers threads,
+    yielding the results one by one instead of returning all of them.
+
+    Results are yielded as calls finish, or in the order of params with
+    ordered. At most window (2 * max_workers by default) calls are in
+    flight or finished and waiting to be yielded, so a slow consumer does
+    not pile up results. An exception raised by a call is raised here.
+    """
+    call = function
+    if controller is not None:
+        call = controller.wrap(function)
+        max_workers = controller.max_limit
+    window = max(window or 2 * max_workers, 1)
+    items = iter(enumerate(params))
+    pending, finished = {}, {}
+    next_index = 0
+    ex = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            while len(pending) + len(finished) < window:
+                item = next(items, None)
+                if item is None:
+                    break
+                i, param = item
+                pending[ex.submit(call, *param)] = i
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+            if ordered:
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+            else:
+                for i in list(finished):
+                    yield finished.pop(i)
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+
+def pool_groups(function, groups, max_workers=2, controller=None):
+    """Calls function with the params of every group on one pool of
+    max_workers threads, the calls of all groups sharing the same queue.
+
+    groups is a list of (key, params). Yields (key, results, error) for each
+    group as soon as all its calls are done, results in the order of its
+    params. When a call fails, error is the exception, results is None and
+    the remaining calls of that group are skipped, other groups carry on.
+    Cached chunks of a function decorated with cached are read in one batch
+    first, as in pool_cached.
+    """
+    groups = [(key, list(params)) for key, params in groups]
+    call = function
+    if controller is not None:
+        call = controller.wrap(function)
+        max_workers = controller.max_limit
+    flat = [p for _, params in groups for p in params]
+    lookup_many = getattr(function, "lookup_many", None)
+    if lookup_many is None:
+        hits = [MISS] * len(flat)
+    else:
+        instance = getattr(function, "__self__", None)
+        prefix = (instance,) if instance is not None else ()
+        hits = lookup_many([prefix + tuple(p) for p in flat])
+
+    results, remaining, errors, work = [], [], [], []
+    hits = iter(hits)
+    for g, (_, params) in enumerate(groups):
+        group_hits = [next(hits) for _ in params]
+        results.append(group_hits)
+        remaining.append(group_hits.count(MISS))
+        errors.append(None)
+        work.extend((g, i, p) for i, (p, hit) in enumerate(zip(params, group_hits)) if hit is MISS)
+
+    def finished(g):
+        return groups[g][0], None if errors[g] else results[g], errors[g]
+
+    for g in range(len(groups)):
+        if not remaining[g]:
+            yield finished(g)
+
+    work = iter(work)
+    pending = {}
+    ex = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            # Only a few calls are queued, so a failed group stops early
+            while len(pending) < 2 * max_workers:
+                item = next(work, None)
+                if item is None:
+                    break
+                g, i, p = item
+                if errors[g] is not None:
+                    remaining[g] -= 1
+                    if not remaining[g]:
+                        yield finished(g)
+                    continue
+                pending[ex.submit(call, *p)] = (g, i)
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                g, i = pending.pop(future)
+                try:
+                    results[g][i] = future.result()
+                except Exception as e:
+                    if errors[g] is None:
+                        errors[g] = e
+                remaining[g] -= 1
+                if not remaining[g]:
+                    yield finished(g)
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+
 def live_cache(app_name):
     """Caches the output for time_out specified. This is done in order to
     prevent hitting live quote requests to NSE too frequently. This wrapper
@@ -190,22 +951,31 @@ def live_cache(app_name):
         now = datetime.now()
         time_out = self.time_out
 
-        if not hasattr(self, '_cache'):
-            self._cache = {}
         if not hasattr(self, '_cache_lock'):
-            self._cache_lock = threading.Lock()
+            with _live_cache_lock:
+                if not hasattr(self, '_cache_lock'):
+                    self._cache = getattr(self, '_cache', {})
+                    self._cache_lock = threading.Lock()
+
+        namespace = "{}-{}".format(type(self).__name__.lower(), app_name.__name__)
 
         with self._cache_lock:
             cache_obj = self._cache.get(key)
             if cache_obj and now - cache_obj['timestamp'] < timedelta(seconds=time_out):
+                metrics.inc(namespace, "hits")
+                hooks.cached(namespace)
                 return cache_obj['value']
+        metrics.inc(namespace, "misses")
 
-        value = app_name(self, *args, **kwargs)
+        def fetch():
+            with metrics.timer(namespace, "fetch"):
+                value = app_name(self, *args, **kwargs)
+            with self._cache_lock:
+                self._cache[key] = {'value': value, 'timestamp': now}
+            return value
 
-        with self._cache_lock:
-            self._cache[key] = {'value': value, 'timestamp': now}
-
-        return value
+        # Concurrent calls for the same key on this object share one request
+        return _flight.do((id(self), key), fetch)
 
     return wrapper 
 
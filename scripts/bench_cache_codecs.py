@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Compares cache entry codecs on synthetic NSE stock history chunks.
+Reports bytes on disk and cold/warm read latency for every codec that is
+installed. Run with J_CACHE_DIR pointing at the volume to measure, e.g. an
+NFS mount, otherwise a temporary directory is used.
+
+    python scripts/bench_cache_codecs.py --chunks 200 --rounds 5
+"""
+
+import argparse
+import os
+import pickle
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from jugaad_data import cache
+
+
+def fake_rows(symbol, start, days=23):
+    rows = []
+    price = random.uniform(100, 3000)
+    for i in range(days):
+        d = start + timedelta(days=i)
+        price *= random.uniform(0.97, 1.03)
+        rows.append({
+            "_id": "%024x" % random.getrandbits(96),
+            "CH_SYMBOL": symbol,
+            "CH_SERIES": "EQ",
+            "CH_MARKET_TYPE": "N",
+            "CH_TRADE_HIGH_PRICE": round(price * 1.01, 2),
+            "CH_TRADE_LOW_PRICE": round(price * 0.99, 2),
+            "CH_OPENING_PRICE": round(price, 2),
+            "CH_CLOSING_PRICE": round(price, 2),
+            "CH_LAST_TRADED_PRICE": round(price, 2),
+            "CH_PREVIOUS_CLS_PRICE": round(price, 2),
+            "CH_TOT_TRADED_QTY": random.randint(10**5, 10**7),
+            "CH_TOT_TRADED_VAL": round(random.uniform(10**7, 10**10), 2),
+            "CH_52WEEK_HIGH_PRICE": round(price * 1.3, 2),
+            "CH_52WEEK_LOW_PRICE": round(price * 0.7, 2),
+            "CH_TOTAL_TRADES": random.randint(10**3, 10**5),
+            "CH_ISIN": "INE062A01020",
+            "CH_TIMESTAMP": d.isoformat(),
+            "TIMESTAMP": d.isoformat() + "T18:30:00.000Z",
+            "VWAP": round(price, 2),
+            "mTIMESTAMP": d.strftime("%d-%b-%Y"),
+        })
+    return rows
+
+
+def drop_page_cache(paths):
+    # Best effort, only effective on Linux; makes the "cold" read hit the disk
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            os.close(fd)
+        except (AttributeError, OSError):
+            pass
+
+
+def bench(codec, chunks, rounds):
+    app_name = "bench-codec-{}".format(codec or "none")
+    cache.set_compression(app_name, codec)
+    store = cache.PickleStore()
+    items = {"chunk-{}".format(i): cache.encode(app_name, pickle.dumps(rows))
+             for i, rows in enumerate(chunks)}
+    store.write_many(app_name, items.items())
+    paths = [store.path(app_name, key) for key in items]
+    size = sum(os.path.getsize(p) for p in paths)
+
+    cold, warm = [], []
+    for _ in range(rounds):
+        drop_page_cache(paths)
+        for timings in (cold, warm):
+            start = time.perf_counter()
+            for key in items:
+                pickle.loads(cache.decode(store.read(app_name, key)))
+            timings.append(time.perf_counter() - start)
+    cache.set_compression(app_name, None)
+    return size, statistics.median(cold), statistics.median(warm)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200, help="number of monthly chunks")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.environ.get("J_CACHE_DIR"):
+        os.environ["J_CACHE_DIR"] = tempfile.mkdtemp(prefix="jugaad-bench-")
+    random.seed(1)
+    chunks = [fake_rows("SYM{}".format(i % 50), date(2020, 1, 1) + timedelta(days=30 * (i // 50)))
+              for i in range(args.chunks)]
+
+    print("cache dir: {}".format(os.environ["J_CACHE_DIR"]))
+    print("{:<6} {:>12} {:>8} {:>12} {:>12}".format(
+        "codec", "bytes", "ratio", "cold ms", "warm ms"))
+    baseline = None
+    for codec in [None] + cache.available_codecs():
+        size, cold, warm = bench(codec, chunks, args.rounds)
+        baseline = baseline or size
+        print("{:<6} {:>12} {:>8.2f} {:>12.2f} {:>12.2f}".format(
+            codec or "none", size, baseline / size, cold * 1000, warm * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Compares chunking strategies of NSEHistory against a local fake exchange
+serving stock history for any date range. Downloads the history of every
+symbol with a fresh cache per strategy and reports requests sent, rows
+and wall time. With --max-rows the endpoint truncates long responses and
+the clients split those chunks again.
+
+    PYTHONPATH=. python scripts/bench_chunking.py --symbols 5 --years 20
+    PYTHONPATH=. python scripts/bench_chunking.py --max-rows 200
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+from jugaad_data.chunking import MonthlyChunks, TradingDayChunks, MaxWindowChunks
+from jugaad_data.fake_exchange import FakeExchange, StockHistoryEndpoint
+from jugaad_data.nse import NSEHistory
+from jugaad_data.replay import Cassette
+
+
+def run(ex, strategy, symbols, from_date, to_date, workers):
+    os.environ["J_CACHE_DIR"] = tempfile.mkdtemp(prefix="jugaad-bench-")
+    h = NSEHistory(transport=ex.transport())
+    h.workers = workers
+    h.chunking = strategy
+    requests = ex.stats["requests"]
+    start = time.perf_counter()
+    rows = sum(len(h.stock_raw(symbol, from_date, to_date)) for symbol in symbols)
+    return {
+        "chunks": len(h.chunking.split(from_date, to_date, "stock_history")),
+        "requests": ex.stats["requests"] - requests,
+        "rows": rows,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=5)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--max-days", type=int, default=365, help="longest range the endpoint accepts")
+    parser.add_argument("--max-rows", type=int, default=None, help="rows the endpoint returns at most")
+    parser.add_argument("--trading-days", type=int, default=120)
+    args = parser.parse_args()
+
+    symbols = ["SYM{}".format(i) for i in range(args.symbols)]
+    to_date = date(2023, 12, 31)
+    from_date = date(to_date.year - args.years + 1, 1, 1)
+    endpoint = StockHistoryEndpoint(symbols, from_date, to_date,
+                                    max_days=args.max_days, max_rows=args.max_rows)
+    history = NSEHistory()
+    cassette = Cassette()
+    cassette.add("GET", history.base_url + history.path_map["equity_quote_page"],
+                 headers=[("Set-Cookie", "nsit=fake; Path=/")])
+    strategies = [
+        MonthlyChunks(),
+        TradingDayChunks(args.trading_days, max_rows=args.max_rows),
+        MaxWindowChunks(args.max_days, max_rows=args.max_rows),
+    ]
+
+    print("{} symbols x {} years, {} workers, latency {}s +{}s, endpoint max {} days / {} rows".format(
+        args.symbols, args.years, args.workers, args.latency, args.jitter,
+        args.max_days, args.max_rows or "any"))
+    print("{:<24} {:>8} {:>9} {:>9} {:>9}".format("strategy", "chunks", "requests", "rows", "seconds"))
+    with FakeExchange(cassette, args.latency, args.jitter, seed=1, endpoints=[endpoint]) as ex:
+        for strategy in strategies:
+            r = run(ex, strategy, symbols, from_date, to_date, args.workers)
+            print("{:<24} {:>8} {:>9} {:>9} {:>9.2f}".format(
+                repr(strategy), r["chunks"], r["requests"], r["rows"], r["seconds"]))
+
+
+if __name__ == "__main__":
+    main()
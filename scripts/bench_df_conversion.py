@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Compares the column conversion of derivatives_df on a synthetic options
+frame: converting cell by cell with ``Series.apply(ut.np_float)`` etc. (as
+before) against ``ut.convert_column``. Checks both give the same values.
+
+    python scripts/bench_df_conversion.py --rows 250000 --rounds 3
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from jugaad_data import util as ut
+from jugaad_data.nse.history import options_select_headers, options_final_headers, options_dtypes
+
+
+def fake_rows(n):
+    rows = []
+    start = date(2014, 1, 1)
+    for i in range(n):
+        d = start + timedelta(days=i // 100)
+        expiry = d + timedelta(days=30 - d.day % 28)
+        price = random.uniform(1, 500)
+        # Some cells are "-" like untraded contracts in NSE responses
+        blank = random.random() < 0.05
+        rows.append({
+            "FH_TIMESTAMP": d.strftime("%d-%b-%Y"),
+            "FH_EXPIRY_DT": expiry.strftime("%d-%b-%Y"),
+            "FH_OPTION_TYPE": random.choice(["CE", "PE"]),
+            "FH_STRIKE_PRICE": str(random.randrange(10000, 20000, 50)),
+            "FH_OPENING_PRICE": "-" if blank else "%.2f" % price,
+            "FH_TRADE_HIGH_PRICE": "-" if blank else "%.2f" % (price * 1.1),
+            "FH_TRADE_LOW_PRICE": "-" if blank else "%.2f" % (price * 0.9),
+            "FH_CLOSING_PRICE": "%.2f" % price,
+            "FH_LAST_TRADED_PRICE": "%.2f" % price,
+            "FH_SETTLE_PRICE": "%.2f" % price,
+            "FH_TOT_TRADED_QTY": str(random.randint(0, 10**6)),
+            "FH_MARKET_LOT": "50",
+            "FH_TOT_TRADED_VAL": "%.2f" % random.uniform(0, 1e9),
+            "FH_OPEN_INT": str(random.randint(0, 10**6)),
+            "FH_CHANGE_IN_OI": str(random.randint(-10**5, 10**5)),
+            "FH_SYMBOL": "NIFTY",
+        })
+    return rows
+
+
+def frame(rows):
+    df = pd.DataFrame(rows, columns=options_select_headers)
+    df.columns = options_final_headers
+    return df
+
+
+def per_cell(df):
+    for header, dtype in zip(options_final_headers, options_dtypes):
+        df[header] = df[header].apply(dtype)
+    return df
+
+
+def vectorized(df):
+    for header, dtype in zip(options_final_headers, options_dtypes):
+        df[header] = ut.convert_column(df[header], dtype)
+    return df
+
+
+def timed(function, rows, rounds):
+    times = []
+    for _ in range(rounds):
+        df = frame(rows)
+        start = time.perf_counter()
+        out = function(df)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=250000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    rows = fake_rows(args.rows)
+    slow, expected = timed(per_cell, rows, args.rounds)
+    fast, actual = timed(vectorized, rows, args.rounds)
+    for header in options_final_headers:
+        # Units of datetime columns may differ, compare the values
+        assert expected[header].tolist() == actual[header].tolist() or \
+            expected[header].equals(actual[header]), header
+
+    print("{} rows, median of {} rounds".format(args.rows, args.rounds))
+    print("{:<12} {:>10}".format("conversion", "seconds"))
+    print("{:<12} {:>10.3f}".format("per cell", slow))
+    print("{:<12} {:>10.3f}".format("vectorized", fast))
+    print("speedup {:.1f}x".format(slow / fast))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Load test of the history client stack against a local fake exchange.
+Downloads the stock history of several symbols in parallel threads, each
+with NSEHistory's thread pool, with a fresh cache per run so that every
+chunk is a request. Reports requests per second and the latency of each
+stock_raw call for every worker count (and the adaptive controller).
+
+    PYTHONPATH=. python scripts/bench_fake_exchange.py --symbols 20 --workers 2 8 32 --adaptive
+    PYTHONPATH=. python scripts/bench_fake_exchange.py --latency 0.1 --error-rate 0.05
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from jugaad_data.concurrency import AIMDController
+from jugaad_data.fake_exchange import FakeExchange, add_stock_history
+from jugaad_data.nse import NSEHistory
+from jugaad_data.replay import Cassette
+from jugaad_data.transport import RetryPolicy
+
+
+def run(ex, symbols, from_date, to_date, workers, adaptive, callers):
+    os.environ["J_CACHE_DIR"] = tempfile.mkdtemp(prefix="jugaad-bench-")
+    h = NSEHistory(transport=ex.transport(retry=RetryPolicy(backoff=0.01)))
+    h.workers = workers
+    if adaptive:
+        h.concurrency = AIMDController("bench", initial=2, max_limit=workers)
+    latencies = []
+
+    def fetch(symbol):
+        start = time.perf_counter()
+        rows = h.stock_raw(symbol, from_date, to_date)
+        latencies.append(time.perf_counter() - start)
+        return len(rows)
+
+    requests = ex.stats["requests"]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        rows = sum(pool.map(fetch, symbols))
+    elapsed = time.perf_counter() - start
+    requests = ex.stats["requests"] - requests
+    latencies.sort()
+    return {
+        "requests": requests,
+        "rows": rows,
+        "seconds": elapsed,
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "limit": h.concurrency.limit if adaptive else workers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 8, 32])
+    parser.add_argument("--adaptive", action="store_true", help="also run with an AIMDController")
+    parser.add_argument("--callers", type=int, default=4, help="symbols downloaded at once")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--reset-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    symbols = ["SYM{}".format(i) for i in range(args.symbols)]
+    to_date = date(2023, 12, 31)
+    from_date = date(to_date.year - args.years + 1, 1, 1)
+    cassette = add_stock_history(Cassette(), NSEHistory(), symbols, from_date, to_date)
+    print("{} symbols x {} months, latency {}s +{}s, errors {:.0%}, resets {:.0%}".format(
+        args.symbols, 12 * args.years, args.latency, args.jitter, args.error_rate, args.reset_rate))
+    print("{:<12} {:>9} {:>9} {:>9} {:>9} {:>9} {:>7}".format(
+        "workers", "requests", "seconds", "req/s", "p50 s", "p95 s", "limit"))
+
+    runs = [(w, False) for w in args.workers]
+    if args.adaptive:
+        runs.append((max(args.workers), True))
+    with FakeExchange(cassette, args.latency, args.jitter, args.error_rate,
+                      error_statuses=(429, 503), reset_rate=args.reset_rate, seed=1) as ex:
+        for workers, adaptive in runs:
+            r = run(ex, symbols, from_date, to_date, workers, adaptive, args.callers)
+            label = "aimd<={}".format(workers) if adaptive else str(workers)
+            print("{:<12} {:>9} {:>9.2f} {:>9.1f} {:>9.3f} {:>9.3f} {:>7.1f}".format(
+                label, r["requests"], r["seconds"], r["rps"], r["p50"], r["p95"], r["limit"]))
+
+
+if __name__ == "__main__":
+    main()
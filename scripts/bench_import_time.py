@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Measures how long importing jugaad_data modules takes in a fresh
+interpreter, as the jdata CLI and short lived worker processes pay it on
+every start. Reports the median wall clock time over several runs and the
+slowest imports from ``python -X importtime`` for the first module.
+
+    python scripts/bench_import_time.py --runs 10
+    python scripts/bench_import_time.py --max-ms 400 jugaad_data.nse
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+TIMER = "import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)"
+
+
+def wall_time(module, runs):
+    times = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", TIMER.format(module)],
+                             check=True, capture_output=True, text=True).stdout
+        times.append(float(out))
+    return statistics.median(times)
+
+
+def slowest_imports(module, top):
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                         check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [x.strip() for x in line[len("import time:"):].split("|")]
+        rows.append((int(self_us), int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["jugaad_data.nse", "jugaad_data.cli"])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--max-ms", type=float, help="exit with 1 if a module takes longer")
+    args = parser.parse_args()
+    env_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [env_path, os.environ.get("PYTHONPATH")]))
+
+    failed = False
+    print("{:<24} {:>10}".format("module", "median ms"))
+    for module in args.modules:
+        ms = wall_time(module, args.runs) * 1000
+        failed |= args.max_ms is not None and ms > args.max_ms
+        print("{:<24} {:>10.1f}".format(module, ms))
+
+    print("\nslowest imports of {} (self time)".format(args.modules[0]))
+    print("{:>10} {:>12}  {}".format("self ms", "cumul. ms", "module"))
+    for self_us, cumulative_us, name in slowest_imports(args.modules[0], args.top):
+        print("{:>10.1f} {:>12.1f}  {}".format(self_us / 1000, cumulative_us / 1000, name))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+import pytest
+
+from jugaad_data import cache
+
+
+@pytest.fixture
+def cache_env(tmp_path, monkeypatch):
+    """Empty cache directory (J_CACHE_DIR) using the default backend"""
+    monkeypatch.setenv("J_CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv(cache.BACKEND_ENV, raising=False)
+    yield tmp_path
+    cache.set_backend(None)
+    cache.get_store("sqlite").close()
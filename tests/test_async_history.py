@@ -0,0 +1,162 @@
+import asyncio
+import json
+from datetime import date, timedelta
+from unittest.mock import patch
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from jugaad_data import transport
+from jugaad_data.chunking import MaxWindowChunks
+from jugaad_data.nse import NSEHistory, AsyncNSEHistory, AsyncNSEIndexHistory
+
+
+def fake_exchange(requests_seen, max_rows=None):
+    """httpx handler answering like the NSE and niftyindices endpoints,
+    returning at most max_rows rows of history"""
+    def handler(request):
+        requests_seen.append(request)
+        path = request.url.path
+        if path == "/report-detail/eq_security":
+            return httpx.Response(200, text="", headers={"set-cookie": "nsit=abc; Path=/"})
+        if path.endswith("generateSecurityWiseHistoricalData"):
+            params = request.url.params
+            start = date(*reversed([int(x) for x in params["from"].split("-")]))
+            end = date(*reversed([int(x) for x in params["to"].split("-")]))
+            rows = []
+            d = end
+            while d >= start:
+                rows.append({"CH_TIMESTAMP": d.isoformat(), "CH_SYMBOL": params["symbol"]})
+                d -= timedelta(days=1)
+            return httpx.Response(200, json={"data": rows[:max_rows]})
+        if path.endswith("getHistoricaldatatabletoString"):
+            cinfo = json.loads(request.content)["cinfo"]
+            return httpx.Response(200, json=[{"HistoricalDate": "01 Jan 2020", "cinfo": cinfo}])
+        return httpx.Response(404)
+    return handler
+
+
+def client(seen, cls=AsyncNSEHistory, **kw):
+    mock = httpx.AsyncClient(transport=httpx.MockTransport(fake_exchange(seen)))
+    t = transport.Transport(rate_limits={}, retry=transport.RetryPolicy(retries=0))
+    return cls(client=mock, transport=t, **kw)
+
+
+def test_stock_raw_fetches_chunks_concurrently(cache_env):
+    seen = []
+
+    async def main():
+        h = client(seen, max_concurrency=4)
+        rows = await asyncio.gather(*[h.stock_raw(s, date(2020, 1, 1), date(2020, 6, 30))
+                                      for s in ["SBIN", "TCS", "INFY"]])
+        await h.client.aclose()
+        return rows
+
+    results = asyncio.run(main())
+    paths = [r.url.path for r in seen]
+    # Session cookies are fetched once for all concurrent requests
+    assert paths.count("/report-detail/eq_security") == 1
+    assert len(paths) == 1 + 3 * 6
+    for symbol, rows in zip(["SBIN", "TCS", "INFY"], results):
+        assert len(rows) == 182
+        assert rows[0]["CH_TIMESTAMP"] == "2020-06-30" and rows[-1]["CH_TIMESTAMP"] == "2020-01-01"
+        assert all(r["CH_SYMBOL"] == symbol for r in rows)
+
+    # Chunks are cached where the sync client looks for them
+    with patch.object(NSEHistory, "_get", side_effect=AssertionError("not cached")):
+        assert NSEHistory().stock_raw("TCS", date(2020, 1, 1), date(2020, 6, 30)) == results[1]
+
+
+def test_retries_with_transport_policy(cache_env, monkeypatch):
+    responses = [httpx.Response(503), httpx.Response(200, json={"data": []})]
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.url.path == "/report-detail/eq_security":
+            return httpx.Response(200)
+        return responses.pop(0)
+
+    async def main():
+        t = transport.Transport(rate_limits={}, retry=transport.RetryPolicy(retries=2, backoff=0.01))
+        h = AsyncNSEHistory(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                            transport=t)
+        return await h.stock_raw("SBIN", date(2020, 1, 1), date(2020, 1, 31))
+
+    assert asyncio.run(main()) == []
+    assert len(seen) == 3
+
+
+def test_truncated_chunks_are_split(cache_env):
+    seen = []
+
+    async def main():
+        h = AsyncNSEHistory(client=httpx.AsyncClient(
+            transport=httpx.MockTransport(fake_exchange(seen, max_rows=20))),
+            transport=transport.Transport(rate_limits={}, retry=transport.RetryPolicy(retries=0)))
+        h.chunking = MaxWindowChunks(max_rows=20, min_days=1)
+        async with h:
+            return await h.stock_raw("SBIN", date(2020, 1, 1), date(2020, 12, 31))
+
+    rows = asyncio.run(main())
+    dates = [r["CH_TIMESTAMP"] for r in rows]
+    assert len(dates) == 366 and len(set(dates)) == 366
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_error_responses_raise(cache_env):
+    def handler(request):
+        if request.url.path == "/report-detail/eq_security":
+            return httpx.Response(200)
+        return httpx.Response(404, text="<html>Not found</html>")
+
+    async def main(cls, fetch):
+        t = transport.Transport(rate_limits={}, retry=transport.RetryPolicy(retries=0))
+        async with cls(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                       transport=t) as h:
+            return await fetch(h)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main(AsyncNSEHistory,
+                         lambda h: h.stock_raw("SBIN", date(2020, 1, 1), date(2020, 1, 31))))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main(AsyncNSEIndexHistory,
+                         lambda h: h.index_raw("NIFTY 50", date(2020, 1, 1), date(2020, 1, 31))))
+
+
+def test_index_raw(cache_env):
+    seen = []
+
+    async def main():
+        async with client(seen, AsyncNSEIndexHistory) as h:
+            return await h.index_raw("NIFTY 50", date(2020, 1, 1), date(2020, 2, 29))
+
+    rows = asyncio.run(main())
+    assert len(rows) == 2
+    assert [r.method for r in seen] == ["POST", "POST"]
+    assert "NIFTY 50" in rows[0]["cinfo"]
+
+
+def test_client_created_outside_the_loop(cache_env):
+    seen = []
+    handler = fake_exchange(seen)
+
+    async def slow_handler(request):
+        # Requests overlap, so they wait for the semaphore
+        await asyncio.sleep(0.001)
+        return handler(request)
+
+    # Created before any loop runs and used from two loops after another
+    h = AsyncNSEHistory(client=httpx.AsyncClient(transport=httpx.MockTransport(slow_handler)),
+                        transport=transport.Transport(retry=transport.RetryPolicy(retries=0)),
+                        max_concurrency=1)
+    # Shared between processes, reserve waits for a file lock
+    h.transport.limiter = transport.RateLimiter({"nseindia.com": (1000, 1000)}, shared=True)
+
+    async def fetch(year):
+        return await h.stock_raw("SBIN", date(year, 1, 1), date(year, 3, 31))
+
+    assert len(asyncio.run(fetch(2020))) == 91
+    assert len(asyncio.run(fetch(2021))) == 90
+    assert (cache_env / transport.RATE_LIMIT_DIR_NAME / "nseindia.com").exists()
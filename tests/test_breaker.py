@@ -0,0 +1,110 @@
+import asyncio
+import time
+from datetime import date
+
+import pytest
+import requests
+
+from jugaad_data import transport as tr
+from jugaad_data.breaker import CircuitBreaker, BreakerRegistry, CircuitOpenError
+from jugaad_data.fake_exchange import FakeExchange, add_stock_history
+from jugaad_data.replay import Cassette
+from jugaad_data.nse import NSEHistory
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def call(breaker, status=200, error=None):
+    with breaker.guard() as c:
+        if error is not None:
+            raise error
+        c.response = Response(status)
+
+
+def test_opens_after_failures_and_fails_fast():
+    b = CircuitBreaker("x", window=10, min_requests=4, error_threshold=0.5, reset_timeout=60)
+    call(b)
+    call(b, 404)
+    call(b, 503)
+    assert b.state == "closed"
+    with pytest.raises(requests.ConnectionError):
+        call(b, error=requests.ConnectionError())
+    assert b.state == "open"
+    with pytest.raises(CircuitOpenError):
+        call(b)
+    assert b.snapshot()["rejected"] == 1
+
+
+def test_half_open_probe():
+    b = CircuitBreaker("x", min_requests=1, reset_timeout=0.01)
+    call(b, 500)
+    assert b.state == "open"
+    time.sleep(0.02)
+    call(b, 429)
+    assert b.state == "open"
+    time.sleep(0.02)
+    call(b)
+    assert b.state == "closed"
+    assert b.snapshot()["failures"] == 0
+
+
+def test_cancelled_probe_is_released():
+    b = CircuitBreaker("x", min_requests=1, reset_timeout=0.01)
+    call(b, 500)
+    time.sleep(0.02)
+
+    async def probe():
+        with b.guard() as c:
+            await asyncio.sleep(10)
+            c.response = Response(200)
+
+    async def cancel():
+        task = asyncio.ensure_future(probe())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel())
+    assert b.state == "half_open" and b.probes == 0
+    with pytest.raises(KeyboardInterrupt):
+        call(b, error=KeyboardInterrupt())
+    assert b.probes == 0
+    call(b)
+    assert b.state == "closed"
+
+
+def test_registry_keys_and_disable(monkeypatch):
+    r = BreakerRegistry(min_requests=1)
+    with pytest.raises(ValueError):
+        with r.guard("https://WWW.nseindia.com/api/x?a=1", "x"):
+            raise ValueError("not a failure")
+    with r.guard("https://www.nseindia.com/api/x", "x") as c:
+        c.response = Response(502)
+    assert r.open_circuits() == ["www.nseindia.com/x"]
+    monkeypatch.setenv("J_HTTP_BREAKER", "0")
+    r = BreakerRegistry(min_requests=1)
+    for _ in range(3):
+        with r.guard("https://www.nseindia.com/api/x", "x") as c:
+            c.response = Response(502)
+    assert r.snapshot() == {}
+
+
+def test_stock_raw_fails_fast_when_exchange_is_down(cache_env):
+    cassette = add_stock_history(Cassette(), NSEHistory(), ["SBIN"],
+                                 date(2020, 1, 1), date(2023, 12, 31))
+    breakers = BreakerRegistry(min_requests=4, reset_timeout=60)
+    with FakeExchange(cassette, latency=0.01, error_rate=1) as ex:
+        h = NSEHistory(transport=ex.transport(retry=tr.RetryPolicy(retries=0),
+                                              breakers=breakers))
+        h.workers = 2
+        with pytest.raises(requests.HTTPError):
+            h.stock_raw("SBIN", date(2020, 1, 1), date(2023, 12, 31))
+        sent = ex.stats["requests"]
+    # 48 month chunks, only a few were sent
+    assert sent < 12
+    assert breakers.snapshot()["www.nseindia.com/stock_history"]["state"] == "open"
+    assert breakers.snapshot()["www.nseindia.com/stock_history"]["rejected"] > 30
@@ -0,0 +1,572 @@
+import os
+import time
+import pickle
+from datetime import date, timedelta
+
+import pytest
+
+from jugaad_data import cache
+from jugaad_data import util as ut
+
+
+def test_get_store_selection(cache_env, monkeypatch):
+    assert cache.get_store().name == "pickle"
+    monkeypatch.setenv(cache.BACKEND_ENV, "sqlite")
+    assert cache.get_store().name == "sqlite"
+    cache.set_backend("pickle")
+    assert cache.get_store().name == "pickle"
+    with pytest.raises(ValueError):
+        cache.set_backend("redis")
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_store_roundtrip(cache_env, backend):
+    store = cache.get_store(backend)
+    assert store.read("app", "k1") is None
+    store.write("app", "k1", b"one")
+    store.write_many("app", [("k2", b"two"), ("k3", b"three")])
+    assert store.read("app", "k1") == b"one"
+    assert store.read_many("app", ["k1", "k3", "missing"]) == {"k1": b"one", "k3": b"three"}
+    assert sorted(store.keys("app")) == ["k1", "k2", "k3"]
+    assert store.keys("other-app") == []
+    store.delete("app", "k2")
+    assert store.read("app", "k2") is None
+
+
+def test_sqlite_single_file_wal(cache_env):
+    cache.set_backend("sqlite")
+
+    @ut.cached("test-sqlite")
+    def fetch(symbol, from_date):
+        return {"symbol": symbol}
+
+    assert fetch("SBIN", date(2020, 1, 1)) == {"symbol": "SBIN"}
+    assert cache.SQLITE_FILE_NAME in os.listdir(cache_env)
+    assert not os.path.exists(os.path.join(cache_env, "test-sqlite"))
+    conn = cache.get_store().connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_pool_cached_only_fetches_misses(cache_env, backend):
+    cache.set_backend(backend)
+    calls = []
+
+    class Client:
+        @ut.cached("test-pool-cached")
+        def _chunk(self, symbol, from_date, to_date):
+            calls.append(from_date)
+            return [from_date.month]
+
+    c = Client()
+    c._chunk("SBIN", date(2020, 2, 1), date(2020, 2, 29))
+    params = [("SBIN", date(2020, m, 1), date(2020, m, 28)) for m in (1, 2, 3)]
+    params[1] = ("SBIN", date(2020, 2, 1), date(2020, 2, 29))
+    calls.clear()
+    assert ut.pool_cached(c._chunk, params) == [[1], [2], [3]]
+    assert sorted(calls) == [date(2020, 1, 1), date(2020, 3, 1)]
+    calls.clear()
+    assert ut.pool_cached(c._chunk, params) == [[1], [2], [3]]
+    assert calls == []
+
+
+def test_migrate_pickle_cache(cache_env):
+    @ut.cached("test-migrate")
+    def fetch(x):
+        return {"x": x}
+
+    for i in range(5):
+        fetch(i)
+    moved = cache.migrate_pickle_cache("test-migrate", remove=True)
+    assert moved == 5
+    assert cache.get_store("pickle").keys("test-migrate") == []
+    sqlite = cache.get_store("sqlite")
+    assert pickle.loads(sqlite.read("test-migrate", "3")) == {"x": 3}
+
+    cache.set_backend("sqlite")
+    fetch_calls = []
+
+    @ut.cached("test-migrate")
+    def fetch_again(x):
+        fetch_calls.append(x)
+        return None
+
+    assert fetch_again(3) == {"x": 3}
+    assert fetch_calls == []
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_stores_keep_given_write_time(cache_env, backend):
+    store = cache.get_store(backend)
+    store.write("test-written", "a", b"1", written_at=1000.0)
+    store.write("test-written", "b", b"2")
+    written = dict(store.written("test-written"))
+    assert written["a"] == 1000.0
+    assert written["b"] > 1000.0
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_unsettled_chunks_of_old_format_are_refetched(cache_env, monkeypatch, backend):
+    monkeypatch.setattr(ut, "today", lambda: date(2026, 11, 5))
+    calls = []
+
+    @ut.cached("test-old-format")
+    def fetch(symbol, from_date, to_date):
+        calls.append(to_date)
+        return ["new"]
+
+    # Written by an older version on 2026-10-20, when September was settled
+    # but October was not
+    written_at = time.mktime((2026, 10, 20, 12, 0, 0, 0, 0, -1))
+    pickles = cache.get_store("pickle")
+    pickles.write_many("test-old-format", [
+        ("2026-09-01-SBIN-2026-09-30", pickle.dumps(["old"])),
+        ("2026-10-01-SBIN-2026-10-31", pickle.dumps(["old"])),
+    ], {"2026-09-01-SBIN-2026-09-30": written_at, "2026-10-01-SBIN-2026-10-31": written_at})
+    if backend == "sqlite":
+        assert cache.migrate_pickle_cache("test-old-format") == 2
+        cache.set_backend("sqlite")
+
+    assert fetch("SBIN", date(2026, 9, 1), date(2026, 9, 30)) == ["old"]
+    assert fetch("SBIN", date(2026, 10, 1), date(2026, 10, 31)) == ["new"]
+    assert calls == [date(2026, 10, 31)]
+    # Checked once, the refetched entry is kept
+    assert fetch("SBIN", date(2026, 10, 1), date(2026, 10, 31)) == ["new"]
+    assert calls == [date(2026, 10, 31)]
+
+
+def test_format_marker_in_read_only_cache_dir(cache_env, monkeypatch):
+    calls = []
+
+    @ut.cached("test-format-read-only")
+    def fetch(value):
+        calls.append(value)
+        return value
+
+    fetch("a")
+    cache.forget_format(cache.get_store(), "test-format-read-only")
+    real_open = open
+
+    def read_only_open(path, mode="r", *args, **kwargs):
+        if "w" in mode and cache.FORMAT_DIR_NAME in str(path):
+            raise PermissionError(13, "Permission denied", path)
+        return real_open(path, mode, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", read_only_open)
+    assert fetch("a") == "a"
+    assert fetch("a") == "a"
+    assert calls == ["a"]
+    assert not os.path.exists(cache.format_path(cache.get_store(), "test-format-read-only"))
+
+
+def test_settled_open_entry_is_removed(cache_env, monkeypatch):
+    now = {"today": date(2026, 10, 14)}
+    monkeypatch.setattr(ut, "today", lambda: now["today"])
+
+    @ut.cached("test-open-settled", date_field="CH_TIMESTAMP")
+    def fetch(symbol, from_date, to_date):
+        return [{"CH_TIMESTAMP": d.isoformat()} for d in days(from_date, to_date)]
+
+    fetch("SBIN", date(2026, 10, 1), date(2026, 10, 14))
+    now["today"] = date(2026, 10, 20)
+    assert len(fetch("SBIN", date(2026, 10, 1), date(2026, 10, 14))) == 14
+    assert sorted(cache.get_store().keys("test-open-settled")) == \
+        ["2026-10-01-SBIN-2026-10-14", "intervals-SBIN"]
+
+
+@pytest.fixture
+def memory_tier():
+    cache.configure_memory(max_entries=100, max_bytes=10 * 1024 * 1024)
+    yield cache.memory
+    cache.configure_memory(0, 0)
+
+
+def test_memory_cache_lru_bounds():
+    m = cache.MemoryCache(max_entries=2)
+    m.put("a", b"1")
+    m.put("b", b"2")
+    assert m.get("a") == b"1"
+    m.put("c", b"3")
+    assert m.get("b") is None
+    assert m.get("a") == b"1" and m.get("c") == b"3"
+    stats = m.stats()
+    assert stats["hits"] == 3 and stats["misses"] == 1
+    assert stats["evictions"] == 1 and stats["entries"] == 2
+
+    m = cache.MemoryCache(max_bytes=10)
+    m.put("a", b"12345")
+    m.put("b", b"12345")
+    m.put("c", b"123")
+    assert m.get("a") is None
+    assert m.stats()["bytes"] == 8
+    m.put("huge", b"x" * 11)
+    assert m.get("huge") is None
+
+    assert not cache.MemoryCache().enabled
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_memory_tier_skips_store(cache_env, memory_tier, monkeypatch, backend):
+    cache.set_backend(backend)
+
+    @ut.cached("test-memory")
+    def fetch(x):
+        return [x]
+
+    assert fetch(1) == [1]
+    store = cache.get_store()
+
+    def no_disk(*args, **kwargs):
+        raise AssertionError("store should not be touched")
+
+    monkeypatch.setattr(store, "read", no_disk)
+    monkeypatch.setattr(store, "read_many", lambda app_name, keys: {} if not keys else no_disk())
+    value = fetch(1)
+    assert value == [1]
+    value.append(2)
+    assert fetch(1) == [1]
+    assert fetch.lookup_many([(1,)]) == [[1]]
+    assert memory_tier.stats()["hits"] == 3
+
+
+def test_memory_tier_thread_safe(cache_env, memory_tier):
+    calls = []
+
+    @ut.cached("test-memory-threads")
+    def fetch(x):
+        calls.append(x)
+        return x * 2
+
+    params = [(i % 10,) for i in range(500)]
+    assert list(ut.pool(fetch, params, max_workers=8)) == [p[0] * 2 for p in params]
+    stats = memory_tier.stats()
+    assert stats["entries"] == 10
+    assert stats["hits"] + stats["misses"] == 500
+    # Concurrent misses of a key are fetched once
+    assert sorted(calls) == list(range(10))
+
+
+def days(from_date, to_date):
+    d = to_date
+    while d >= from_date:
+        yield d
+        d -= timedelta(days=1)
+
+
+def test_open_chunks_refresh_incrementally(cache_env, monkeypatch):
+    calls = []
+    now = {"today": date(2026, 10, 14)}
+    monkeypatch.setattr(ut, "today", lambda: now["today"])
+
+    @ut.cached("test-open", date_field="CH_TIMESTAMP")
+    def fetch(symbol, from_date, to_date):
+        calls.append((from_date, to_date))
+        return [{"CH_TIMESTAMP": d.isoformat(),
+                 "final": d < now["today"]} for d in days(from_date, to_date)]
+
+    rows = fetch("SBIN", date(2026, 10, 1), date(2026, 10, 14))
+    assert calls == [(date(2026, 10, 1), date(2026, 10, 14))]
+    assert len(rows) == 14
+    assert cache.get_store().keys("test-open") == ["2026-10-01-SBIN-open"]
+
+    # Within TTL the open chunk is reused, also for an earlier end date
+    calls.clear()
+    assert fetch("SBIN", date(2026, 10, 1), date(2026, 10, 14)) == rows
+    assert fetch("SBIN", date(2026, 10, 1), date(2026, 10, 13)) == rows[1:]
+    assert calls == []
+
+    # Once TTL expires only the unsettled days are fetched
+    monkeypatch.setenv(cache.OPEN_TTL_ENV, "0")
+    now["today"] = date(2026, 10, 16)
+    rows = fetch("SBIN", date(2026, 10, 1), date(2026, 10, 16))
+    assert calls == [(date(2026, 10, 14), date(2026, 10, 16))]
+    assert [r["CH_TIMESTAMP"] for r in rows] == \
+        [d.isoformat() for d in days(date(2026, 10, 1), date(2026, 10, 16))]
+
+    # When the month is settled, the chunk is completed from the open entry
+    # and stored permanently
+    calls.clear()
+    now["today"] = date(2026, 11, 3)
+    rows = fetch("SBIN", date(2026, 10, 1), date(2026, 10, 31))
+    assert calls == [(date(2026, 10, 16), date(2026, 10, 31))]
+    assert len(rows) == 31
+    assert all(r["final"] for r in rows)
+    assert sorted(cache.get_store().keys("test-open")) == \
+        ["2026-10-01-SBIN-2026-10-13", "2026-10-01-SBIN-2026-10-31", "intervals-SBIN"]
+    calls.clear()
+    assert fetch("SBIN", date(2026, 10, 1), date(2026, 10, 31)) == rows
+    assert calls == []
+
+
+def test_open_chunks_without_date_field(cache_env, monkeypatch):
+    calls = []
+    monkeypatch.setattr(ut, "today", lambda: date(2026, 10, 14))
+
+    @ut.cached("test-open-plain")
+    def fetch(symbol, from_date, to_date):
+        calls.append((from_date, to_date))
+        return {"to": to_date}
+
+    fetch("SBIN", date(2026, 10, 1), date(2026, 10, 14))
+    fetch("SBIN", date(2026, 10, 1), date(2026, 10, 14))
+    assert len(calls) == 1
+    fetch("SBIN", date(2026, 10, 1), date(2026, 10, 20))
+    assert len(calls) == 2
+    assert fetch.lookup_many([("SBIN", date(2026, 10, 1), date(2026, 10, 20))]) == [ut.MISS]
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_overlapping_intervals_are_reused(cache_env, backend):
+    cache.set_backend(backend)
+    calls = []
+
+    class Client:
+        @ut.cached("test-intervals", date_field="CH_TIMESTAMP")
+        def _stock(self, symbol, from_date, to_date, series="EQ"):
+            calls.append((from_date, to_date))
+            return [{"CH_TIMESTAMP": d.isoformat(), "CH_SYMBOL": symbol}
+                    for d in days(from_date, to_date)]
+
+    c = Client()
+    c._stock("SBIN", date(2021, 1, 1), date(2021, 1, 31))
+    c._stock("SBIN", date(2021, 3, 1), date(2021, 3, 31))
+    calls.clear()
+
+    # Strict subset, served without calling the API
+    rows = c._stock("SBIN", date(2021, 1, 15), date(2021, 1, 20))
+    assert calls == []
+    assert [r["CH_TIMESTAMP"] for r in rows] == \
+        [d.isoformat() for d in days(date(2021, 1, 15), date(2021, 1, 20))]
+    # and kept under its own key for the next identical call
+    key = Client._stock.key((c, "SBIN", date(2021, 1, 15), date(2021, 1, 20)))
+    assert cache.get_store().read("test-intervals", key) is not None
+
+    # Only the uncovered part is fetched
+    rows = c._stock("SBIN", date(2021, 1, 15), date(2021, 3, 10))
+    assert calls == [(date(2021, 2, 1), date(2021, 2, 28))]
+    assert [r["CH_TIMESTAMP"] for r in rows] == \
+        [d.isoformat() for d in days(date(2021, 1, 15), date(2021, 3, 10))]
+
+    # The fetched gap is indexed as well
+    calls.clear()
+    c._stock("SBIN", date(2021, 2, 10), date(2021, 2, 12))
+    assert calls == []
+
+    # Other series do not share intervals
+    c._stock("SBIN", date(2021, 1, 15), date(2021, 1, 20), series="BE")
+    assert calls == [(date(2021, 1, 15), date(2021, 1, 20))]
+
+    # Chunks overlapping each other, e.g. cached with other chunking
+    overlap = (c, "SBIN", date(2021, 1, 25), date(2021, 2, 5))
+    Client._stock.put(c._stock(*overlap[1:]), overlap)
+    rows = c._stock("SBIN", date(2021, 1, 1), date(2021, 3, 20))
+    assert [r["CH_TIMESTAMP"] for r in rows] == \
+        [d.isoformat() for d in days(date(2021, 1, 1), date(2021, 3, 20))]
+
+
+def test_intervals_with_unparseable_dates_are_a_miss(cache_env):
+    calls = []
+
+    @ut.cached("test-intervals-bad-dates", date_field="CH_TIMESTAMP")
+    def fetch(symbol, from_date, to_date):
+        calls.append((from_date, to_date))
+        rows = [{"CH_TIMESTAMP": d.isoformat()} for d in days(from_date, to_date)]
+        return rows + [{"CH_TIMESTAMP": "-"}]
+
+    fetch("SBIN", date(2021, 1, 1), date(2021, 1, 31))
+    calls.clear()
+    rows = fetch("SBIN", date(2021, 1, 15), date(2021, 1, 20))
+    assert calls == [(date(2021, 1, 15), date(2021, 1, 20))]
+    assert len(rows) == 7
+
+
+def test_missing_intervals():
+    d = lambda day: date(2021, 1, day)
+    assert ut.missing_intervals(d(1), d(31), []) == [(d(1), d(31))]
+    assert ut.missing_intervals(d(1), d(31), [(d(1), d(31))]) == []
+    assert ut.missing_intervals(d(5), d(20), [(d(1), d(10)), (d(15), d(16))]) == \
+        [(d(11), d(14)), (d(17), d(20))]
+    assert ut.missing_intervals(d(5), d(20), [(d(25), d(30))]) == [(d(5), d(20))]
+
+
+def test_eviction_policy_victims():
+    entries = [("old", 10, 100.0), ("mid", 10, 200.0), ("new", 10, 300.0)]
+    assert cache.EvictionPolicy(max_entries=2).victims(entries) == ["old"]
+    assert cache.EvictionPolicy(max_bytes=15).victims(entries) == ["old", "mid"]
+    assert cache.EvictionPolicy(max_age=150).victims(entries, now=320.0) == ["old"]
+    assert cache.EvictionPolicy(max_entries=5).victims(entries) == []
+
+
+def set_access_time(store, app_name, key, ts):
+    if store.name == "pickle":
+        os.utime(store.path(app_name, key), (ts, ts))
+    else:
+        store.connection().execute(
+            "UPDATE cache SET accessed_at = ? WHERE app_name = ? AND key = ?",
+            (ts, app_name, key))
+
+
+@pytest.mark.parametrize("backend", ["pickle", "sqlite"])
+def test_compact_removes_least_recently_used(cache_env, backend):
+    store = cache.get_store(backend)
+    now = time.time()
+    for i in range(5):
+        store.write("test-compact", "k%d" % i, b"x" * 100)
+        set_access_time(store, "test-compact", "k%d" % i, now - 1000 + i)
+    store.write("other-app", "k0", b"x")
+
+    assert cache.compact("test-compact", store) == 0
+    assert cache.compact("test-compact", store, max_entries=3) == 2
+    assert sorted(store.keys("test-compact")) == ["k2", "k3", "k4"]
+    assert cache.compact("test-compact", store, max_bytes=150) == 2
+    assert store.keys("test-compact") == ["k4"]
+    assert cache.compact("test-compact", store, max_age=10) == 1
+    assert store.keys("test-compact") == []
+    assert store.keys("other-app") == ["k0"]
+
+
+def test_background_eviction(cache_env, monkeypatch):
+    monkeypatch.setattr(cache, "EVICTION_INTERVAL", 0)
+    cache.set_eviction_policy("test-evict", max_entries=3)
+    try:
+        @ut.cached("test-evict")
+        def fetch(x):
+            return x
+
+        for i in range(10):
+            fetch(i)
+            time.sleep(0.01)
+        for _ in range(100):
+            if len(cache.get_store().keys("test-evict")) <= 3:
+                break
+            time.sleep(0.05)
+        assert len(cache.get_store().keys("test-evict")) <= 3
+    finally:
+        cache.set_eviction_policy("test-evict")
+    assert cache.get_eviction_policy("test-evict") is None
+
+
+def test_npz_serializer_roundtrip(cache_env):
+    np = pytest.importorskip("numpy")
+
+    @ut.cached("test-npz", serializer=cache.npz_serializer)
+    def columns(symbol):
+        return {"CH_TIMESTAMP": np.array(["2021-01-01"], dtype="datetime64[D]"),
+                "CH_SYMBOL": np.array([symbol]),
+                "CH_CLOSING_PRICE": np.array([1.5])}
+
+    first = columns("SBIN")
+    data = cache.get_store().read("test-npz", "SBIN")
+    assert data[:2] == b"PK"
+    second = columns("SBIN")
+    assert set(second) == set(first)
+    for k in first:
+        assert (first[k] == second[k]).all() and first[k].dtype == second[k].dtype
+
+
+@pytest.fixture
+def compression():
+    yield cache.set_compression
+    cache._compression.clear()
+
+
+@pytest.mark.parametrize("codec", cache.available_codecs())
+def test_compressed_entries_roundtrip(cache_env, compression, codec):
+    compression("test-compress", codec)
+    rows = [{"CH_SYMBOL": "SBIN", "CH_SERIES": "EQ", "CH_CLOSING_PRICE": i} for i in range(500)]
+
+    @ut.cached("test-compress")
+    def fetch(symbol):
+        return rows
+
+    assert fetch("SBIN") == rows
+    data = cache.get_store().read("test-compress", "SBIN")
+    assert data.startswith(cache.CODEC_MAGIC)
+    assert len(data) < len(pickle.dumps(rows)) / 3
+    assert fetch("SBIN") == rows
+
+
+def test_compression_per_app_and_mixed_entries(cache_env, compression, monkeypatch):
+    @ut.cached("test-plain")
+    def plain(x):
+        return [x] * 100
+
+    @ut.cached("test-zlib")
+    def packed(x):
+        return [x] * 100
+
+    plain(1)
+    packed(1)
+    compression("test-zlib", "zlib", level=1)
+    packed(2)
+    plain(2)
+    store = cache.get_store()
+    assert not store.read("test-zlib", "1").startswith(cache.CODEC_MAGIC)
+    assert store.read("test-zlib", "2").startswith(cache.CODEC_MAGIC)
+    assert not store.read("test-plain", "2").startswith(cache.CODEC_MAGIC)
+    # Both old plain and new compressed entries are readable
+    assert packed(1) == [1] * 100 and packed(2) == [2] * 100
+
+    compression("test-zlib", None)
+    monkeypatch.setenv(cache.COMPRESSION_ENV, "zlib")
+    plain(3)
+    assert store.read("test-plain", "3").startswith(cache.CODEC_MAGIC)
+
+    with pytest.raises(ValueError):
+        compression("test-zlib", "brotli")
+    with pytest.raises(ValueError):
+        cache.decode(cache.CODEC_MAGIC + b"?data")
+
+
+@pytest.mark.skipif(cache.zstandard is not None, reason="zstandard is installed")
+def test_missing_codec_module(compression):
+    with pytest.raises(ModuleNotFoundError):
+        compression("test-zstd", "zstd")
+
+
+def test_async_cached_shares_storage_with_cached(cache_env):
+    import asyncio
+    calls = []
+
+    @ut.async_cached("test-async", date_field="CH_TIMESTAMP")
+    async def fetch_async(symbol, from_date, to_date):
+        calls.append((symbol, from_date))
+        await asyncio.sleep(0.05)
+        return [{"CH_TIMESTAMP": d.isoformat(), "v": symbol} for d in days(from_date, to_date)]
+
+    @ut.cached("test-async", date_field="CH_TIMESTAMP")
+    def fetch_sync(symbol, from_date, to_date):
+        raise AssertionError("should be served from the cache")
+
+    async def main():
+        return await asyncio.gather(*[fetch_async("SBIN", date(2020, 1, 1), date(2020, 1, 31))
+                                      for _ in range(10)],
+                                    fetch_async("TCS", date(2020, 1, 1), date(2020, 1, 31)))
+
+    results = asyncio.run(main())
+    assert sorted(calls) == [("SBIN", date(2020, 1, 1)), ("TCS", date(2020, 1, 1))]
+    assert all(r == results[0] for r in results[:10])
+    # Each caller gets its own copy
+    assert len({id(r) for r in results[:10]}) == 10
+    assert fetch_sync("SBIN", date(2020, 1, 1), date(2020, 1, 31)) == results[0]
+    # A second run is served from the store
+    asyncio.run(main())
+    assert len(calls) == 2
+    assert fetch_async.lookup(("SBIN", date(2020, 2, 1), date(2020, 2, 29))) is ut.MISS
+
+
+def test_async_cached_open_chunk(cache_env, monkeypatch):
+    import asyncio
+    monkeypatch.setattr(ut, "today", lambda: date(2020, 1, 20))
+    calls = []
+
+    @ut.async_cached("test-async-open", date_field="CH_TIMESTAMP")
+    async def fetch_async(symbol, from_date, to_date):
+        calls.append(to_date)
+        return [{"CH_TIMESTAMP": d.isoformat()} for d in days(from_date, date(2020, 1, 17))]
+
+    rows = asyncio.run(fetch_async("SBIN", date(2020, 1, 1), date(2020, 1, 31)))
+    assert asyncio.run(fetch_async("SBIN", date(2020, 1, 1), date(2020, 1, 31))) == rows
+    assert len(calls) == 1
+    # Kept under the open key only
+    assert "SBIN-2020-01-01-2020-01-31" not in cache.get_store().keys("test-async-open")
@@ -1,10 +1,16 @@
 import os
+import multiprocessing
 import pickle
 import tempfile
 import threading
+import time
+from datetime import date
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from jugaad_data.util import cached
+import pytest
+
+from jugaad_data import cache
+from jugaad_data.util import cached, live_cache
 
 
 def test_atomic_write_no_corruption(monkeypatch):
@@ -59,3 +65,167 @@ def test_concurrent_same_key_does_not_corrupt(monkeypatch):
             with open(fpath, "rb") as fp:
                 data = pickle.load(fp)
             assert data == [1, 2, 3, 4, 5]
+
+
+def test_concurrent_same_key_fetches_once(monkeypatch):
+    """Concurrent misses of the same key must run the wrapped function once."""
+    app_name = "test-single-flight"
+    calls = []
+    started = threading.Event()
+
+    @cached(app_name)
+    def slow(value):
+        calls.append(value)
+        started.set()
+        time.sleep(0.2)
+        return {"value": value}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("J_CACHE_DIR", tmpdir)
+
+        with ThreadPoolExecutor(max_workers=20) as ex:
+            futures = [ex.submit(slow, value="static") for _ in range(100)]
+            results = [f.result() for f in futures]
+
+    assert calls == ["static"]
+    assert all(r == {"value": "static"} for r in results)
+    # Every caller gets its own copy
+    assert len({id(r) for r in results}) == len(results)
+
+
+def test_concurrent_miss_error_is_shared(monkeypatch):
+    app_name = "test-single-flight-error"
+    calls = []
+
+    @cached(app_name)
+    def broken(value):
+        calls.append(value)
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("J_CACHE_DIR", tmpdir)
+        with ThreadPoolExecutor(max_workers=10) as ex:
+            futures = [ex.submit(broken, value="x") for _ in range(10)]
+            errors = [f.exception() for f in futures]
+        assert all(isinstance(e, ValueError) for e in errors)
+        assert len(calls) < 10
+        cache_dir = os.path.join(tmpdir, app_name)
+        assert not os.path.isdir(cache_dir) or not os.listdir(cache_dir)
+
+
+class LiveQuote:
+    time_out = 5
+
+    def __init__(self):
+        self.calls = 0
+
+    @live_cache
+    def quote(self, symbol):
+        self.calls += 1
+        time.sleep(0.2)
+        return {"symbol": symbol}
+
+
+def test_live_cache_concurrent_calls_fetch_once():
+    q = LiveQuote()
+    with ThreadPoolExecutor(max_workers=10) as ex:
+        results = list(ex.map(q.quote, ["SBIN"] * 50))
+    assert q.calls == 1
+    assert all(r == {"symbol": "SBIN"} for r in results)
+
+
+@cached("test-multiprocess")
+def _slow_fetch(value):
+    # Every actual fetch leaves a line in the log shared by all processes
+    with open(os.path.join(os.environ["J_CACHE_DIR"], "calls.log"), "a") as fp:
+        fp.write("{}\n".format(os.getpid()))
+    time.sleep(0.3)
+    return {"value": value}
+
+
+def _fetch_in_process(barrier, results):
+    barrier.wait()
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        values = list(ex.map(_slow_fetch, ["static"] * 8))
+    results.put(values)
+
+
+@pytest.mark.skipif(cache.fcntl is None or "fork" not in multiprocessing.get_all_start_methods(),
+                    reason="needs fcntl and fork")
+def test_processes_sharing_cache_fetch_once(monkeypatch):
+    """Concurrent misses from several processes must run the function once."""
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("J_CACHE_DIR", tmpdir)
+        barrier = ctx.Barrier(8)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_fetch_in_process, args=(barrier, results))
+                 for _ in range(8)]
+        for p in procs:
+            p.start()
+        values = [results.get(timeout=30) for _ in procs]
+        for p in procs:
+            p.join(timeout=30)
+            assert p.exitcode == 0
+
+        with open(os.path.join(tmpdir, "calls.log")) as fp:
+            assert len(fp.readlines()) == 1
+        assert all(v == [{"value": "static"}] * 8 for v in values)
+        # Lock files are removed once released
+        lock_dir = os.path.join(tmpdir, cache.LOCK_DIR_NAME, "test-multiprocess")
+        assert os.listdir(lock_dir) == []
+
+
+@cached("test-multiprocess-index", date_field="CH_TIMESTAMP")
+def _fetch_month(symbol, from_date, to_date):
+    return [{"CH_TIMESTAMP": from_date.isoformat()}, {"CH_TIMESTAMP": to_date.isoformat()}]
+
+
+def _register_in_process(barrier, month):
+    # The memory tier holds the index read by the first fetch, which
+    # others have grown by the time the second fetch registers
+    cache.configure_memory(max_entries=100, max_bytes=10 ** 7)
+    _fetch_month("SBIN", date(2020, month, 1), date(2020, month, 28))
+    barrier.wait()
+    _fetch_month("SBIN", date(2021, month, 1), date(2021, month, 28))
+
+
+@pytest.mark.skipif(cache.fcntl is None or "fork" not in multiprocessing.get_all_start_methods(),
+                    reason="needs fcntl and fork")
+def test_processes_sharing_interval_index(monkeypatch):
+    """Intervals registered by any process must all end up in the index."""
+    ctx = multiprocessing.get_context("fork")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("J_CACHE_DIR", tmpdir)
+        monkeypatch.delenv(cache.BACKEND_ENV, raising=False)
+        barrier = ctx.Barrier(6)
+        procs = [ctx.Process(target=_register_in_process, args=(barrier, month))
+                 for month in range(1, 7)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=30)
+            assert p.exitcode == 0
+
+        index = pickle.loads(cache.get_store().read("test-multiprocess-index", "intervals-SBIN"))
+        assert sorted((start, end) for start, end, _ in index) == sorted(
+            (date(year, month, 1), date(year, month, 28))
+            for year in (2020, 2021) for month in range(1, 7))
+
+
+@pytest.mark.skipif(cache.fcntl is None, reason="needs fcntl")
+def test_entry_lock_timeout(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("J_CACHE_DIR", tmpdir)
+        with cache.entry_lock("app", "key") as held:
+            assert held
+            result = []
+            t = threading.Thread(target=lambda: result.append(
+                cache.entry_lock("app", "key", timeout=0.2).__enter__()))
+            t.start()
+            t.join()
+            # Gave up waiting and went ahead without the lock
+            assert result == [False]
+        with cache.entry_lock("app", "key", timeout=0) as held:
+            assert not held
@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+
+import pytest
+
+from jugaad_data import util as ut
+from jugaad_data.chunking import (ChunkStrategy, MonthlyChunks, TradingDayChunks, MaxWindowChunks,
+                                  default_chunking)
+from jugaad_data.fake_exchange import FakeExchange, StockHistoryEndpoint
+from jugaad_data.replay import Cassette
+from jugaad_data.nse import NSEHistory
+
+
+def contiguous(ranges, from_date, to_date):
+    assert ranges[0][0] == from_date and ranges[-1][1] == to_date
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert (start - end).days == 1
+
+
+def test_split():
+    from_date, to_date = date(2020, 1, 15), date(2023, 6, 10)
+    monthly = MonthlyChunks().split(from_date, to_date)
+    assert monthly == ut.break_dates(from_date, to_date)
+    windows = MaxWindowChunks().split(from_date, to_date, "stock_history")
+    assert len(windows) == 4
+    contiguous(windows, from_date, to_date)
+    assert len(MaxWindowChunks(30).split(from_date, to_date)) == 42
+    trading = TradingDayChunks(20).split(from_date, to_date)
+    contiguous(trading, from_date, to_date)
+    for start, end in trading[:-1]:
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        assert sum(map(ut.is_trading_day, days)) == 20
+
+
+def test_strategies_implement_split():
+    with pytest.raises(TypeError):
+        ChunkStrategy()
+
+    class Whole(ChunkStrategy):
+        def split(self, from_date, to_date, route=None):
+            return [(from_date, to_date)]
+
+    assert Whole(max_rows=3).truncated([{}] * 3, date(2023, 1, 1), date(2023, 12, 31))
+
+
+def test_truncated():
+    row_date = lambda r: ut.parse_date(r["d"])
+    s = MaxWindowChunks(max_rows=3)
+    jan, dec = date(2023, 1, 1), date(2023, 12, 31)
+    assert not s.truncated([], jan, dec)
+    assert s.truncated([{"d": "2023-12-01"}] * 3, jan, dec)
+    # History starting within the range, e.g. a listing
+    assert not s.truncated([{"d": "2023-06-01"}], jan, dec, row_date=row_date)
+    assert MaxWindowChunks(max_rows=3, gap_days=7).truncated([{"d": "2023-06-01"}], jan, dec,
+                                                             row_date=row_date)
+    # Too short to split
+    assert not s.truncated([{"d": "2023-01-20"}] * 3, jan, date(2023, 1, 31))
+    # Limit of the endpoint
+    assert not MaxWindowChunks().truncated([{"d": "2023-12-01"}] * 300, jan, dec, "stock_history")
+    assert MaxWindowChunks().truncated([{"d": "2023-12-01"}] * 1000, jan, dec, "stock_history")
+    assert s.halves(jan, dec) == [(jan, date(2023, 7, 2)), (date(2023, 7, 3), dec)]
+
+
+def test_default_chunking(monkeypatch):
+    assert isinstance(default_chunking(), MonthlyChunks)
+    monkeypatch.setenv("J_HISTORY_CHUNKING", "trading_days:40")
+    assert default_chunking().days == 40
+    monkeypatch.setenv("J_HISTORY_CHUNKING", "max")
+    assert isinstance(NSEHistory().chunking, MaxWindowChunks)
+    monkeypatch.setenv("J_HISTORY_CHUNKING", "weekly")
+    with pytest.raises(ValueError):
+        default_chunking()
+
+
+def test_truncated_chunks_are_split(cache_env):
+    from_date, to_date = date(2019, 1, 1), date(2023, 12, 31)
+    endpoint = StockHistoryEndpoint(["SBIN"], from_date, to_date, max_days=365, max_rows=100)
+    h = NSEHistory()
+    cassette = Cassette()
+    cassette.add("GET", h.base_url + h.path_map["equity_quote_page"],
+                 headers=[("Set-Cookie", "nsit=fake; Path=/")])
+    with FakeExchange(cassette, endpoints=[endpoint]) as ex:
+        h = NSEHistory(transport=ex.transport())
+        h.workers = 4
+        h.chunking = MaxWindowChunks(max_rows=100)
+        rows = h.stock_raw("SBIN", from_date, to_date)
+        requests = ex.stats["requests"]
+    assert len(rows) == len(endpoint.rows["SBIN"])
+    dates = [r["CH_TIMESTAMP"] for r in rows]
+    assert dates == sorted(dates, reverse=True) and len(set(dates)) == len(dates)
+    # 5 windows of about 260 rows, each fetched whole, in halves and in
+    # quarters, a 1 day window and the cookie page
+    assert requests == 5 * 7 + 1 + 1
+
+
+def test_listing_within_range_is_not_split(cache_env):
+    from_date, to_date = date(2019, 1, 1), date(2023, 12, 31)
+    # Listed in the middle of the third window
+    endpoint = StockHistoryEndpoint(["NEWCO"], date(2021, 6, 15), to_date, max_days=365)
+    h = NSEHistory()
+    cassette = Cassette()
+    cassette.add("GET", h.base_url + h.path_map["equity_quote_page"],
+                 headers=[("Set-Cookie", "nsit=fake; Path=/")])
+    with FakeExchange(cassette, endpoints=[endpoint]) as ex:
+        h = NSEHistory(transport=ex.transport())
+        h.chunking = MaxWindowChunks()
+        rows = h.stock_raw("NEWCO", from_date, to_date)
+        requests = ex.stats["requests"]
+    assert len(rows) == len(endpoint.rows["NEWCO"])
+    # One request per window (5 and a 1 day window) and the cookie page
+    assert requests == 6 + 1
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+from requests.exceptions import ReadTimeout
+
+from jugaad_data import concurrency, metrics
+from jugaad_data import util as ut
+from jugaad_data.concurrency import AIMDController
+
+
+def run(controller, congested=False, status=None):
+    with controller.slot() as slot:
+        if status:
+            concurrency.observe(status)
+        slot.congested = slot.congested or congested
+
+
+def test_additive_increase():
+    c = AIMDController("test-aimd", initial=2, max_limit=4)
+    # 1/limit per healthy request, about one more per `limit` requests
+    run(c)
+    run(c)
+    assert c.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(20):
+        run(c)
+    assert c.limit == 4
+    assert metrics.gauges()["test-aimd"] == {"concurrency_limit": 4, "in_flight": 0}
+
+
+def test_multiplicative_decrease():
+    c = AIMDController("test-aimd", initial=8, max_limit=8)
+    run(c, status=429)
+    assert c.limit == 4
+    with pytest.raises(ReadTimeout):
+        with c.slot():
+            raise ReadTimeout()
+    assert c.limit == 2
+    run(c, status=503)
+    run(c, status=503)
+    assert c.limit == 1
+    # Errors other than timeouts and connection errors are not congestion
+    with pytest.raises(KeyError):
+        with c.slot():
+            raise KeyError()
+    assert c.limit == 2
+
+
+def test_slow_response_is_congestion():
+    c = AIMDController("test-aimd", initial=4, latency_target=0.01)
+    with c.slot():
+        time.sleep(0.02)
+    assert c.limit == 2
+
+
+def test_cached_calls_time_requests_only(cache_env):
+    c = AIMDController("test-aimd", initial=4, latency_target=0.01)
+
+    @ut.cached("test-aimd-cached")
+    def fetch(value):
+        # Waited for a lock, then the transport reported a fast response
+        time.sleep(0.02)
+        concurrency.observe(200, latency=0.001)
+        return value
+
+    with c.slot():
+        fetch(1)
+    assert c.limit == 4.25
+    # Served by the cache, the limit is left as it is
+    with c.slot():
+        time.sleep(0.02)
+        fetch(1)
+    assert c.limit == 4.25
+
+
+def test_burst_of_failures_decreases_once():
+    c = AIMDController("test-aimd", initial=8, max_limit=8)
+    slots = [c.acquire() for _ in range(8)]
+    for slot in slots:
+        slot.congested = True
+        c.release(slot)
+    assert c.limit == 4
+
+
+def test_pool_bounded_by_limit():
+    c = AIMDController("test-aimd", initial=2, max_limit=16, latency_target=0.01)
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0}
+
+    def fetch(i):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        # Slower than the latency target, the limit stays at its floor
+        time.sleep(0.02)
+        with lock:
+            state["now"] -= 1
+        return i
+
+    assert list(ut.pool(fetch, [(i,) for i in range(12)], controller=c)) == list(range(12))
+    assert state["peak"] <= 2
+    assert c.limit == 1
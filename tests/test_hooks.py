@@ -0,0 +1,109 @@
+import json
+import logging
+from datetime import date
+
+import pytest
+
+from jugaad_data import hooks
+from jugaad_data.fake_exchange import FakeExchange, RoutedTransport, add_stock_history
+from jugaad_data.replay import Cassette
+from jugaad_data.nse import NSEHistory, NSEArchives
+
+
+@pytest.fixture
+def events(cache_env):
+    received = []
+    hooks.add_hook(received.append)
+    yield received
+    hooks.clear_hooks()
+
+
+def test_events_for_requests_and_cache_hits(events):
+    stats = hooks.add_hook(hooks.Aggregator())
+    cassette = add_stock_history(Cassette(), NSEHistory(), ["SBIN"], date(2023, 1, 1), date(2023, 3, 31))
+    with FakeExchange(cassette, latency=0.01) as ex:
+        h = NSEHistory(transport=ex.transport())
+        h.stock_raw("SBIN", date(2023, 1, 1), date(2023, 3, 31))
+        h.stock_raw("SBIN", date(2023, 1, 1), date(2023, 3, 31))
+
+    requests = [e for e in events if not e.cached]
+    assert [e.key for e in requests] == ["nsehistory/stock_history"] * 3
+    for e in requests:
+        assert e.status == 200 and e.bytes > 0 and e.error is None
+        assert e.params["symbol"] == "SBIN"
+        assert e.url.startswith("https://www.nseindia.com/")
+        assert 0.01 <= e.ttfb <= e.total
+    # New connections were timed, the cookie page request included
+    assert sum(e.connect for e in requests) > 0
+    assert sum(e.dns for e in requests) > 0
+    assert [e.key for e in events if e.cached] == ["cache/nsehistory-stock"] * 3
+
+    report = stats.report()
+    route = report["nsehistory/stock_history"]
+    assert route["count"] == 3 and route["errors"] == 0
+    assert 0.01 <= route["p50"] <= route["p95"] <= route["p99"]
+    assert report["cache/nsehistory-stock"]["cached"] == 3
+    assert report["cache/nsehistory-stock"]["p50"] is None
+
+
+def test_ttfb_leaves_out_rate_limit_waits(events):
+    cassette = add_stock_history(Cassette(), NSEHistory(), ["SBIN"], date(2023, 1, 1), date(2023, 3, 31))
+    with FakeExchange(cassette, latency=0.01) as ex:
+        h = NSEHistory(transport=ex.transport(rate_limits={"nseindia.com": (5, 1)}))
+        h.workers = 1
+        h.stock_raw("SBIN", date(2023, 1, 1), date(2023, 3, 31))
+
+    requests = [e for e in events if not e.cached]
+    # The cookie page takes the burst, each chunk waits about 0.2s for a token
+    assert all(e.total >= 0.15 for e in requests)
+    assert all(0.01 <= e.ttfb < 0.15 for e in requests)
+
+
+def test_dns_timing_leaves_resolving_to_urllib3(events, monkeypatch):
+    import urllib3.util.connection
+    hosts = []
+    create_connection = urllib3.util.connection.create_connection
+
+    def recording(address, *args, **kw):
+        hosts.append(address[0])
+        return create_connection(address, *args, **kw)
+
+    monkeypatch.setattr(urllib3.util.connection, "create_connection", recording)
+    with FakeExchange(Cassette()) as ex:
+        a = NSEArchives(transport=RoutedTransport(ex.url.replace("127.0.0.1", "localhost")))
+        a.get("bhavcopy", yyyy=2023, MMM="JAN", dd="02")
+    # Tries every address localhost resolves to, not one picked for timing
+    assert hosts == ["localhost"]
+    assert events[0].dns > 0
+
+
+def test_archives_errors_and_failing_hooks(events):
+    def broken(event):
+        raise ValueError("hook bug")
+    hooks.add_hook(broken)
+    with FakeExchange(Cassette()) as ex:
+        a = NSEArchives(transport=ex.transport())
+        r = a.get("bhavcopy", yyyy=2023, MMM="JAN", dd="02")
+    assert r.status_code == 404
+    assert events[0].key == "nsearchives/bhavcopy"
+    assert events[0].status == 404
+
+
+def test_logging_sink(events, caplog):
+    sink = hooks.LoggingSink()
+    event = hooks.RequestEvent("nselive", "market_status", {})
+    event.status, event.total = 200, 0.5
+    with caplog.at_level(logging.INFO, logger="jugaad_data.requests"):
+        sink(event)
+    logged = json.loads(caplog.records[0].getMessage())
+    assert logged["route"] == "market_status" and logged["status"] == 200
+    assert logged["total"] == 0.5 and logged["cached"] is False
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert hooks.percentile(values, 50) == 50
+    assert hooks.percentile(values, 95) == 95
+    assert hooks.percentile(values, 99) == 99
+    assert hooks.percentile([3], 99) == 3
+    assert hooks.percentile([], 50) is None
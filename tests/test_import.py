@@ -0,0 +1,27 @@
+import subprocess
+import sys
+
+CHECK = """
+import sys
+import jugaad_data.nse as nse
+heavy = [m for m in ("pandas", "numpy", "click", "httpx") if m in sys.modules]
+clients = [c for c in (nse.history._h, nse.history._ih, nse.archives._a, nse.archives._ia)
+           if c.instance is not None]
+print(heavy, len(clients))
+"""
+
+
+def test_import_is_lazy():
+    out = subprocess.run([sys.executable, "-c", CHECK], check=True,
+                         capture_output=True, text=True).stdout
+    assert out.strip() == "[] 0"
+
+
+def test_module_clients_created_on_first_use():
+    from jugaad_data import nse
+    from jugaad_data.nse import history, archives
+    assert isinstance(nse.h, history.NSEHistory)
+    assert nse.h is history.h is history._h.get()
+    assert isinstance(nse.ia, archives.NSEIndicesArchives)
+    assert nse.stock_raw.__doc__ == history.NSEHistory.stock_raw.__doc__
+    assert nse.bhavcopy_raw.__name__ == "bhavcopy_raw"
@@ -0,0 +1,98 @@
+import time
+import urllib.request
+
+import pytest
+
+from jugaad_data import metrics
+from jugaad_data import util as ut
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_registry_counters_and_histograms():
+    registry = metrics.Registry(buckets=(0.1, 1.0))
+    registry.inc("app", "hits")
+    registry.inc("app", "bytes_read", 10)
+    registry.observe("app", "fetch", 0.05)
+    registry.observe("app", "fetch", 0.5)
+    registry.observe("app", "fetch", 5)
+    snap = registry.snapshot()["app"]
+    assert snap["hits"] == 1 and snap["misses"] == 0 and snap["bytes_read"] == 10
+    assert snap["fetch"]["count"] == 3
+    assert snap["fetch"]["sum"] == pytest.approx(5.55)
+    assert snap["fetch"]["buckets"] == {0.1: 1, 1.0: 2}
+    registry.reset()
+    assert registry.snapshot() == {}
+
+
+def test_cached_records_metrics(cache_env):
+    @ut.cached("test-metrics")
+    def fetch(symbol):
+        time.sleep(0.01)
+        return [symbol] * 10
+
+    fetch("SBIN")
+    fetch("SBIN")
+    fetch("TCS")
+    snap = metrics.snapshot()["test-metrics"]
+    assert snap["misses"] == 2 and snap["hits"] == 1
+    assert snap["fetch"]["count"] == 2 and snap["fetch"]["sum"] >= 0.02
+    assert snap["bytes_written"] > 0
+    assert 0 < snap["bytes_read"] < snap["bytes_written"]
+    assert snap["deserialize"]["count"] == 3
+
+    assert ut.pool_cached(fetch, [("SBIN",), ("INFY",)], use_threads=False)
+    snap = metrics.snapshot()["test-metrics"]
+    assert snap["hits"] == 2 and snap["misses"] == 3
+
+
+class Live:
+    time_out = 60
+
+    @ut.live_cache
+    def quote(self, symbol):
+        return {"symbol": symbol}
+
+
+def test_live_cache_records_metrics(cache_env):
+    q = Live()
+    q.quote("SBIN")
+    q.quote("SBIN")
+    snap = metrics.snapshot()["live-quote"]
+    assert snap["hits"] == 1 and snap["misses"] == 1 and snap["fetch"]["count"] == 1
+
+
+def test_prometheus_text(cache_env):
+    metrics.registry.inc('odd"name', "misses", 2)
+    metrics.registry.observe('odd"name', "read", 0.02)
+    text = metrics.prometheus_text()
+    assert "# TYPE jugaad_cache_misses_total counter" in text
+    assert 'jugaad_cache_misses_total{namespace="odd\\"name"} 2' in text
+    assert 'jugaad_cache_read_seconds_bucket{namespace="odd\\"name",le="0.01"} 0' in text
+    assert 'jugaad_cache_read_seconds_bucket{namespace="odd\\"name",le="0.025"} 1' in text
+    assert 'jugaad_cache_read_seconds_bucket{namespace="odd\\"name",le="+Inf"} 1' in text
+    assert 'jugaad_cache_read_seconds_count{namespace="odd\\"name"} 1' in text
+
+    server = metrics.start_http_server(0, "127.0.0.1")
+    try:
+        url = "http://127.0.0.1:{}/metrics".format(server.server_address[1])
+        with urllib.request.urlopen(url) as r:
+            assert r.read().decode() == metrics.prometheus_text()
+    finally:
+        server.shutdown()
+
+
+def test_gauges(cache_env):
+    metrics.registry.set("nsehistory", "concurrency_limit", 4)
+    assert metrics.gauges() == {"nsehistory": {"concurrency_limit": 4, "in_flight": 0}}
+    assert metrics.snapshot() == {}
+    text = metrics.prometheus_text()
+    assert "# TYPE jugaad_concurrency_limit gauge" in text
+    assert 'jugaad_concurrency_limit{namespace="nsehistory"} 4.0' in text
+    metrics.reset()
+    assert metrics.gauges() == {}
@@ -326,3 +326,99 @@ def test_expiry_dates():
     expiry_dts = nse.expiry_dates(dt, "FUTIDX", "NIFTY")
     
      
+
+def fake_stock_rows(params):
+    from_date = datetime.strptime(params['from'], '%d-%m-%Y').date()
+    to_date = datetime.strptime(params['to'], '%d-%m-%Y').date()
+    rows = []
+    dt = to_date
+    while dt >= from_date:
+        if dt.weekday() < 5:
+            rows.append({"CH_TIMESTAMP": dt.isoformat(), "CH_SERIES": "EQ",
+                         "CH_OPENING_PRICE": 100.5, "CH_TRADE_HIGH_PRICE": 101,
+                         "CH_TRADE_LOW_PRICE": 99, "CH_PREVIOUS_CLS_PRICE": 100,
+                         "CH_LAST_TRADED_PRICE": 100.1, "CH_CLOSING_PRICE": 100.2,
+                         "VWAP": 100.3, "CH_TOT_TRADED_QTY": 1000 + dt.day,
+                         "CH_TOT_TRADED_VAL": 100000.0, "CH_TOTAL_TRADES": 10,
+                         "COP_DELIV_QTY": "-" if dt.day % 7 == 0 else 500,
+                         "COP_DELIV_PERC": "-" if dt.day % 7 == 0 else 50.0,
+                         "CH_SYMBOL": params['symbol']})
+        dt -= timedelta(days=1)
+    return rows
+
+def fake_get(path_name, params):
+    r = MagicMock()
+    r.json.return_value = {"data": fake_stock_rows(params)}
+    return r
+
+class TestColumnarCache(TestCase):
+    def setUp(self):
+        setup_test(self)
+
+    def test_stock_df_columnar(self):
+        from_date, to_date = date(2021, 1, 15), date(2021, 3, 10)
+        with patch.object(nse.NSEHistory, '_get', side_effect=fake_get) as get:
+            expected = nse.stock_df("FAKE", from_date, to_date)
+            nse.history.h.columnar_cache = True
+            try:
+                df = nse.stock_df("FAKE", from_date, to_date)
+                calls = get.call_count
+                df_warm = nse.stock_df("FAKE", from_date, to_date)
+            finally:
+                nse.history.h.columnar_cache = False
+        pd.testing.assert_frame_equal(df, expected)
+        pd.testing.assert_frame_equal(df_warm, expected)
+        assert get.call_count == calls
+        assert os.path.isdir(user_cache_dir("nsehistory-stock-columns"))
+
+
+class FakeSession:
+    """Stands in for NSEHistory.s, the report page sets a cookie and API
+    calls fail with 403 while ``expired`` is set"""
+    def __init__(self, h):
+        import requests
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.page_calls = 0
+        self.api_calls = 0
+        self.expired = False
+        self.h = h
+
+    def get(self, url, params=None, verify=True, timeout=None):
+        import time
+        r = MagicMock()
+        if url.endswith(self.h.path_map["equity_quote_page"]):
+            self.page_calls += 1
+            time.sleep(0.05)
+            self.cookies.set("nsit", str(self.page_calls))
+            self.expired = False
+            r.status_code = 200
+            return r
+        self.api_calls += 1
+        r.status_code = 403 if self.expired or not self.cookies else 200
+        r.json.return_value = {"data": [{"cookie": self.cookies.get("nsit")}]}
+        return r
+
+
+def test_bootstrap_once_for_concurrent_requests():
+    from concurrent.futures import ThreadPoolExecutor
+    h = nse.NSEHistory()
+    h.s = FakeSession(h)
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        results = list(ex.map(lambda _: h._get("stock_history", {}).json(), range(32)))
+    assert h.s.page_calls == 1
+    assert h.s.api_calls == 32
+    assert all(r == {"data": [{"cookie": "1"}]} for r in results)
+    assert not hasattr(h, "r")
+
+
+def test_bootstrap_again_when_session_expires():
+    from concurrent.futures import ThreadPoolExecutor
+    h = nse.NSEHistory()
+    h.s = FakeSession(h)
+    h._get("stock_history", {})
+    h.s.expired = True
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        results = list(ex.map(lambda _: h._get("stock_history", {}), range(8)))
+    # Concurrent 403s renew the cookies only once
+    assert h.s.page_calls == 2
+    assert all(r.status_code == 200 for r in results)
@@ -1,8 +1,65 @@
 import pytest
+from unittest.mock import MagicMock
+import requests
 from jugaad_data.nse.live import NSELive
+from jugaad_data.transport import Transport
 from datetime import date, datetime
 n = NSELive()
 
+
+class FakeTransport(Transport):
+    """Sessions it creates count page and API requests in ``calls``, the
+    page sets a cookie and API calls fail with 401 while ``expired`` is set"""
+    def __init__(self):
+        super().__init__()
+        self.calls = {"page": 0, "api": 0}
+        self.expired = False
+
+    def session(self, headers=None):
+        transport = self
+        s = MagicMock()
+        s.headers = {}
+        s.cookies = requests.cookies.RequestsCookieJar()
+
+        def get(url, params=None):
+            r = MagicMock()
+            if url == NSELive.page_url:
+                transport.calls["page"] += 1
+                transport.expired = False
+                s.cookies.set("nsit", str(transport.calls["page"]))
+                return r
+            transport.calls["api"] += 1
+            r.status_code = 401 if transport.expired or not s.cookies else 200
+            r.json.return_value = {"cookie": s.cookies.get("nsit")}
+            return r
+        s.get.side_effect = get
+        return s
+
+
+def test_construction_makes_no_request():
+    t = FakeTransport()
+    NSELive(transport=t)
+    assert t.calls == {"page": 0, "api": 0}
+
+
+def test_warm_session_shared_between_instances():
+    t = FakeTransport()
+    for _ in range(3):
+        assert NSELive(transport=t).get("market_status") == {"cookie": "1"}
+    assert t.calls == {"page": 1, "api": 3}
+
+
+def test_warm_again_on_auth_failure():
+    t = FakeTransport()
+    first, second = NSELive(transport=t), NSELive(transport=t)
+    first.get("market_status")
+    second.get("market_status")
+    t.expired = True
+    assert first.get("market_status") == {"cookie": "2"}
+    # The renewed cookies are picked up without another page request
+    assert second.get("market_status") == {"cookie": "2"}
+    assert t.calls == {"page": 2, "api": 5}
+
 @pytest.mark.live
 def test_stock_quote():
     r = n.stock_quote("HDFCBANK")
@@ -0,0 +1,122 @@
+from datetime import date
+
+import pytest
+import requests
+
+from jugaad_data import transport as tr
+from jugaad_data.fake_exchange import FakeExchange, add_stock_history
+from jugaad_data.replay import Cassette, RecordingTransport, ReplayTransport, NotRecordedError
+from jugaad_data.nse import NSEHistory, NSEIndexHistory
+
+
+def stock_cassette():
+    return add_stock_history(Cassette(), NSEHistory(), ["SBIN", "M&M"],
+                             date(2023, 1, 1), date(2023, 6, 30))
+
+
+def test_cassette_keys_ignore_query_order(tmp_path):
+    path = str(tmp_path / "c.jsonl")
+    c = Cassette(path)
+    c.add("GET", "https://www.nseindia.com/api?a=1&b=2", body=b"\x00zip")
+    c.add("POST", "https://niftyindices.com/x", body="one", request_body=b'{"a": 1}')
+    loaded = Cassette(path)
+    assert Cassette.body(loaded.find("GET", "https://WWW.nseindia.com/api?b=2&a=1")) == b"\x00zip"
+    assert loaded.find("POST", "https://niftyindices.com/x", '{"a": 1}')["body"]
+    assert loaded.find("POST", "https://niftyindices.com/x", '{"a": 2}') is None
+
+
+def test_record_and_replay(tmp_path):
+    c = Cassette()
+    c.add("GET", "http://fake.host/page", body="hello",
+          headers=[("Set-Cookie", "a=1; Path=/"), ("Set-Cookie", "b=2; Path=/")])
+    path = str(tmp_path / "rec.jsonl")
+    with FakeExchange(c) as ex:
+        s = RecordingTransport(path, rate_limits={}).session()
+        assert s.get(ex.url + "/page", headers={"Host": "fake.host"}).text == "hello"
+
+    s = ReplayTransport(path).session()
+    r = s.get("http://127.0.0.1/page")
+    assert r.status_code == 200 and r.text == "hello"
+    assert s.cookies.get_dict() == {"a": "1", "b": "2"}
+    with pytest.raises(NotRecordedError):
+        s.get("http://127.0.0.1/other")
+
+
+def test_client_stack_against_fake_exchange(cache_env):
+    retry = tr.RetryPolicy(retries=10, backoff=0.001)
+    with FakeExchange(stock_cassette(), latency=0.005, jitter=0.005, error_rate=0.2,
+                      error_statuses=(429, 503), reset_rate=0.1, seed=7) as ex:
+        h = NSEHistory(transport=ex.transport(retry=retry))
+        h.workers = 16
+        rows = h.stock_raw("M&M", date(2023, 1, 1), date(2023, 6, 30))
+        assert ex.stats["errors"] + ex.stats["resets"] > 0
+        assert ex.stats["not_found"] == 0
+    assert len(rows) == 130
+    assert {r["CH_SYMBOL"] for r in rows} == {"M&M"}
+    assert rows[0]["CH_TIMESTAMP"] == "2023-06-30"
+
+
+def test_post_requests_match_body(cache_env):
+    ih = NSEIndexHistory()
+    c = Cassette()
+    params = ih._cinfo_params("NIFTY 50", "NIFTY 50", date(2023, 1, 2), date(2023, 1, 3))
+    url = ih.base_url + ih.path_map["index_history"]
+    body = requests.Request("POST", url, json=params).prepare().body
+    c.add_json("POST", url, [{"HistoricalDate": "02 Jan 2023"}], request_body=body)
+    with FakeExchange(c) as ex:
+        ih = NSEIndexHistory(transport=ex.transport())
+        assert ih.index_raw("NIFTY 50", date(2023, 1, 2), date(2023, 1, 3)) == [
+            {"HistoricalDate": "02 Jan 2023"}]
+
+
+def test_replay_default_transport(tmp_path, monkeypatch, cache_env):
+    path = str(tmp_path / "nse.jsonl")
+    add_stock_history(Cassette(path), NSEHistory(), ["SBIN"], date(2023, 1, 1), date(2023, 1, 31))
+    monkeypatch.setenv(tr.REPLAY_ENV, path)
+    monkeypatch.setattr(tr, "_transport", None)
+    h = NSEHistory()
+    assert isinstance(h.transport, ReplayTransport)
+    assert len(h.stock_raw("SBIN", date(2023, 1, 1), date(2023, 1, 31))) == 22
+
+
+def test_stock_raw_many(cache_env):
+    with FakeExchange(stock_cassette(), latency=0.002) as ex:
+        h = NSEHistory(transport=ex.transport())
+        h.workers = 8
+        results = {symbol: (rows, error) for symbol, rows, error in
+                   h.stock_raw_many(["SBIN", "NOTLISTED", "M&M"], date(2023, 1, 1), date(2023, 6, 30))}
+    assert set(results) == {"SBIN", "NOTLISTED", "M&M"}
+    assert len(results["SBIN"][0]) == 130 and results["SBIN"][1] is None
+    assert [r["CH_SYMBOL"] for r in results["M&M"][0]] == ["M&M"] * 130
+    assert results["NOTLISTED"][0] is None and results["NOTLISTED"][1] is not None
+
+
+def test_stock_csv_progress(cache_env, monkeypatch):
+    from jugaad_data.nse import history
+    done = []
+    with FakeExchange(stock_cassette(), latency=0.002) as ex:
+        h = NSEHistory(transport=ex.transport())
+        h.workers = 4
+        rows = h.stock_raw("SBIN", date(2023, 1, 1), date(2023, 6, 30), progress=done.append)
+        assert len(rows) == 130 and sum(done) == 6
+        # Cached chunks are reported at once
+        del done[:]
+        h.stock_raw("SBIN", date(2023, 1, 1), date(2023, 6, 30), progress=done.append)
+        assert done == [6]
+
+        monkeypatch.setattr(history._h, "instance", h)
+        output = history.stock_csv("M&M", date(2023, 1, 1), date(2023, 6, 30),
+                                   output=str(cache_env / "mm.csv"), show_progress=True)
+    with open(output) as fp:
+        assert len(fp.readlines()) == 131
+
+
+def test_iter_stock(cache_env):
+    with FakeExchange(stock_cassette(), latency=0.002, jitter=0.01, seed=1) as ex:
+        h = NSEHistory(transport=ex.transport())
+        h.workers = 4
+        chunks = list(h.iter_stock("SBIN", date(2023, 1, 1), date(2023, 6, 30), ordered=True))
+        assert len(chunks) == 6
+        assert [r for c in chunks for r in c] == h.stock_raw("SBIN", date(2023, 1, 1), date(2023, 6, 30))
+        chunks = list(h.iter_stock("M&M", date(2023, 1, 1), date(2023, 6, 30)))
+    assert sum(len(c) for c in chunks) == 130
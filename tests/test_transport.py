@@ -0,0 +1,243 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from jugaad_data import transport as tr
+from jugaad_data.nse import NSEHistory, NSEIndexHistory, NSEArchives, NSEIndicesArchives
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+
+    def do_GET(self):
+        KeepAliveHandler.connections.add(self.client_address)
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    KeepAliveHandler.connections = set()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{}".format(httpd.server_address[1])
+    httpd.shutdown()
+
+
+def test_sessions_reuse_connections(server):
+    t = tr.Transport()
+    first, second = t.session(), t.session({"x-client": "2"})
+    for s in (first, second, first, second):
+        assert s.get(server + "/").text == "ok"
+    assert len(KeepAliveHandler.connections) == 1
+    assert second.headers["x-client"] == "2"
+    # Closing a client's session keeps the shared pool open
+    first.close()
+    assert second.get(server + "/").text == "ok"
+    assert len(KeepAliveHandler.connections) == 1
+    t.close()
+
+
+def test_configure_and_reserve():
+    t = tr.Transport(pool_size=4)
+    s = t.session()
+    url = "https://www.nseindia.com/api/x"
+    assert s.get_adapter(url) is t.adapter(url)
+    assert t.pool_size_for("www.nseindia.com") == 4
+
+    t.reserve(url, 2)
+    assert t.pool_size_for("www.nseindia.com") == 4
+    t.reserve(url, 16)
+    assert t.pool_size_for("www.nseindia.com") == 16
+    # Existing sessions use the resized pool, other hosts are unchanged
+    assert s.get_adapter(url) is t.adapter(url)
+    assert s.get_adapter(url)._pool_maxsize == 16
+    assert s.get_adapter("https://niftyindices.com/")._pool_maxsize == 4
+
+    t.configure("NiftyIndices.com", pool_size=8)
+    assert s.get_adapter("https://niftyindices.com/")._pool_maxsize == 8
+
+
+def test_reserve_closes_replaced_pool(server):
+    t = tr.Transport(pool_size=2)
+    s = t.session()
+    t.configure("127.0.0.1", pool_size=2)
+    old = t.adapter(server)
+    assert s.get(server + "/").text == "ok"
+    assert len(old.poolmanager.pools) == 1
+    t.reserve(server, 8)
+    assert len(old.poolmanager.pools) == 0
+    assert s.get(server + "/").text == "ok"
+    t.close()
+
+
+def test_clients_share_transport():
+    t = tr.Transport()
+    clients = [NSEHistory(transport=t), NSEIndexHistory(transport=t),
+               NSEArchives(transport=t), NSEIndicesArchives(transport=t)]
+    for c in clients:
+        assert c.transport is t
+    a = clients[2]
+    assert a.daily_reports.transport is t
+    assert a.s is not a.daily_reports.s
+    assert a.s.get_adapter(a.base_url) is a.daily_reports.s.get_adapter(a.base_url)
+
+    h = NSEHistory(transport=t)
+    h.workers = 50
+    assert t.pool_size_for("www.nseindia.com") < 50
+    t.reserve(h.base_url, h.workers)
+    assert h.s.get_adapter(h.base_url + "/api")._pool_maxsize == 50
+
+
+def test_default_transport(monkeypatch):
+    monkeypatch.setattr(tr, "_transport", None)
+    monkeypatch.setenv(tr.POOL_SIZE_ENV, "7")
+    default = tr.get_transport()
+    assert default is tr.get_transport()
+    assert default.pool_size == 7
+    assert NSEHistory().transport is default
+    custom = tr.Transport()
+    tr.set_transport(custom)
+    assert NSEArchives().transport is custom
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    responses = []
+    requests = 0
+
+    def do_GET(self):
+        FlakyHandler.requests += 1
+        status, headers = FlakyHandler.responses.pop(0) if FlakyHandler.responses else (200, {})
+        body = b"done"
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def flaky():
+    FlakyHandler.requests = 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield "http://127.0.0.1:{}".format(httpd.server_address[1])
+    httpd.shutdown()
+
+
+def test_retry_on_throttling_and_server_errors(flaky):
+    t = tr.Transport(rate_limits={}, retry=tr.RetryPolicy(retries=3, backoff=0.01))
+    FlakyHandler.responses = [(503, {}), (429, {"Retry-After": "0"}), (502, {})]
+    r = t.session().get(flaky + "/")
+    assert r.status_code == 200 and r.text == "done"
+    assert FlakyHandler.requests == 4
+
+    # Gives up after the configured retries and returns the last response
+    FlakyHandler.requests = 0
+    FlakyHandler.responses = [(500, {})] * 5
+    r = t.session().get(flaky + "/")
+    assert r.status_code == 500 and FlakyHandler.requests == 4
+
+    # Other errors are not retried
+    FlakyHandler.requests = 0
+    FlakyHandler.responses = [(404, {})]
+    assert t.session().get(flaky + "/").status_code == 404
+    assert FlakyHandler.requests == 1
+
+
+def test_retries_are_opt_in(flaky, monkeypatch):
+    monkeypatch.delenv(tr.RETRIES_ENV, raising=False)
+    FlakyHandler.responses = [(503, {})]
+    assert tr.Transport(rate_limits={}).session().get(flaky + "/").status_code == 503
+    assert FlakyHandler.requests == 1
+
+    monkeypatch.setenv(tr.RETRIES_ENV, "2")
+    assert tr.RetryPolicy().retries == 2
+
+
+def test_retry_on_connection_error(monkeypatch):
+    import requests
+    slept = []
+    monkeypatch.setattr(tr.time, "sleep", slept.append)
+    t = tr.Transport(rate_limits={}, retry=tr.RetryPolicy(retries=2, backoff=1, max_backoff=3))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        # Nothing listens on port 9 of localhost
+        t.session().get("http://127.0.0.1:9/", timeout=1)
+    assert len(slept) == 2
+    assert 0 <= slept[0] <= 1 and 0 <= slept[1] <= 2
+
+
+def test_retry_delay():
+    policy = tr.RetryPolicy(backoff=1, max_backoff=4)
+    assert all(0 <= policy.delay(10) <= 4 for _ in range(100))
+
+    class Response:
+        headers = {"Retry-After": "120"}
+    assert policy.delay(0, Response()) == 4
+
+
+def test_token_bucket_paces_requests():
+    bucket = tr.TokenBucket(rate=50, burst=2)
+    waits = [bucket.reserve() for _ in range(6)]
+    assert waits[:2] == [0, 0]
+    # Tokens are handed out 1/50 s apart once the burst is used up
+    assert waits[2:] == pytest.approx([0.02, 0.04, 0.06, 0.08], abs=0.005)
+
+
+def test_rate_limiter_hosts(cache_env, monkeypatch):
+    # Off unless asked for
+    monkeypatch.delenv(tr.RATE_ENV, raising=False)
+    assert tr.RateLimiter().buckets == {}
+    monkeypatch.setenv(tr.RATE_ENV, "2")
+    assert tr.RateLimiter().buckets["nseindia.com"].burst == 4
+    monkeypatch.setenv(tr.RATE_ENV, "default")
+    limiter = tr.RateLimiter()
+    assert limiter.bucket("www.nseindia.com") is limiter.buckets["nseindia.com"]
+    assert limiter.bucket("nsearchives.nseindia.com") is limiter.buckets["nsearchives.nseindia.com"]
+    assert limiter.bucket("www.niftyindices.com") is limiter.buckets["niftyindices.com"]
+    assert limiter.bucket("www.rbi.org.in") is None
+    limiter.limit("nseindia.com", None)
+    assert limiter.bucket("www.nseindia.com") is None
+
+    # Shared buckets keep their state in a file used by every process
+    first = tr.RateLimiter({"example.com": (50, 2)}, shared=True)
+    second = tr.RateLimiter({"example.com": (50, 2)}, shared=True)
+    waits = [first.buckets["example.com"].reserve(), second.buckets["example.com"].reserve(),
+             first.buckets["example.com"].reserve()]
+    assert waits[:2] == [0, 0] and waits[2] > 0
+    assert (cache_env / tr.RATE_LIMIT_DIR_NAME / "example.com").is_file()
+
+
+def test_transport_rate_limits_requests(flaky):
+    t = tr.Transport(rate_limits={"127.0.0.1": (20, 1)}, retry=tr.RetryPolicy(retries=0))
+    s = t.session()
+    start = time.monotonic()
+    for _ in range(5):
+        s.get(flaky + "/")
+    assert time.monotonic() - start >= 0.18
+
+
+def test_retried_responses_reach_concurrency_controller(flaky):
+    from jugaad_data.concurrency import AIMDController
+    t = tr.Transport(rate_limits={}, retry=tr.RetryPolicy(retries=3, backoff=0.01))
+    c = AIMDController("test-transport", initial=4)
+    FlakyHandler.responses = [(429, {"Retry-After": "0"})]
+    with c.slot() as slot:
+        assert t.session().get(flaky + "/").status_code == 200
+    assert c.limit == 2
+    # Each attempt is timed, the backoff between them is not
+    assert slot.requests == 2 and 0 < slot.latency < time.monotonic() - slot.start
@@ -1,10 +1,13 @@
 import os
 import math
+import numpy as np
 import pickle
 import pytest
 from jugaad_data import util as ut
 from datetime import date, datetime, timedelta
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pyfakefs.fake_filesystem_unittest import TestCase
 from appdirs import user_cache_dir
 
@@ -165,3 +168,120 @@ def test_live_cache():
     time.sleep(3)
     assert q.rt_quote() > v
  
+
+class SlowQuoteApp:
+    time_out = 60
+    def __setattr__(self, name, value):
+        # Widens the window between checking for and setting the cache
+        time.sleep(0.01)
+        self.__dict__.setdefault("assigned", []).append(name)
+        super().__setattr__(name, value)
+
+    @ut.live_cache
+    def quote(self, symbol):
+        return symbol
+
+def test_live_cache_first_calls_from_threads():
+    q = SlowQuoteApp()
+    barrier = threading.Barrier(16)
+    def call(i):
+        barrier.wait()
+        return q.quote(str(i))
+    with ThreadPoolExecutor(16) as ex:
+        assert list(ex.map(call, range(16))) == [str(i) for i in range(16)]
+    assert len(q._cache) == 16
+    # One cache and lock shared by all threads
+    assert sorted(q.assigned) == ["_cache", "_cache_lock"]
+
+
+def test_parse_date():
+    assert ut.parse_date("2026-03-09") == date(2026, 3, 9)
+    assert ut.parse_date("09-Mar-2026") == date(2026, 3, 9)
+    assert ut.parse_date("20 Aug 2020") == date(2020, 8, 20)
+    assert ut.parse_date(datetime(2020, 8, 20, 10, 0)) == date(2020, 8, 20)
+    assert ut.parse_date("-") is None
+
+def test_settled_dates():
+    # 2026-10-17/18 is a weekend
+    assert ut.last_settled_date(date(2026, 10, 19)) == date(2026, 10, 16)
+    assert ut.last_settled_date(date(2026, 10, 14)) == date(2026, 10, 13)
+    # 2025-10-02 is a holiday
+    assert ut.last_settled_date(date(2025, 10, 3)) == date(2025, 10, 1)
+    assert ut.is_settled(date(2026, 10, 18), date(2026, 10, 19))
+    assert not ut.is_settled(date(2026, 10, 19), date(2026, 10, 19))
+    assert not ut.is_settled(date(2026, 10, 31), date(2026, 10, 19))
+    assert ut.is_settled(date(2020, 1, 31), date(2026, 10, 19))
+
+def test_to_columns():
+    rows = [{"d": "2020-01-01", "f": "1.5", "i": "3", "s": "EQ"},
+            {"d": "-", "f": "-", "i": "-", "s": "BE"}]
+    cols = ut.to_columns(rows, ["d", "f", "i", "s"], [ut.np_date, ut.np_float, ut.np_int, str])
+    assert cols["d"].dtype == np.dtype("datetime64[D]")
+    assert cols["d"][0] == np.datetime64("2020-01-01") and np.isnat(cols["d"][1])
+    assert cols["f"].dtype == np.float64 and math.isnan(cols["f"][1])
+    assert list(cols["i"]) == [3, 0]
+    assert list(cols["s"]) == ["EQ", "BE"]
+
+def test_pool_groups():
+    def square(x):
+        if x < 0:
+            raise ValueError(x)
+        time.sleep(0.001 * x)
+        return x * x
+    groups = [("a", [(1,), (2,), (3,)]), ("bad", [(4,), (-1,), (5,), (6,)]),
+              ("empty", []), ("b", [(7,)])]
+    results = {key: (res, err) for key, res, err in ut.pool_groups(square, groups, max_workers=2)}
+    assert results["a"] == ([1, 4, 9], None)
+    assert results["b"] == ([49], None)
+    assert results["empty"] == ([], None)
+    assert results["bad"][0] is None and isinstance(results["bad"][1], ValueError)
+
+def test_convert_column():
+    import pandas as pd
+    columns = {
+        ut.np_date: ["2023-01-02", "02-Jan-2023", "02 Jan 2023", "-", None,
+                     "2023-01-02T10:00:00", "2023-1-2", "02-Jan-2023"],
+        ut.np_int: [1, 2.7, "3", "3.0", None, float("nan"), "-", " 4 ", True],
+        ut.np_float: [1, "2.5", "x", None, " 3 ", "1e3", "inf", "1,000", "-", ""],
+        str: ["a", None, 1, 2.5],
+    }
+    for dtype, values in columns.items():
+        for col in [pd.Series(values), pd.Series(values, dtype=object)]:
+            expected = [None if pd.isna(v) else v for v in col.apply(dtype)]
+            actual = [None if pd.isna(v) else v for v in ut.convert_column(col, dtype)]
+            assert actual == expected, dtype
+    assert ut.convert_column(pd.Series(["5", "-", "7"]), ut.np_int).tolist() == [5, 0, 7]
+    assert ut.convert_column(pd.Series([1.5, None]), ut.np_int).tolist() == [1, 0]
+
+def test_pool_progress():
+    done = []
+    for use_threads in [True, False]:
+        del done[:]
+        params = [(0, 1), (1, 2), (2, 3)]
+        assert list(ut.pool(demo_for_pool, params, use_threads, progress=done.append)) == [1, 9, 25]
+        assert done == [1, 1, 1]
+
+def test_pool_iter():
+    lock = threading.Lock()
+    state = {"running": 0, "most": 0}
+    def slow(x):
+        with lock:
+            state["running"] += 1
+            state["most"] = max(state["most"], state["running"])
+        # The first call takes far longer than all the others together
+        time.sleep(0.2 if x == 0 else 0.001)
+        with lock:
+            state["running"] -= 1
+        return x
+    params = [(x,) for x in range(20)]
+    assert list(ut.pool_iter(slow, params, max_workers=4, ordered=True)) == list(range(20))
+    unordered = list(ut.pool_iter(slow, params, max_workers=4))
+    assert sorted(unordered) == list(range(20)) and unordered[0] != 0
+    assert state["most"] <= 4
+    # Not consumed further than window calls ahead
+    started = []
+    it = ut.pool_iter(lambda x: started.append(x) or x, params, max_workers=2, window=3)
+    assert next(it) in (0, 1, 2)
+    time.sleep(0.01)
+    assert len(started) <= 4
+    it.close()